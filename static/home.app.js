@@ -25,6 +25,18 @@ document.addEventListener('DOMContentLoaded', function() {
   const MIN_ZOOM = 3;
   const MAX_ZOOM = 15;
 
+  // The output each map type was last built as, written by the generators
+  // (see utils/viewer.py): 'html' pages per config, or a 'shell' viewer that
+  // keeps one page and only fetches each config's data, heatmap 'bundle's or
+  // 'tiled' heatmaps. Without the file, the per-config pages are used.
+  const OUTPUT_MODES_PATH = 'static/visualizations/outputs.json';
+  const outputModes = fetch(OUTPUT_MODES_PATH, { cache: 'no-cache' })
+    .then(response => (response.ok ? response.json() : {}))
+    .catch(() => ({}));
+
+  const CAPACITY_VIEWER_PATH = 'static/visualizations/country_capacity/viewer.html';
+  const GS_VIEWER_PATH = 'static/visualizations/gs_utilizations/viewer.html';
+
   function clampDeckZoom(iframe, attempts = 0) {
     const MAX_ATTEMPTS = 12;
     if (!iframe) {
@@ -150,6 +162,38 @@ document.addEventListener('DOMContentLoaded', function() {
     iframe.src = src;
   }
 
+  /**
+   * Shows a config in a shared viewer page. Only the URL hash changes between
+   * configs, so the viewer swaps its data in place instead of reloading.
+   */
+  function loadSharedViewer(iframe, loader, viewerPath, configName) {
+    if (!iframe || !loader) {
+      return;
+    }
+
+    loader.classList.add('active');
+    iframe.classList.add('is-loading');
+    iframe.src = `${viewerPath}#${encodeURIComponent(configName)}`;
+  }
+
+  // Viewer pages report when their data is displayed (see static/map_viewer.js)
+  window.addEventListener('message', function(event) {
+    const message = event.data;
+    if (!message || message.source !== 'cosmosim-viewer') {
+      return;
+    }
+
+    [[mapFrameCapacity, loadingCapacity], [mapFrameGs, loadingGs]].forEach(([iframe, loader]) => {
+      if (iframe && event.source === iframe.contentWindow) {
+        loader.classList.remove('active');
+        iframe.classList.remove('is-loading');
+        if (message.type === 'error') {
+          console.warn(`Viewer failed to load ${message.config}: ${message.message}`);
+        }
+      }
+    });
+  });
+
   // Attach listener to country select
   countrySelectMerged.addEventListener('change', function() {
     // Use the shared updateTerminals function from viz_logic.js
@@ -194,8 +238,20 @@ document.addEventListener('DOMContentLoaded', function() {
     resultContainerGs.style.display = 'block';
     errorContainerMerged.style.display = 'none';
 
-    loadVisualization(mapFrameCapacity, loadingCapacity, vizPathCapacity);
-    loadVisualization(mapFrameGs, loadingGs, vizPathGs, { clampZoom: false });
+    outputModes.then(modes => {
+      if (modes.capacity === 'shell') {
+        const configName = `${baseFilename}_cell_capacities`.toLowerCase();
+        loadSharedViewer(mapFrameCapacity, loadingCapacity, CAPACITY_VIEWER_PATH, configName);
+      } else {
+        loadVisualization(mapFrameCapacity, loadingCapacity, vizPathCapacity);
+      }
+      if (modes.gs === 'shell') {
+        const configName = `${baseFilename}_gs_utilizations`.toLowerCase();
+        loadSharedViewer(mapFrameGs, loadingGs, GS_VIEWER_PATH, configName);
+      } else {
+        loadVisualization(mapFrameGs, loadingGs, vizPathGs, { clampZoom: false });
+      }
+    });
   });
   
   // Load default visualization on page load
@@ -244,6 +300,23 @@ document.addEventListener('DOMContentLoaded', function() {
   const errorContainerHeatmap = document.getElementById('error-container-heatmap');
   const loadingHeatmap = document.getElementById('loading-heatmap');
 
+  // Heatmaps built with `--bundle` are one page per country/terminal pair, and
+  // changing the demand only changes its URL hash. Heatmaps built with `--tiled`
+  // share one viewer page that fetches only the tiles on screen.
+  const HEATMAP_BUNDLE_DIR = 'static/visualizations/cell_heatmap_bundles';
+  const HEATMAP_TILED_VIEWER_PATH = 'static/visualizations/cell_heatmap_tiles/viewer.html';
+
+  // Bundle pages report each demand they display (see templates/heatmap_bundle/demand_switch.html)
+  window.addEventListener('message', function(event) {
+    const message = event.data;
+    if (!message || message.source !== 'cosmosim-viewer' || event.source !== mapFrameHeatmap.contentWindow) {
+      return;
+    }
+    loadingHeatmap.classList.remove('active');
+    mapFrameHeatmap.classList.remove('is-loading');
+    clampDeckZoom(mapFrameHeatmap);
+  });
+
   generateBtnHeatmap.addEventListener('click', function() {
     const countryVal = document.getElementById('country-select-heatmap').value;
     
@@ -260,11 +333,23 @@ document.addEventListener('DOMContentLoaded', function() {
     const filename = `${countryFn}_${terminalsCapFn}_${demandFn}_cell_heatmap.html`;
     
     const vizPath = `static/visualizations/cell_heatmaps/${filename.toLowerCase()}`;
-    console.log('Loading heatmap from:', vizPath);
     
     resultContainerHeatmap.style.display = 'block';
     errorContainerHeatmap.style.display = 'none';
-    loadVisualization(mapFrameHeatmap, loadingHeatmap, vizPath);
+    outputModes.then(modes => {
+      if (modes.heatmap === 'bundle') {
+        const bundleName = `${countryFn}_${terminalsCapFn}_cell_heatmap_bundle`.toLowerCase();
+        console.log('Loading heatmap bundle:', bundleName, 'demand', demandFn);
+        loadSharedViewer(mapFrameHeatmap, loadingHeatmap, `${HEATMAP_BUNDLE_DIR}/${bundleName}.html`, demandFn);
+      } else if (modes.heatmap === 'tiled') {
+        const configName = `${countryFn}_${terminalsCapFn}_${demandFn}`.toLowerCase();
+        console.log('Loading tiled heatmap:', configName);
+        loadSharedViewer(mapFrameHeatmap, loadingHeatmap, HEATMAP_TILED_VIEWER_PATH, configName);
+      } else {
+        console.log('Loading heatmap from:', vizPath);
+        loadVisualization(mapFrameHeatmap, loadingHeatmap, vizPath);
+      }
+    });
   });
 
   updateHeatmapTerminalOptions();
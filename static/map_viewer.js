@@ -0,0 +1,380 @@
+/**
+ * Shared runtime for the lightweight map viewer pages.
+ *
+ * A viewer page is written once per map type by the generators. The config to
+ * show is taken from the URL hash (e.g. viewer.html#britain_0_1000_...), its
+ * compact JSON payload is fetched from the data directory next to the page, and
+ * the deck.gl layers are swapped in place. Changing the hash loads another
+ * config without reloading the page or re-initializing deck.gl.
+ *
+ * A payload built with an H3 pyramid lists zoom `levels` instead of holding
+ * columns; only the level matching the current zoom is fetched and shown.
+ *
+ * A tiled payload lists its `tiles` (coarse H3 parent cell -> cell count)
+ * instead of holding columns; only the tiles covering the viewport are fetched
+ * (from dataDir/<config>/<tile>.json) and handed to buildLayers() as
+ * `payload.visibleTiles`, so each can be drawn as its own layer and panning
+ * never re-uploads the tiles already on screen. Tile selection uses h3-js
+ * when the page loads it, and falls back to every tile otherwise.
+ *
+ * A payload (or level, or tile) built with precomputed geometry has no `hex`
+ * column but a `geometry` entry naming a binary file next to it: the uint32
+ * start index of each cell's ring, then its float32 lng/lat vertices (see
+ * utils/h3_geometry.py). It is fetched along with the payload and attached as
+ * `polygons`, ready to be handed to a PolygonLayer as binary data, so cells are
+ * drawn without any H3 math in the browser. cellLayer() picks the layer type.
+ */
+const MapViewer = (function() {
+  const MAP_STYLE = 'https://basemaps.cartocdn.com/gl/positron-gl-style/style.json';
+  const MIN_ZOOM = 3;
+  const MAX_ZOOM = 15;
+  // Tiles kept in memory once off screen, so panning back does not refetch them
+  const MAX_CACHED_TILES = 256;
+  // Wait for the view to settle before fetching tiles
+  const TILE_DEBOUNCE_MS = 150;
+
+  function configFromHash() {
+    return decodeURIComponent(window.location.hash.slice(1));
+  }
+
+  /**
+   * Tells the embedding page (home.app.js) about load progress.
+   * @param {string} type - 'loaded' or 'error'.
+   * @param {Object} detail - Extra message fields.
+   */
+  function notifyParent(type, detail) {
+    if (window.parent && window.parent !== window) {
+      window.parent.postMessage({ source: 'cosmosim-viewer', type, ...detail }, '*');
+    }
+  }
+
+  /**
+   * Returns a deck.gl accessor reading row `index` of a payload column.
+   * @param {Array} column - One column of the payload.
+   */
+  function columnAccessor(column) {
+    return (_, { index }) => column[index];
+  }
+
+  /**
+   * Decodes a payload's precomputed colors (base64 RGBA bytes, see utils/colors.py).
+   * @param {string} encoded - Base64 string of 4 bytes per row.
+   * @returns {Uint8Array}
+   */
+  function decodeColors(encoded) {
+    const binary = atob(encoded);
+    const colors = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+      colors[i] = binary.charCodeAt(i);
+    }
+    return colors;
+  }
+
+  /**
+   * Returns the RGBA color of row `row` of decoded colors.
+   * @param {Uint8Array} colors - Output of decodeColors().
+   * @param {number} row - Row index.
+   */
+  function colorAt(colors, row) {
+    return colors.subarray(row * 4, row * 4 + 4);
+  }
+
+  /**
+   * Fetches the binary geometry of a payload fetched from `url` and attaches it as `polygons`.
+   * @param {Object} columns - The payload (unchanged if it has no `geometry`).
+   * @param {string} url - URL the payload was fetched from; the geometry file is relative to it.
+   */
+  async function attachGeometry(columns, url) {
+    if (!columns.geometry) {
+      return columns;
+    }
+    const { file, cells, vertices } = columns.geometry;
+    const response = await fetch(new URL(file, new URL(url, window.location.href)));
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}`);
+    }
+    const buffer = await response.arrayBuffer();
+    const polygons = {
+      length: cells,
+      startIndices: new Uint32Array(buffer, 0, cells),
+      attributes: {
+        getPolygon: { value: new Float32Array(buffer, cells * 4, vertices * 2), size: 2 }
+      }
+    };
+    return { ...columns, polygons };
+  }
+
+  /**
+   * Returns the layer drawing the cells of a payload (or tile): a PolygonLayer over its
+   * precomputed geometry when it has some, an H3HexagonLayer over its `hex` column otherwise.
+   * @param {Object} columns - Payload with `polygons` (see attachGeometry()) or `hex`.
+   * @param {Object} props - Layer props; accessors get the row as `index`.
+   */
+  function cellLayer(columns, props) {
+    if (columns.polygons) {
+      // Rings are closed and counter-clockwise already, so deck.gl uses them as they are
+      return new deck.PolygonLayer({ ...props, data: columns.polygons, positionFormat: 'XY', _normalize: false });
+    }
+    return new deck.H3HexagonLayer({
+      ...props,
+      data: { length: columns.hex.length },
+      getHexagon: columnAccessor(columns.hex)
+    });
+  }
+
+  /**
+   * Returns the [west, south, east, north] boxes covered by a view, split at the antimeridian.
+   */
+  function viewBoxes(viewState) {
+    const viewport = new deck.WebMercatorViewport({
+      width: window.innerWidth, height: window.innerHeight, ...viewState
+    });
+    const [west, south, east, north] = viewport.getBounds();
+    if (east - west >= 180) {
+      return null; // Too wide for H3 polygons (edges over 180 degrees are ambiguous)
+    }
+    const wrap = lng => ((lng + 540) % 360) - 180;
+    const [w, e] = [wrap(west), wrap(east)];
+    return w <= e ? [[w, south, e, north]] : [[w, south, 180, north], [-180, south, e, north]];
+  }
+
+  /**
+   * Returns the tiles of a tiled payload covering a view (every tile without h3-js or when zoomed far out).
+   */
+  function tilesInView(payload, viewState) {
+    const allTiles = Object.keys(payload.tiles);
+    const boxes = typeof h3 !== 'undefined' ? viewBoxes(viewState) : null;
+    if (!boxes) {
+      return allTiles;
+    }
+    const wanted = new Set();
+    boxes.forEach(([w, s, e, n]) => {
+      const polygon = [[s, w], [n, w], [n, e], [s, e], [s, w]];
+      // Cells are selected by center, so add their neighbours to catch tiles crossing the edges
+      h3.polygonToCells(polygon, payload.tile_resolution).forEach(cell => {
+        h3.gridDisk(cell, 1).forEach(neighbour => wanted.add(neighbour));
+      });
+    });
+    return allTiles.filter(tile => wanted.has(tile));
+  }
+
+  /**
+   * Starts the viewer.
+   * @param {Object} options
+   * @param {string} options.dataDir - Directory holding the per-config JSON payloads.
+   * @param {function(Object, Object): Array} options.buildLayers - Builds the deck.gl layers of a payload
+   *   (the second argument is the shared payload, if any).
+   * @param {function(Object, Object, Object): (string|null)} [options.getTooltip] - Tooltip text for a
+   *   payload, picking info and the shared payload.
+   * @param {function(Object): void} [options.onPayload] - Called after a payload is displayed.
+   * @param {string} [options.sharedPayload] - Name of a payload fetched once and shared by every
+   *   config (e.g. the ground station table).
+   * @param {Object} [options.viewLimits] - Zoom limits applied to the view state.
+   */
+  function start(options) {
+    const { dataDir, buildLayers, getTooltip, onPayload } = options;
+    const viewLimits = options.viewLimits || { minZoom: MIN_ZOOM, maxZoom: MAX_ZOOM };
+    let deckInstance = null;
+    let currentConfig = null; // The config payload as fetched (with its level or tile list, if any)
+    let currentConfigName = null;
+    let currentPayload = null; // What is drawn: the config payload with its current level's columns
+    let sharedPayload = null;
+    let currentViewKey = null;
+    let currentZoom = null;
+    let currentLevel = null;
+    let requestId = 0;
+    const levelPayloads = new Map();
+    const tilePayloads = new Map(); // '<config>/<tile>' -> column promise, least recently used first
+    let currentViewState = null;
+    let currentTiles = null;
+    let tileTimer = null;
+
+    async function fetchPayload(name) {
+      const url = `${dataDir}/${encodeURIComponent(name)}.json`;
+      const response = await fetch(url);
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      return attachGeometry(await response.json(), url);
+    }
+
+    function fetchTile(configName, tile) {
+      const key = `${configName}/${tile}`;
+      if (tilePayloads.has(key)) {
+        const request = tilePayloads.get(key);
+        tilePayloads.delete(key);
+        tilePayloads.set(key, request);
+        return request;
+      }
+      const url = `${dataDir}/${encodeURIComponent(configName)}/${encodeURIComponent(tile)}.json`;
+      const request = fetch(url)
+        .then(response => {
+          if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+          }
+          return response.json();
+        })
+        .then(columns => attachGeometry(columns, url))
+        .then(columns => ({ name: tile, ...columns }));
+      request.catch(() => tilePayloads.delete(key));
+      tilePayloads.set(key, request);
+      return request;
+    }
+
+    function evictTiles(configName, visible) {
+      const keep = new Set(visible.map(tile => `${configName}/${tile}`));
+      for (const key of tilePayloads.keys()) {
+        if (tilePayloads.size <= MAX_CACHED_TILES) {
+          break;
+        }
+        if (!keep.has(key)) {
+          tilePayloads.delete(key);
+        }
+      }
+    }
+
+    /**
+     * Returns a tiled payload with the tiles covering `viewState` fetched (other payloads unchanged).
+     */
+    async function resolveTiles(configName, payload, viewState) {
+      if (!payload.tiles) {
+        currentTiles = null;
+        return payload;
+      }
+      const tiles = tilesInView(payload, viewState);
+      const visibleTiles = await Promise.all(tiles.map(tile => fetchTile(configName, tile)));
+      evictTiles(configName, tiles);
+      currentTiles = tiles.join(',');
+      return { ...payload, visibleTiles };
+    }
+
+    async function switchTiles() {
+      if (!currentConfig || !currentConfig.tiles || !currentViewState) {
+        return;
+      }
+      if (tilesInView(currentConfig, currentViewState).join(',') === currentTiles) {
+        return;
+      }
+      const thisRequest = requestId;
+      const payload = await resolveTiles(currentConfigName, currentConfig, currentViewState);
+      if (thisRequest === requestId && deckInstance) {
+        currentPayload = payload;
+        deckInstance.setProps({ layers: buildLayers(payload, sharedPayload) });
+      }
+    }
+
+    const sharedRequest = options.sharedPayload
+      ? fetchPayload(options.sharedPayload)
+      : Promise.resolve(null);
+
+    function levelFor(payload, zoom) {
+      return payload.levels.find(level =>
+        zoom >= level.min_zoom && (level.max_zoom === null || zoom < level.max_zoom)
+      ) || payload.levels[payload.levels.length - 1];
+    }
+
+    /**
+     * Returns the payload to draw at `zoom`: the payload itself, or its level's columns merged in.
+     */
+    async function resolveLevel(payload, zoom) {
+      if (!payload.levels) {
+        currentLevel = null;
+        return payload;
+      }
+      const level = levelFor(payload, zoom);
+      if (!levelPayloads.has(level.name)) {
+        levelPayloads.set(level.name, fetchPayload(level.name));
+      }
+      const columns = await levelPayloads.get(level.name);
+      currentLevel = level.name;
+      return { ...payload, ...columns };
+    }
+
+    async function switchLevel(zoom) {
+      if (!currentConfig || !currentConfig.levels || levelFor(currentConfig, zoom).name === currentLevel) {
+        return;
+      }
+      const thisRequest = requestId;
+      const payload = await resolveLevel(currentConfig, zoom);
+      if (thisRequest === requestId && deckInstance) {
+        currentPayload = payload;
+        deckInstance.setProps({ layers: buildLayers(payload, sharedPayload) });
+      }
+    }
+
+    async function load() {
+      const configName = configFromHash();
+      if (!configName) {
+        return;
+      }
+      const thisRequest = ++requestId;
+      levelPayloads.clear(); // Levels and tiles of the previous config are not needed anymore
+      tilePayloads.clear();
+
+      try {
+        const [configPayload, shared] = await Promise.all([fetchPayload(configName), sharedRequest]);
+        if (thisRequest !== requestId) {
+          return; // A newer config was requested while this one was loading
+        }
+
+        const viewKey = JSON.stringify(configPayload.view);
+        const recenter = viewKey !== currentViewKey;
+        const zoom = recenter || currentZoom === null ? configPayload.view.zoom : currentZoom;
+        const viewState = recenter || !currentViewState ? { ...configPayload.view, ...viewLimits } : currentViewState;
+        const payload = await resolveTiles(configName, await resolveLevel(configPayload, zoom), viewState);
+        if (thisRequest !== requestId) {
+          return;
+        }
+
+        currentConfig = configPayload;
+        currentConfigName = configName;
+        currentPayload = payload;
+        sharedPayload = shared;
+        currentZoom = zoom;
+        currentViewState = viewState;
+        const layers = buildLayers(payload, shared);
+        const initialViewState = { ...payload.view, ...viewLimits, bearing: 0, pitch: 0 };
+
+        if (!deckInstance) {
+          deckInstance = new deck.DeckGL({
+            container: 'deck-container',
+            mapStyle: MAP_STYLE,
+            controller: true,
+            initialViewState,
+            getTooltip: info => (getTooltip && currentPayload && info.index >= 0)
+              ? getTooltip(currentPayload, info, sharedPayload)
+              : null,
+            onViewStateChange: ({ viewState }) => {
+              currentZoom = viewState.zoom;
+              currentViewState = viewState;
+              switchLevel(viewState.zoom);
+              clearTimeout(tileTimer);
+              tileTimer = setTimeout(switchTiles, TILE_DEBOUNCE_MS);
+            },
+            layers
+          });
+          window.deckInstance = deckInstance;
+        } else if (recenter) {
+          // Only recenter when the country changes, so the user's pan/zoom survives config switches
+          deckInstance.setProps({ initialViewState, layers });
+        } else {
+          deckInstance.setProps({ layers });
+        }
+        currentViewKey = viewKey;
+
+        if (onPayload) {
+          onPayload(payload);
+        }
+        notifyParent('loaded', { config: configName });
+      } catch (err) {
+        console.error(`Unable to load map data for ${configName}.`, err);
+        notifyParent('error', { config: configName, message: String(err) });
+      }
+    }
+
+    window.addEventListener('hashchange', load);
+    load();
+  }
+
+  return { start, cellLayer, columnAccessor, decodeColors, colorAt };
+})();
@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    """
+    Runs every test with the default build settings (no COSMOSIM_* variables from the shell).
+    """
+    for name in list(os.environ):
+        if name.startswith('COSMOSIM_'):
+            monkeypatch.delenv(name)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Runs a test in an empty site directory with the repository's templates, like a build from the repo root.
+    """
+    os.symlink(os.path.join(REPO_ROOT, 'templates'), tmp_path / 'templates')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
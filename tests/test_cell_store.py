@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+
+from utils import cell_store
+
+
+def _write(path, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.writelines(f"{hex_index},{value}\n" for hex_index, value in rows)
+
+
+def test_round_trip_keeps_text_values(workdir):
+    source_dir = cell_store.SOURCE_DIRS['capacity']
+    first = [('85195533fffffff', 1348.934), ('851941dbfffffff', 3184.808)]
+    second = [('851941dbfffffff', 0.1), ('8519552bfffffff', 12345.6789)]
+    _write(os.path.join(source_dir, 'britain_a.txt'), first)
+    _write(os.path.join(source_dir, 'britain_b.txt'), second)
+
+    assert cell_store.convert_group('capacity', 'britain', ['britain_a.txt', 'britain_b.txt']) == (3, 2)
+    assert sorted(os.listdir(cell_store.group_dir('capacity', 'britain'))) == [
+        'britain_a.npy', 'britain_b.npy', cell_store.CELLS_FILENAME,
+    ]
+    for config_name, rows in [('britain_a', first), ('britain_b', second)]:
+        df = cell_store.load_frame('capacity', 'britain', config_name)
+        assert sorted(zip(df['hex'], df['value'])) == sorted(rows)
+
+    cells, matrix = cell_store.load_column_matrix(
+        [cell_store.column_path('capacity', 'britain', name) for name in ('britain_a', 'britain_b')]
+    )
+    assert len(cells) == 3
+    assert np.isnan(matrix).sum() == 2
+
+
+def test_files_with_duplicate_cells_are_not_stored(workdir):
+    source_dir = cell_store.SOURCE_DIRS['capacity']
+    _write(os.path.join(source_dir, 'britain_a.txt'), [('85195533fffffff', 1.0)])
+    cell_store.convert_group('capacity', 'britain', ['britain_a.txt'])
+    assert cell_store.has_config('capacity', 'britain', 'britain_a')
+
+    _write(os.path.join(source_dir, 'britain_a.txt'), [('85195533fffffff', 1.0), ('85195533fffffff', 2.0)])
+    assert cell_store.convert_group('capacity', 'britain', ['britain_a.txt']) == (0, 0)
+    assert not cell_store.has_config('capacity', 'britain', 'britain_a')
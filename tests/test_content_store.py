@@ -0,0 +1,61 @@
+import os
+
+from utils import content_store, html_writer
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test_outputs_share_one_object(workdir):
+    key = content_store.content_key('capacity', 1, [], 'britain', 'data')
+    first, second = os.path.join('out', 'a.html'), os.path.join('out', 'b.html')
+    _write(first, 'page')
+
+    assert not content_store.link_output(key, second)
+    content_store.store_output(key, first)
+    assert content_store.link_output(key, second)
+
+    stored = content_store.object_path(key, '.html')
+    assert os.stat(stored).st_nlink == 3
+    assert os.path.samefile(first, second)
+    # Linking again is a no-op and leaves no temporary file behind
+    assert content_store.link_output(key, second)
+    assert sorted(os.listdir('out')) == ['a.html', 'b.html']
+
+
+def test_content_key_depends_on_every_part():
+    key = content_store.content_key('capacity', 1, [], 'britain', 'data')
+    assert key == content_store.content_key('capacity', 1, [], 'britain', 'data')
+    assert key != content_store.content_key('capacity', 2, [], 'britain', 'data')
+    assert key != content_store.content_key('gs_utilization', 1, [], 'britain', 'data')
+    assert key != content_store.content_key('capacity', 1, [], 'britaind', 'ata')
+
+
+def test_garbage_collection_keeps_linked_objects(workdir):
+    live_key = content_store.content_key('capacity', 1, [], 'live')
+    dead_key = content_store.content_key('capacity', 1, [], 'dead')
+    _write(os.path.join('out', 'live.html'), 'live page')
+    _write(os.path.join('out', 'dead.html'), 'dead page')
+    content_store.store_output(live_key, os.path.join('out', 'live.html'))
+    content_store.store_output(dead_key, os.path.join('out', 'dead.html'))
+    os.remove(os.path.join('out', 'dead.html'))
+
+    assert content_store.collect_garbage() == (1, len('dead page'))
+    assert os.path.exists(content_store.object_path(live_key, '.html'))
+    assert not os.path.exists(content_store.object_path(dead_key, '.html'))
+
+
+def test_rewriting_a_shared_output_keeps_the_object(workdir):
+    key = content_store.content_key('capacity', 1, [], 'britain')
+    output_path = os.path.join('out', 'a.html')
+    _write(output_path, 'shared page')
+    content_store.store_output(key, output_path)
+
+    html_writer.write_chunks(['<body>new page', '</body>'], output_path)
+    with open(content_store.object_path(key, '.html')) as f:
+        assert f.read() == 'shared page'
+    with open(output_path) as f:
+        assert f.read() == '<body>new page</body>'
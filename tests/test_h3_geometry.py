@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from utils import h3_geometry, loaders, parallel
+
+h3 = pytest.importorskip('h3')
+
+WORKERS = 4
+
+
+def _cells(seed, count=300):
+    parent = h3.latlng_to_cell(52.0, -1.0, 2)
+    children = np.array(sorted(loaders.hex_to_uint64(list(h3.cell_to_children(parent, 6)))), dtype=np.uint64)
+    return np.random.default_rng(seed).choice(children, count, replace=False)
+
+
+def _cache_cells(seed):
+    cells = _cells(seed)
+    records = h3_geometry.cached_rings('britain', cells)
+    assert records['cell'].tolist() == cells.tolist()
+    return parallel.GENERATED, str(seed), None
+
+
+def test_compute_rings_match_h3():
+    cells = _cells(0, count=20)
+    records = h3_geometry.compute_rings(cells)
+    for record, cell in zip(records, loaders.uint64_to_hex(cells)):
+        boundary = h3.cell_to_boundary(cell)
+        ring = record['ring'][:record['count'] + 1]
+        assert record['count'] == len(boundary)
+        assert tuple(ring[0]) == tuple(ring[-1])
+        # The same vertices as h3 (lng/lat, float32), whatever the winding
+        distances = np.abs(ring[:-1, None, :] - np.array(boundary)[None, :, ::-1]).max(axis=2)
+        assert (distances.min(axis=0) < 1e-4).all()
+
+
+def test_concurrent_workers_merge_into_one_cache(workdir):
+    seeds = list(range(WORKERS * 3))
+    results = list(parallel.run_tasks(_cache_cells, seeds, jobs=WORKERS))
+    assert [status for status, _, _ in results] == [parallel.GENERATED] * len(seeds)
+
+    cache = h3_geometry.load_cache('britain')
+    expected = np.unique(np.concatenate([_cells(seed) for seed in seeds]))
+    assert cache['cell'].tolist() == expected.tolist()
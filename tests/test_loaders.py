@@ -0,0 +1,25 @@
+import numpy as np
+
+from utils import loaders
+
+
+def test_hex_round_trip():
+    rng = np.random.default_rng(0)
+    indexes = rng.integers(1, np.iinfo(np.uint64).max, size=1000, dtype=np.uint64, endpoint=True)
+    hexes = loaders.uint64_to_hex(indexes)
+    assert list(hexes[:5]) == [format(int(index), 'x') for index in indexes[:5]]
+    np.testing.assert_array_equal(loaders.hex_to_uint64(hexes), indexes)
+
+
+def test_hex_to_uint64_matches_int_parsing():
+    hexes = ['85195533fffffff', '851952AFFFFFFFF', '8f283082a30e623', '1']
+    assert loaders.hex_to_uint64(hexes).tolist() == [int(h, 16) for h in hexes]
+
+
+def test_read_cell_values(tmp_path):
+    path = tmp_path / 'values.txt'
+    path.write_text("851941dbfffffff,3184.808\n85195533fffffff,1348.934\n")
+    df = loaders.read_cell_values(str(path), 'capacity', with_index=True)
+    assert df['hex'].tolist() == ['851941dbfffffff', '85195533fffffff']
+    assert df['capacity'].tolist() == [3184.808, 1348.934]
+    assert df['h3'].tolist() == [0x851941dbfffffff, 0x85195533fffffff]
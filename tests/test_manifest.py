@@ -0,0 +1,85 @@
+import os
+
+from utils import manifest, parallel
+
+GENERATOR_VERSION = 1
+
+
+def _describe(task):
+    name, input_path = task
+    return name, [input_path], os.path.join('out', f"{name}.html")
+
+
+def _worker(task):
+    name, input_path = task
+    with open(input_path, 'r') as f:
+        content = f.read()
+    with open(_describe(task)[2], 'w') as f:
+        f.write(content)
+    return parallel.GENERATED, name, None
+
+
+def _run(tasks, version=GENERATOR_VERSION):
+    os.makedirs('out', exist_ok=True)
+    return manifest.run_incremental(_worker, tasks, 1, 'out', _describe, version)[0]
+
+
+def _write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test_incremental_skips_current_outputs(workdir):
+    _write('a.txt', 'a')
+    _write('b.txt', 'b')
+    tasks = [('a', 'a.txt'), ('b', 'b.txt')]
+
+    counts = _run(tasks)
+    assert (counts[parallel.GENERATED], counts[parallel.UNCHANGED]) == (2, 0)
+
+    counts = _run(tasks)
+    assert (counts[parallel.GENERATED], counts[parallel.UNCHANGED]) == (0, 2)
+
+    _write('b.txt', 'b2')
+    counts = _run(tasks)
+    assert (counts[parallel.GENERATED], counts[parallel.UNCHANGED]) == (1, 1)
+    with open(os.path.join('out', 'b.html')) as f:
+        assert f.read() == 'b2'
+
+    # A deleted output is rebuilt even though its inputs did not change
+    os.remove(os.path.join('out', 'a.html'))
+    assert _run(tasks)[parallel.GENERATED] == 1
+
+    # So is every output when the generator version changes
+    assert _run(tasks, version=GENERATOR_VERSION + 1)[parallel.GENERATED] == 2
+
+
+def test_incremental_prunes_outputs_of_removed_configs(workdir):
+    _write('a.txt', 'a')
+    _write('b.txt', 'b')
+    _run([('a', 'a.txt'), ('b', 'b.txt')])
+    _write(os.path.join('out', 'b.html.gz'), 'compressed')
+
+    counts = _run([('a', 'a.txt')])
+    assert counts[parallel.UNCHANGED] == 1
+    assert sorted(os.listdir('out')) == ['.manifest.json', 'a.html']
+    assert set(manifest.load_manifest('out')) == {'a'}
+
+
+def test_failed_outputs_are_not_recorded(workdir):
+    tasks = [('missing', 'missing.txt')]
+
+    def failing(task):
+        return parallel.FAILED, task[0], 'no data'
+
+    os.makedirs('out', exist_ok=True)
+    manifest.run_incremental(failing, tasks, 1, 'out', _describe, GENERATOR_VERSION)
+    assert manifest.load_manifest('out') == {}
+
+
+def test_digest_inputs_hash_like_files(workdir):
+    _write('a.txt', 'a')
+    hashed = manifest.inputs_hash(['a.txt', ('row[a]', 'digest')], GENERATOR_VERSION)
+    assert hashed == manifest.inputs_hash(['a.txt', ('row[a]', 'digest')], GENERATOR_VERSION)
+    assert hashed != manifest.inputs_hash(['a.txt', ('row[a]', 'other digest')], GENERATOR_VERSION)
+    assert hashed != manifest.inputs_hash(['a.txt', ('row[b]', 'digest')], GENERATOR_VERSION)
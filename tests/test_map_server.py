@@ -0,0 +1,205 @@
+import concurrent.futures
+import http.client
+import http.server
+import os
+import threading
+import time
+
+import pytest
+
+from utils import map_server
+
+PAGE_BYTES = 100
+
+
+class FakeExecutor:
+    """
+    Stands in for the worker pool: "renders" a page of PAGE_BYTES bytes per config and counts the renders.
+    """
+
+    def __init__(self, release=None):
+        self.renders = []
+        self.release = release
+        self.started = threading.Event()
+
+    def submit(self, fn, kind, name, html_path):
+        assert fn is map_server._render
+        self.renders.append(name)
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        future = concurrent.futures.Future()
+        if name == 'empty':
+            future.set_result(None)
+            return future
+        with open(html_path, 'wb') as f:
+            f.write(name.encode().ljust(PAGE_BYTES, b'.'))
+        future.set_result(html_path)
+        return future
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    """
+    Returns the input paths of a config name (one data file per config).
+    """
+    def make(name):
+        path = tmp_path / f"{name}.txt"
+        if not path.exists():
+            path.write_text(name)
+        return [str(path)]
+    return make
+
+
+def _cache(tmp_path, executor, memory_pages=10, disk_pages=10):
+    return map_server.RenderCache(
+        executor, str(tmp_path / 'cache'), memory_pages * PAGE_BYTES, disk_pages * PAGE_BYTES
+    )
+
+
+def _get(cache, name, inputs):
+    return cache.get('capacity', name, inputs(name))
+
+
+def test_hits_do_not_render_again(tmp_path, inputs):
+    executor = FakeExecutor()
+    cache = _cache(tmp_path, executor)
+    page = _get(cache, 'a', inputs)
+    assert page.startswith(b'a.') and len(page) == PAGE_BYTES
+    assert _get(cache, 'a', inputs) == page
+    assert executor.renders == ['a']
+
+
+def test_changed_inputs_render_again(tmp_path, inputs):
+    executor = FakeExecutor()
+    cache = _cache(tmp_path, executor)
+    input_paths = inputs('a')
+    cache.get('capacity', 'a', input_paths)
+    with open(input_paths[0], 'a') as f:
+        f.write('more data')
+    cache.get('capacity', 'a', input_paths)
+    assert executor.renders == ['a', 'a']
+
+
+def test_memory_evicts_least_recently_used(tmp_path, inputs):
+    executor = FakeExecutor()
+    cache = _cache(tmp_path, executor, memory_pages=2)
+    for name in ['a', 'b', 'a', 'c']:
+        _get(cache, name, inputs)
+    assert cache.memory_used == 2 * PAGE_BYTES
+    keys = {name: map_server.cache_key('capacity', name, inputs(name)) for name in 'abc'}
+    assert list(cache.memory) == [keys['a'], keys['c']]
+    # 'b' left memory but is still served from disk
+    _get(cache, 'b', inputs)
+    assert executor.renders == ['a', 'b', 'c']
+
+
+def test_disk_evicts_least_recently_used(tmp_path, inputs):
+    executor = FakeExecutor()
+    cache = _cache(tmp_path, executor, memory_pages=0, disk_pages=2)
+    for name in ['a', 'b', 'a', 'c']:
+        _get(cache, name, inputs)
+    assert executor.renders == ['a', 'b', 'c']
+    assert cache.disk_used == 2 * PAGE_BYTES
+    kept = {map_server.cache_key('capacity', name, inputs(name)) for name in 'ac'}
+    assert set(os.listdir(cache.cache_dir)) == {f"{key}.html" for key in kept}
+    _get(cache, 'b', inputs)
+    assert executor.renders == ['a', 'b', 'c', 'b']
+
+
+def test_restart_reuses_pages_on_disk(tmp_path, inputs):
+    cache = _cache(tmp_path, FakeExecutor())
+    page = _get(cache, 'a', inputs)
+    (tmp_path / 'cache' / 'interrupted.html.tmp').write_text('partial')
+
+    executor = FakeExecutor()
+    cache = _cache(tmp_path, executor)
+    assert cache.disk_used == PAGE_BYTES
+    assert not (tmp_path / 'cache' / 'interrupted.html.tmp').exists()
+    assert _get(cache, 'a', inputs) == page
+    assert executor.renders == []
+
+
+def test_configs_without_data_are_not_cached(tmp_path, inputs):
+    executor = FakeExecutor()
+    cache = _cache(tmp_path, executor)
+    assert _get(cache, 'empty', inputs) is None
+    assert _get(cache, 'empty', inputs) is None
+    assert executor.renders == ['empty', 'empty']
+    assert cache.disk_used == 0 and not cache.in_flight
+
+
+def test_concurrent_requests_share_one_render(tmp_path, inputs):
+    release = threading.Event()
+    executor = FakeExecutor(release)
+    cache = _cache(tmp_path, executor)
+    input_paths = inputs('a')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        first = pool.submit(cache.get, 'capacity', 'a', input_paths)
+        assert executor.started.wait(5)
+        others = [pool.submit(cache.get, 'capacity', 'a', input_paths) for _ in range(7)]
+        time.sleep(0.1)  # Lets the other requests find the render in flight
+        release.set()
+        pages = [first.result()] + [future.result() for future in others]
+
+    assert executor.renders == ['a']
+    assert len(set(pages)) == 1
+    assert not cache.in_flight
+
+
+GS_NAME = 'britain_0_1000_population_priority_gs_utilizations'
+
+
+@pytest.fixture
+def gs_site(workdir):
+    """
+    Lays out a site with one GS utilization config and the ground station table.
+    """
+    os.makedirs('static/gs_utilizations_data')
+    with open(f'static/gs_utilizations_data/{GS_NAME}.txt', 'w') as f:
+        f.write('0,0.5\n')
+    with open('static/ground_stations_starlink.csv', 'w') as f:
+        f.write('0,Ikire,7.3781,4.1864,0\n')
+    return workdir
+
+
+def test_resolve_checks_gs_names(gs_site):
+    assert map_server.resolve(f'/static/visualizations/gs_utilizations/{GS_NAME}.html')[:2] == ('gs', GS_NAME)
+    # A data file outside the naming scheme is not a map
+    os.symlink(f'{GS_NAME}.txt', 'static/gs_utilizations_data/notes.txt')
+    assert map_server.resolve('/static/visualizations/gs_utilizations/notes.html') is None
+
+
+def test_station_table_reloads_when_the_csv_changes(gs_site):
+    stations, _ = map_server._station_table()
+    assert list(stations['id']) == [0]
+    with open('static/ground_stations_starlink.csv', 'a') as f:
+        f.write('1,Lekki,6.4412,3.4711,0\n')
+    stations, _ = map_server._station_table()
+    assert list(stations['id']) == [0, 1]
+
+
+def test_head_goes_through_the_render_cache(gs_site):
+    executor = FakeExecutor()
+    map_server.MapRequestHandler.cache = _cache(gs_site, executor)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), map_server.MapRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        def request(method, path):
+            connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+            connection.request(method, path)
+            response = connection.getresponse()
+            return response.status, response.getheader('Content-Length'), response.read()
+
+        path = f'/static/visualizations/gs_utilizations/{GS_NAME}.html'
+        assert request('HEAD', path) == (200, str(PAGE_BYTES), b'')
+        status, length, body = request('GET', path)
+        assert (status, length, len(body)) == (200, str(PAGE_BYTES), PAGE_BYTES)
+        assert executor.renders == [GS_NAME]
+        assert request('HEAD', '/static/visualizations/gs_utilizations/notes.html')[0] == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+        map_server.MapRequestHandler.cache = None
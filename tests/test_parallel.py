@@ -0,0 +1,18 @@
+from utils import parallel
+
+
+def _worker(task):
+    status, name = task
+    return status, name, 'empty data file' if status == parallel.SKIPPED else None
+
+
+def test_missing_configs_are_counted_apart_from_skipped(capsys):
+    tasks = [(parallel.GENERATED, 'a'), (parallel.SKIPPED, 'b'), (parallel.GENERATED, 'c')]
+    counts, failures = parallel.tally_results(parallel.run_tasks(_worker, tasks))
+    counts[parallel.MISSING] += 2
+    parallel.print_summary(counts, failures)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert '    - SKIPPED (empty data file): b' in lines
+    assert '   Total configurations skipped: 1' in lines
+    assert '    Total configs missing data: 2' in lines
@@ -0,0 +1,76 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import loaders, pyramid
+
+h3 = pytest.importorskip('h3')
+
+
+def _cells(resolution, count=200):
+    rng = np.random.default_rng(1)
+    lats = rng.uniform(-60, 60, count)
+    lngs = rng.uniform(-180, 180, count)
+    return [h3.latlng_to_cell(lat, lng, resolution) for lat, lng in zip(lats, lngs)]
+
+
+@pytest.mark.parametrize('resolution', [5, 9, 15])
+def test_parent_cells_match_h3(resolution):
+    cells = _cells(resolution)
+    indexes = loaders.hex_to_uint64(cells)
+    assert pyramid.resolution_of(indexes).tolist() == [resolution] * len(cells)
+    for parent_resolution in range(resolution):
+        expected = [h3.cell_to_parent(cell, parent_resolution) for cell in cells]
+        parents = loaders.uint64_to_hex(pyramid.parent_cells(indexes, parent_resolution))
+        assert parents.tolist() == expected
+
+
+def test_aggregate():
+    parent = h3.latlng_to_cell(51.5, -0.1, 4)
+    children = sorted(h3.cell_to_children(parent, 5))[:3]
+    other = h3.latlng_to_cell(-30.0, 22.9, 5)
+    cells = loaders.hex_to_uint64(children + [other])
+    values = [1.0, 2.0, 6.0, 5.0]
+
+    for how, expected in [('sum', 9.0), ('min', 1.0), ('mean', 3.0)]:
+        parents, aggregated = pyramid.aggregate(cells, values, 4, how)
+        result = dict(zip(loaders.uint64_to_hex(parents).tolist(), aggregated.tolist()))
+        assert result == {parent: expected, h3.cell_to_parent(other, 4): 5.0}
+
+
+def test_build_levels_cover_every_zoom():
+    cells = loaders.hex_to_uint64(_cells(7))
+    levels = pyramid.build_levels(cells, np.ones(len(cells)), 'sum')
+    assert levels[0]['min_zoom'] == 0
+    assert levels[-1]['max_zoom'] is None
+    assert [level['resolution'] for level in levels] == sorted(level['resolution'] for level in levels)
+    for level, finer in zip(levels, levels[1:]):
+        assert level['max_zoom'] == finer['min_zoom']
+    # Every level keeps the total of the native cells
+    assert {float(level['values'].sum()) for level in levels} == {float(len(cells))}
+
+
+def test_only_levels_shown_at_the_initial_zoom_are_embedded(workdir):
+    html_path = str(workdir / 'page.html')
+    levels = pyramid.build_levels(loaders.hex_to_uint64(_cells(7)), np.ones(200), 'sum')
+    initial_zoom = levels[-1]['min_zoom']
+    files = []
+    for level in levels:
+        frame = pd.DataFrame({'hex': loaders.uint64_to_hex(level['cells']), 'value': level['values']})
+        data, level_file = pyramid.level_data('layer', level, frame, initial_zoom, html_path)
+        if level['max_zoom'] is None:
+            assert level_file is None and len(data) == len(frame)
+        else:
+            assert len(data) == 0
+            with open(workdir / level_file) as f:
+                assert json.load(f) == frame.to_dict('records')
+            files.append(level_file)
+    assert sorted(files) == sorted(
+        f"page.{pyramid.layer_id('layer', level)}.json" for level in levels[:-1]
+    )
+
+    pyramid.remove_level_files(html_path)
+    assert not any(name.endswith('.json') for name in os.listdir(workdir))
@@ -0,0 +1,81 @@
+import argparse
+import os
+
+import numpy as np
+import pytest
+
+from utils import parallel, stats_index
+
+
+def _capacity_name(terminals):
+    return f"britain_0_{terminals}_population_priority_cell_capacities.txt"
+
+
+def _record(terminals):
+    stats_index.record('capacity', _capacity_name(terminals), np.arange(terminals, dtype=np.float64))
+    return parallel.GENERATED, _capacity_name(terminals), None
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    path = str(tmp_path / 'stats' / 'config_stats.sqlite')
+    monkeypatch.setenv(stats_index.STATS_INDEX_ENV, path)
+    return path
+
+
+def test_recording_is_off_by_default(tmp_path):
+    assert stats_index.index_path() is None
+    # A no-op rather than writing to the default index
+    stats_index.record('capacity', _capacity_name(10), [1.0])
+
+
+def test_workers_record_concurrently(index):
+    terminals = [10, 20, 30, 40, 50, 60, 70, 80]
+    results = list(parallel.run_tasks(_record, terminals, jobs=4))
+    assert [status for status, _, _ in results] == [parallel.GENERATED] * len(terminals)
+
+    rows = stats_index.query(
+        "SELECT config, country, terminals, beam_alloc, cells, total, min, max FROM config_stats "
+        "WHERE kind = 'capacity' ORDER BY terminals", path=index,
+    )
+    assert rows['terminals'].tolist() == terminals
+    assert rows['cells'].tolist() == terminals
+    assert rows['total'].tolist() == [n * (n - 1) / 2 for n in terminals]
+    assert set(rows['country']) == {'britain'}
+    assert set(rows['beam_alloc']) == {'priority'}
+    assert rows['config'][0] == _capacity_name(10)[:-len('.txt')]
+
+
+def test_recording_again_replaces_the_row(index):
+    _record(10)
+    stats_index.record('capacity', _capacity_name(10), [5.0])
+    rows = stats_index.query("SELECT cells, total FROM config_stats", path=index)
+    assert rows.to_dict('records') == [{'cells': 1, 'total': 5.0}]
+
+
+def test_prune_drops_removed_configs(index):
+    for terminals in [10, 20, 30]:
+        _record(terminals)
+    stats_index.record('heatmap', 'britain_50000_100000_0.7', [0.5])
+
+    stats_index.prune('capacity', [_capacity_name(10), _capacity_name(30)])
+    rows = stats_index.query("SELECT kind, terminals FROM config_stats ORDER BY kind, terminals", path=index)
+    assert list(zip(rows['kind'], rows['terminals'])) == [('capacity', 10), ('capacity', 30), ('heatmap', 50000)]
+
+
+def test_new_index_starts_from_the_data_files(workdir):
+    os.makedirs('static/country_capacity_data')
+    for terminals in [10, 20]:
+        with open(os.path.join('static/country_capacity_data', _capacity_name(terminals)), 'w') as f:
+            f.write('851941dbfffffff,3.5\n85195533fffffff,1.5\n')
+    path = str(workdir / 'config_stats.sqlite')
+
+    # An incremental build that renders nothing still gets a row per config
+    stats_index.configure_from_args(argparse.Namespace(stats_index=path))
+    rows = stats_index.query("SELECT terminals, total FROM config_stats ORDER BY terminals", path=path)
+    assert rows.to_dict('records') == [{'terminals': 10, 'total': 5.0}, {'terminals': 20, 'total': 5.0}]
+
+    # An index that already has rows is kept as is
+    os.remove(os.path.join('static/country_capacity_data', _capacity_name(20)))
+    stats_index.configure_from_args(argparse.Namespace(stats_index=path))
+    assert len(stats_index.query("SELECT * FROM config_stats", path=path)) == 2
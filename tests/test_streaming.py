@@ -0,0 +1,105 @@
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import generate_capacity_maps, generate_heatmaps, loaders, streaming
+
+CAPACITY_FILENAME = 'britain_0_1000_population_priority_cell_capacities.txt'
+HEATMAP_CONFIG = 'britain_50000_100000_0.7'
+ROWS = 2500
+CHUNK_ROWS = 700
+
+
+def _hexes(count, offset=0):
+    return loaders.uint64_to_hex(0x85195533fffffff + (np.arange(count, dtype=np.uint64) + offset) * (1 << 45))
+
+
+def _write_values(path, hexes, values):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.DataFrame({'hex': hexes, 'value': values}).to_csv(path, header=False, index=False)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _page(path):
+    """
+    Splits a pydeck page into (text around the deck, deck JSON without layer ids).
+
+    pydeck gives unnamed layers a random id, and streamed rows are compact JSON
+    where pydeck indents, so pages are compared by content.
+    """
+    with open(path, 'r') as f:
+        text = f.read()
+    match = re.search(r'const jsonInput = (.*?);\n', text, re.S)
+    deck = json.loads(match.group(1))
+    for layer in deck['layers']:
+        layer.pop('id')
+    return text[:match.start(1)] + text[match.end(1):], deck
+
+
+@pytest.fixture
+def capacity_file(workdir):
+    values = np.round(np.random.default_rng(2).uniform(0, 5000, ROWS), 3)
+    _write_values(os.path.join(generate_capacity_maps.DATA_DIR, CAPACITY_FILENAME), _hexes(ROWS), values)
+    return CAPACITY_FILENAME
+
+
+@pytest.mark.parametrize('output_format', ['html', 'shell'])
+def test_chunked_capacity_output_matches_whole_file(capacity_file, output_format):
+    output_path = generate_capacity_maps.output_path(capacity_file, output_format)
+    read = _read if output_format == 'shell' else _page
+    h3_data = loaders.load_capacity(os.path.join(generate_capacity_maps.DATA_DIR, capacity_file))
+    if output_format == 'shell':
+        generate_capacity_maps.create_country_capacity_payload(h3_data, 'Britain', capacity_file)
+    else:
+        generate_capacity_maps.create_country_capacity_map(h3_data, 'Britain', capacity_file)
+    whole = read(output_path)
+
+    generate_capacity_maps.stream_config('Britain', capacity_file, output_format, CHUNK_ROWS)
+    assert read(output_path) == whole
+
+
+def test_chunked_heatmap_page_matches_whole_file(workdir):
+    heatmap_path = os.path.join(generate_heatmaps.DATA_DIR, f"{HEATMAP_CONFIG}_cell_values.txt")
+    nation_path = os.path.join(generate_heatmaps.DATA_DIR, 'cells_britain_50000_100000.txt')
+    rng = np.random.default_rng(3)
+    _write_values(heatmap_path, _hexes(ROWS), np.round(rng.uniform(0.2, 1.0, ROWS), 4))
+    _write_values(nation_path, _hexes(ROWS // 2, offset=ROWS), rng.integers(0, 3, ROWS // 2))
+
+    html_path = generate_heatmaps.html_output_path(HEATMAP_CONFIG)
+    generate_heatmaps.render_config('Britain', HEATMAP_CONFIG, heatmap_path, nation_path)
+    whole = _page(html_path)
+
+    generate_heatmaps.render_config_streamed('Britain', HEATMAP_CONFIG, heatmap_path, nation_path, CHUNK_ROWS)
+    assert _page(html_path) == whole
+
+
+def test_json_array_matches_compact_json():
+    frame = pd.DataFrame({'hex': ['a', 'b', 'c'], 'value': [1.5, 2.0, 3.25]})
+    chunks = [frame[:2], frame[2:2], frame[2:]]
+    expected = json.dumps(frame.to_dict('records'), separators=(',', ':'))
+    assert ''.join(streaming.json_array(chunks)) == expected
+    assert ''.join(streaming.json_array([])) == '[]'
+
+
+def test_histogram_quantiles_are_exact_to_a_bin():
+    values = np.random.default_rng(4).gamma(2.0, 100.0, 50_000)
+    histogram = streaming.Histogram(values.min(), values.max())
+    for chunk in np.array_split(values, 7):
+        histogram.add(chunk)
+    bin_width = (values.max() - values.min()) / streaming.QUANTILE_BINS
+    quantiles = [0.1, 0.5, 0.9]
+    np.testing.assert_allclose(histogram.quantiles(quantiles), np.quantile(values, quantiles), atol=bin_width)
+
+
+def test_scan_stats():
+    chunks = [np.array([3.0, 1.0]), np.array([]), np.array([7.0])]
+    assert streaming.scan_stats(chunks) == {'cells': 3, 'total': 11.0, 'min': 1.0, 'max': 7.0}
+    assert streaming.scan_stats([]) == {'cells': 0}
@@ -0,0 +1,284 @@
+import argparse
+import functools
+import hashlib
+import json
+import os
+import re
+import urllib.parse
+import urllib.request
+
+import pydeck
+from pydeck.io.html import CDN_CSS_URL, CDN_URL
+
+# Third-party files the generated pages load from CDNs are vendored here once,
+# under fingerprinted names ('mapbox-gl-1.13.0.<hash>.js'): a file's name
+# changes whenever its content does, so browsers can cache them for good and
+# the pages keep working without internet access.
+VENDOR_DIR = os.path.join('static', 'vendor')
+VENDOR_MANIFEST_PATH = os.path.join(VENDOR_DIR, 'assets.json')
+
+# Setting LOCAL_ASSETS_ENV makes the generators point pages at the vendored
+# copies. Like profiling, the variable is what reaches the worker processes.
+LOCAL_ASSETS_ENV = 'COSMOSIM_LOCAL_ASSETS'
+
+# Setting ASSET_ROOT_ENV to a URL prefix ('/') makes the vendored URLs absolute
+# under it instead of relative to the page, for pages written somewhere other
+# than where they are served from (the map server's render cache).
+ASSET_ROOT_ENV = 'COSMOSIM_ASSET_ROOT'
+
+# The jupyter-widget bundle shipped inside the installed pydeck, matching its version exactly
+PYDECK_BUNDLE = 'pydeck:nbextension/static/index.js'
+
+# URL referenced by the pages -> (vendored name, source it is downloaded from).
+# Versions are pinned in the URLs; the two pydeck ranges are pinned by the
+# installed pydeck (its bundled widget) and by the first vendoring (the
+# manifest keeps the resolved file until --refresh).
+ASSETS = {
+    # pydeck pages (templates of pydeck.io.html)
+    'https://api.tiles.mapbox.com/mapbox-gl-js/v1.13.0/mapbox-gl.js': (
+        'mapbox-gl-1.13.0.js', 'https://api.tiles.mapbox.com/mapbox-gl-js/v1.13.0/mapbox-gl.js'
+    ),
+    'https://maxcdn.bootstrapcdn.com/bootstrap/3.2.0/css/bootstrap-theme.min.css': (
+        'bootstrap-theme-3.2.0.min.css', 'https://maxcdn.bootstrapcdn.com/bootstrap/3.2.0/css/bootstrap-theme.min.css'
+    ),
+    'https://maxcdn.bootstrapcdn.com/font-awesome/4.6.3/css/font-awesome.min.css': (
+        'font-awesome-4.6.3.min.css', 'https://maxcdn.bootstrapcdn.com/font-awesome/4.6.3/css/font-awesome.min.css'
+    ),
+    'https://unpkg.com/maplibre-gl@5.14.0/dist/maplibre-gl.css': (
+        'maplibre-gl-5.14.0.css', 'https://unpkg.com/maplibre-gl@5.14.0/dist/maplibre-gl.css'
+    ),
+    CDN_URL: (f'deckgl-jupyter-widget-pydeck-{pydeck.__version__}.js', PYDECK_BUNDLE),
+    CDN_CSS_URL: ('deckgl-widgets.css', CDN_CSS_URL),
+    # Shared viewer pages (templates/viewers/)
+    'https://unpkg.com/deck.gl@~9.0/dist.min.js': ('deck.gl-9.0.min.js', 'https://unpkg.com/deck.gl@~9.0/dist.min.js'),
+    'https://unpkg.com/maplibre-gl@3.6.2/dist/maplibre-gl.js': (
+        'maplibre-gl-3.6.2.js', 'https://unpkg.com/maplibre-gl@3.6.2/dist/maplibre-gl.js'
+    ),
+    'https://unpkg.com/maplibre-gl@3.6.2/dist/maplibre-gl.css': (
+        'maplibre-gl-3.6.2.css', 'https://unpkg.com/maplibre-gl@3.6.2/dist/maplibre-gl.css'
+    ),
+    'https://unpkg.com/h3-js@4.1.0/dist/h3-js.umd.js': (
+        'h3-js-4.1.0.umd.js', 'https://unpkg.com/h3-js@4.1.0/dist/h3-js.umd.js'
+    ),
+}
+
+# url(...) references of a stylesheet (fonts, images)
+CSS_URL_PATTERN = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def enabled():
+    """
+    True if the pages should reference the vendored assets (see LOCAL_ASSETS_ENV).
+    """
+    return bool(os.environ.get(LOCAL_ASSETS_ENV))
+
+
+def fingerprinted_name(name, content):
+    """
+    Inserts a content hash before the extension ('mapbox-gl.js' -> 'mapbox-gl.<hash>.js').
+    """
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def _fetch(source):
+    """
+    Returns (content, resolved source) of an asset source.
+    """
+    if source.startswith('pydeck:'):
+        path = os.path.join(os.path.dirname(pydeck.__file__), source[len('pydeck:'):])
+        with open(path, 'rb') as f:
+            return f.read(), f"{source} ({pydeck.__version__})"
+    with urllib.request.urlopen(source, timeout=60) as response:
+        # unpkg redirects version ranges to the exact version
+        return response.read(), response.geturl()
+
+
+def _write(name, content, vendor_dir):
+    filename = fingerprinted_name(name, content)
+    path = os.path.join(vendor_dir, filename)
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    return filename
+
+
+def _vendor_stylesheet(content, source, vendor_dir):
+    """
+    Vendors the files a stylesheet references and points its url(...)s at them.
+
+    Returns:
+        tuple: (rewritten stylesheet, vendored dependency filenames)
+    """
+    text = content.decode('utf-8')
+    dependencies = {}
+
+    def localize(match):
+        quote, reference = match.groups()
+        if reference.startswith(('data:', '#')):
+            return match.group(0)
+        # Keep cache-busting queries and fragments ('...webfont.eot?#iefix') on the local reference
+        split = urllib.parse.urlsplit(urllib.parse.urljoin(source, reference))
+        file_url = urllib.parse.urlunsplit((split.scheme, split.netloc, split.path, '', ''))
+        if file_url not in dependencies:
+            dependency_content, _ = _fetch(file_url)
+            dependencies[file_url] = _write(os.path.basename(split.path), dependency_content, vendor_dir)
+        suffix = reference[len(reference.split('?')[0].split('#')[0]):]
+        return f"url({quote}{dependencies[file_url]}{suffix}{quote})"
+
+    return CSS_URL_PATTERN.sub(localize, text).encode('utf-8'), sorted(dependencies.values())
+
+
+def load_vendor_manifest(path=VENDOR_MANIFEST_PATH):
+    """
+    Loads the vendored assets manifest ({} if nothing was vendored yet).
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def vendor(refresh=False, vendor_dir=VENDOR_DIR):
+    """
+    Downloads every asset of ASSETS into `vendor_dir` under fingerprinted names.
+
+    Assets already in the manifest are kept unless `refresh` is set, so the
+    vendored versions only change on purpose. Files no longer referenced by the
+    manifest are removed.
+
+    Args:
+        refresh (bool): Download every asset again.
+        vendor_dir (str): Output directory.
+    """
+    os.makedirs(vendor_dir, exist_ok=True)
+    manifest_path = os.path.join(vendor_dir, os.path.basename(VENDOR_MANIFEST_PATH))
+    manifest = {} if refresh else load_vendor_manifest(manifest_path)
+    manifest = {url: entry for url, entry in manifest.items() if url in ASSETS}
+
+    for url, (name, source) in ASSETS.items():
+        entry = manifest.get(url)
+        if entry and all(os.path.exists(os.path.join(vendor_dir, f)) for f in [entry['file']] + entry['dependencies']):
+            print(f"  - Kept: {entry['file']}")
+            continue
+        content, resolved = _fetch(source)
+        dependencies = []
+        if name.endswith('.css'):
+            content, dependencies = _vendor_stylesheet(content, resolved, vendor_dir)
+        manifest[url] = {'file': _write(name, content, vendor_dir), 'source': resolved, 'dependencies': dependencies}
+        print(f"  - Vendored: {manifest[url]['file']} ({resolved})")
+
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+    live = {os.path.basename(manifest_path)}
+    for entry in manifest.values():
+        live.update([entry['file']] + entry['dependencies'])
+    for filename in os.listdir(vendor_dir):
+        path = os.path.join(vendor_dir, filename)
+        if filename not in live and os.path.isfile(path):
+            os.remove(path)
+    return manifest
+
+
+@functools.lru_cache(maxsize=None)
+def _vendored_files(mtime_ns):
+    return {url: entry['file'] for url, entry in load_vendor_manifest().items()}
+
+
+def vendored_files():
+    """
+    Returns {CDN URL: vendored filename}, read once per manifest version.
+    """
+    try:
+        mtime_ns = os.stat(VENDOR_MANIFEST_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    return _vendored_files(mtime_ns)
+
+
+def local_urls(page_dir):
+    """
+    Returns {CDN URL: vendored file URL relative to a page directory}, empty when local assets are off.
+
+    With ASSET_ROOT_ENV set, the URLs are absolute under that prefix and `page_dir` is ignored.
+    """
+    if not enabled():
+        return {}
+    root = os.environ.get(ASSET_ROOT_ENV)
+    if root:
+        vendor_url = f"{root.rstrip('/')}/{VENDOR_DIR.replace(os.sep, '/')}"
+        return {url: f"{vendor_url}/{filename}" for url, filename in vendored_files().items()}
+    return {
+        url: os.path.relpath(os.path.join(VENDOR_DIR, filename), page_dir).replace(os.sep, '/')
+        for url, filename in vendored_files().items()
+    }
+
+
+def rewrite(text, urls):
+    """
+    Replaces the CDN URLs of a page (or page chunk) with their local URLs (see local_urls()).
+    """
+    for url, local_url in urls.items():
+        text = text.replace(url, local_url)
+    return text
+
+
+def rewrite_head(chunks, urls):
+    """
+    Applies rewrite() to page chunks up to </head>, passing the (large) rest through untouched.
+    """
+    in_head = bool(urls)
+    for chunk in chunks:
+        if in_head:
+            in_head = '</head>' not in chunk
+            chunk = rewrite(chunk, urls)
+        yield chunk
+
+
+def versioned(generator_version):
+    """
+    Extends a generator version with the vendored assets, so incremental builds
+    and render caches redo pages when local assets are toggled or re-vendored.
+    """
+    if not enabled():
+        return generator_version
+    files = sorted(vendored_files().values())
+    version = f"{generator_version}+assets-{hashlib.sha256(' '.join(files).encode()).hexdigest()[:12]}"
+    root = os.environ.get(ASSET_ROOT_ENV)
+    return f"{version}@{root}" if root else version
+
+
+def add_assets_argument(parser):
+    """
+    Adds the shared --local-assets option to a generator's argument parser.
+    """
+    parser.add_argument(
+        '--local-assets', action='store_true',
+        help=f"Reference the JS/CSS vendored under '{VENDOR_DIR}' instead of CDNs "
+             "(vendor them with 'python -m utils.assets')"
+    )
+
+
+def configure_from_args(args):
+    """
+    Turns local assets on for this process and its workers if --local-assets is given.
+    """
+    if args.local_assets:
+        if not vendored_files():
+            raise SystemExit(
+                f"ERROR: No vendored assets at '{VENDOR_MANIFEST_PATH}', run 'python -m utils.assets' first"
+            )
+        os.environ[LOCAL_ASSETS_ENV] = '1'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vendor the pages' CDN assets under static/vendor.")
+    parser.add_argument('--refresh', action='store_true', help="Download every asset again")
+    args = parser.parse_args()
+    print(f"Vendoring front-end assets into '{VENDOR_DIR}'...")
+    vendor(refresh=args.refresh)
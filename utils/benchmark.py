@@ -0,0 +1,271 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from utils import (
+    generate_capacity_maps, generate_gs_utilization_maps, generate_heatmaps, gs_matrix, loaders, profiling
+)
+
+REPORT_PATH = 'bench_report.json'
+
+# A stage only counts as a regression when it is this much slower than the
+# baseline *and* slower by more than the noise floor
+DEFAULT_THRESHOLD = 0.25
+NOISE_FLOOR_S = 0.005
+
+# Default workload size, roughly one real config of each kind
+DEFAULT_CAPACITY_CELLS = 40000
+DEFAULT_HEATMAP_CELLS = 150000
+DEFAULT_NATION_CELLS = 20000
+DEFAULT_STATIONS = 150
+
+# H3 index layout: mode (4 bits) | resolution (4) | base cell (7) | 15 digits of 3 bits
+H3_CELL_MODE = 1
+H3_RESOLUTION = 7
+H3_PENTAGON_BASE_CELLS = frozenset([4, 14, 24, 38, 49, 58, 63, 72, 83, 97, 107, 117])
+H3_HEXAGON_BASE_CELLS = np.array([cell for cell in range(122) if cell not in H3_PENTAGON_BASE_CELLS])
+
+
+def synthetic_h3_cells(rng, count, base_cells):
+    """
+    Draws `count` distinct, valid resolution-7 H3 cells under the given base cells.
+
+    Only hexagonal base cells are used, so every digit combination is a valid
+    cell; a country maps to a handful of base cells like real data does.
+
+    Returns:
+        np.ndarray: Sorted unique uint64 indexes.
+    """
+    cells = np.empty(0, dtype=np.uint64)
+    while len(cells) < count:
+        draw = count - len(cells)
+        index = np.full(draw, (H3_CELL_MODE << 59) | (H3_RESOLUTION << 52), dtype=np.uint64)
+        index |= rng.choice(base_cells, draw).astype(np.uint64) << np.uint64(45)
+        for digit in range(15):
+            shift = np.uint64(3 * (14 - digit))
+            values = rng.integers(0, 7, draw) if digit < H3_RESOLUTION else np.full(draw, 7)
+            index |= values.astype(np.uint64) << shift
+        cells = np.unique(np.concatenate([cells, index]))
+    return rng.permutation(cells)[:count]
+
+
+def _write_cell_file(path, cells, values, value_format):
+    """
+    Writes a headerless 'hex,value' file like the simulator does.
+    """
+    hexes = loaders.uint64_to_hex(cells)
+    with open(path, 'w') as f:
+        f.writelines(f"{hex_id},{value:{value_format}}\n" for hex_id, value in zip(hexes, values))
+
+
+def build_workload(work_dir, seed=0, capacity_cells=DEFAULT_CAPACITY_CELLS, heatmap_cells=DEFAULT_HEATMAP_CELLS,
+                   nation_cells=DEFAULT_NATION_CELLS, stations=DEFAULT_STATIONS):
+    """
+    Synthesizes one input file set per generator under `work_dir`.
+
+    Args:
+        work_dir (str): Directory receiving the inputs.
+        seed (int): Random seed, so a workload is reproducible across runs.
+        capacity_cells (int): Cells of the capacity file (one country).
+        heatmap_cells (int): Cells of the heatmap values file (worldwide).
+        nation_cells (int): Cells of the nation file.
+        stations (int): Ground stations in the station table and utilization file.
+
+    Returns:
+        dict: Paths of the synthesized files and their row counts.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(work_dir, exist_ok=True)
+
+    # Capacity: one country, a few neighbouring base cells
+    capacity_path = os.path.join(work_dir, 'britain_0_1000_population_priority_cell_capacities.txt')
+    cells = synthetic_h3_cells(rng, capacity_cells, H3_HEXAGON_BASE_CELLS[:3])
+    _write_cell_file(capacity_path, cells, rng.gamma(2.0, 400.0, len(cells)), '.6f')
+
+    # Heatmap: worldwide values plus the country's nation cells
+    heatmap_path = os.path.join(work_dir, 'britain_50000_100000_0.7_cell_values.txt')
+    cells = synthetic_h3_cells(rng, heatmap_cells, H3_HEXAGON_BASE_CELLS)
+    _write_cell_file(heatmap_path, cells, rng.uniform(0.3, 1.0, len(cells)), '.6f')
+    nation_path = os.path.join(work_dir, 'cells_britain_50000_100000.txt')
+    cells = synthetic_h3_cells(rng, nation_cells, H3_HEXAGON_BASE_CELLS[:3])
+    _write_cell_file(nation_path, cells, rng.integers(0, 50, len(cells)), 'd')
+
+    # Ground stations: a station table and utilizations keyed by the simulator's shifted ids
+    stations_path = os.path.join(work_dir, 'ground_stations.csv')
+    station_ids = np.arange(stations)
+    with open(stations_path, 'w') as f:
+        for station_id, lat, lon in zip(station_ids, rng.uniform(-60, 70, stations), rng.uniform(-180, 180, stations)):
+            f.write(f"{station_id},GS {station_id},{lat:.4f},{lon:.4f},x\n")
+    utilization_path = os.path.join(work_dir, 'britain_0_1000_population_priority_gs_utilizations.txt')
+    with open(utilization_path, 'w') as f:
+        for station_id, value in zip(station_ids + gs_matrix.GS_ID_OFFSET, rng.uniform(0, 1, stations)):
+            f.write(f"{station_id},{value:.6f}\n")
+
+    return {
+        'capacity': capacity_path, 'heatmap': heatmap_path, 'nation': nation_path,
+        'stations': stations_path, 'utilization': utilization_path,
+        'rows': {
+            'capacity': capacity_cells, 'heatmap': heatmap_cells,
+            'nation': nation_cells, 'stations': stations,
+        },
+    }
+
+
+def _run_capacity(workload, html_path):
+    with profiling.stage('load'):
+        h3_data = loaders.load_capacity(workload['capacity'])
+    generate_capacity_maps.create_country_capacity_map(h3_data, 'Britain', 'benchmark', html_path)
+
+
+def _run_gs(workload, html_path):
+    with profiling.stage('load'):
+        stations, lookup = gs_matrix.load_station_table(workload['stations'])
+        vector = gs_matrix.read_utilization_vector(workload['utilization'], lookup, len(stations))
+        gs_data_df = gs_matrix.stations_with_utilization(stations, vector)
+    generate_gs_utilization_maps.create_gs_utilization_map(gs_data_df, 'benchmark', html_path)
+
+
+def _run_heatmap(workload, html_path):
+    generate_heatmaps.render_config(
+        'Britain', 'benchmark', workload['heatmap'], workload['nation'], html_path=html_path
+    )
+
+
+BENCHMARKS = {
+    'capacity': _run_capacity,
+    'gs_utilization': _run_gs,
+    'heatmap': _run_heatmap,
+}
+
+
+def run_benchmarks(workload, out_dir, repeat=3, names=None):
+    """
+    Runs each generator `repeat` times on the workload, timing every stage.
+
+    Returns:
+        dict: {generator: {stage: {'median_s', 'min_s', 'runs'}, 'total': {...}}}
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        samples = {}
+        for run in range(repeat):
+            timings = {}
+
+            def record(stage_name, seconds):
+                timings[stage_name] = timings.get(stage_name, 0.0) + seconds
+
+            html_path = os.path.join(out_dir, f"{name}.html")
+            start = time.perf_counter()
+            with profiling.recording(record):
+                BENCHMARKS[name](workload, html_path)
+            timings['total'] = time.perf_counter() - start
+            for stage_name, seconds in timings.items():
+                samples.setdefault(stage_name, []).append(seconds)
+
+        ordered = [stage for stage in profiling.STAGES if stage in samples] + ['total']
+        results[name] = {
+            stage: {
+                'median_s': round(statistics.median(samples[stage]), 6),
+                'min_s': round(min(samples[stage]), 6),
+                'runs': len(samples[stage]),
+            }
+            for stage in ordered
+        }
+        results[name]['output_bytes'] = os.path.getsize(html_path)
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, noise_floor=NOISE_FLOOR_S):
+    """
+    Lists the stages whose median got slower than the baseline report allows.
+
+    Returns:
+        list: One dict per regression (generator, stage, baseline/current medians, ratio).
+    """
+    regressions = []
+    for name, stages in results.items():
+        for stage_name, current in stages.items():
+            previous = baseline.get('results', {}).get(name, {}).get(stage_name)
+            if not isinstance(current, dict) or not previous:
+                continue
+            before, after = previous['median_s'], current['median_s']
+            if after - before > noise_floor and after > before * (1 + threshold):
+                regressions.append({
+                    'generator': name, 'stage': stage_name,
+                    'baseline_s': before, 'current_s': after, 'ratio': round(after / before, 3),
+                })
+    return regressions
+
+
+def print_results(results):
+    for name, stages in results.items():
+        print(f"\n  {name} ({stages['output_bytes'] / 1e6:.2f} MB output)")
+        for stage_name, timing in stages.items():
+            if isinstance(timing, dict):
+                print(f"    - {stage_name:<10} {timing['median_s'] * 1000:9.1f} ms (min {timing['min_s'] * 1000:.1f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the map generators stage by stage on synthetic data.")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per generator (the median is reported)")
+    parser.add_argument('--generator', choices=sorted(BENCHMARKS), action='append',
+                        help="Generator to benchmark, may be repeated (default: all)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic workload")
+    parser.add_argument('--capacity-cells', type=int, default=DEFAULT_CAPACITY_CELLS)
+    parser.add_argument('--heatmap-cells', type=int, default=DEFAULT_HEATMAP_CELLS)
+    parser.add_argument('--nation-cells', type=int, default=DEFAULT_NATION_CELLS)
+    parser.add_argument('--stations', type=int, default=DEFAULT_STATIONS)
+    parser.add_argument('--output', default=REPORT_PATH, help=f"Report path (default: {REPORT_PATH})")
+    parser.add_argument('--baseline', help="Previous report to check for regressions")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown of a stage's median versus the baseline (default: 0.25)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='cosmosim-bench-')
+    try:
+        print("Synthesizing workload...")
+        workload = build_workload(
+            work_dir, seed=args.seed, capacity_cells=args.capacity_cells, heatmap_cells=args.heatmap_cells,
+            nation_cells=args.nation_cells, stations=args.stations,
+        )
+        print(f"Running benchmarks ({args.repeat} run(s) each)...")
+        results = run_benchmarks(workload, work_dir, repeat=args.repeat, names=args.generator)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print_results(results)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'workload': {'seed': args.seed, 'rows': workload['rows']},
+        'repeat': args.repeat,
+        'threshold': args.threshold,
+        'results': results,
+        'regressions': [],
+    }
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('workload') != report['workload']:
+            print("\nWARNING: The baseline was run on a different workload; comparisons may be meaningless.")
+        report['regressions'] = compare(results, baseline, args.threshold)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote report to '{args.output}'")
+
+    if report['regressions']:
+        print("\nREGRESSIONS:")
+        for regression in report['regressions']:
+            print(f"  - {regression['generator']}/{regression['stage']}: "
+                  f"{regression['baseline_s'] * 1000:.1f} ms -> {regression['current_s'] * 1000:.1f} ms "
+                  f"(x{regression['ratio']})")
+        raise SystemExit(1)
@@ -0,0 +1,120 @@
+import argparse
+
+from utils import (
+    assets, cell_store, configs, content_store, generate_capacity_maps, generate_gs_utilization_maps, generate_heatmaps,
+    gs_matrix, h3_geometry, manifest, parallel, precompress, profiling, pyramid, stats_index, streaming, viewer
+)
+
+MAP_TYPES = ('capacity', 'gs', 'heatmap')
+
+
+def build(only=MAP_TYPES, jobs=1, incremental=False, output_format='html', from_store=False, from_matrix=False,
+          use_pyramid=False, pyramid_stat='min', bundle=False, tiled=False):
+    """
+    Builds every map type in one process from a single scan of the data directories.
+
+    The generators are imported once, each data directory is listed once into a
+    configs.Registry, and every generator renders the configs of that registry.
+
+    Args:
+        only (tuple): Map types to build ('capacity', 'gs', 'heatmap').
+        jobs (int): Number of worker processes used to render configurations.
+        incremental (bool): Only rebuild maps whose inputs changed since the last run.
+        output_format (str): 'html' or 'shell' for the capacity and GS maps (see viewer).
+        from_store (bool): Load capacity and heatmap data from the columnar cell store.
+        from_matrix (bool): Read GS utilizations from the configs x stations matrix.
+        use_pyramid (bool): Add coarser H3 parent levels to the capacity maps and heatmaps.
+        pyramid_stat (str): How heatmap child cells are merged into their parent ('min' or 'mean').
+        bundle (bool): Render multi-demand heatmap bundles instead of one heatmap per demand.
+        tiled (bool): Write heatmaps as spatial tiles for the tiled viewer page.
+    """
+    registry = configs.scan(
+        capacity_dir=generate_capacity_maps.DATA_DIR if 'capacity' in only else None,
+        gs_dir=generate_gs_utilization_maps.DATA_DIR if 'gs' in only and not from_matrix else None,
+        heatmap_dir=generate_heatmaps.DATA_DIR if 'heatmap' in only else None,
+        from_store=from_store,
+    )
+    print(f"Scanned {len(registry.capacity)} capacity, {len(registry.gs)} GS utilization "
+          f"and {len(registry.heatmap)} heatmap configs.")
+    configs.print_ignored(registry)
+
+    if 'capacity' in only:
+        generate_capacity_maps.generate_all_visualizations(
+            jobs=jobs, incremental=incremental, output_format=output_format, from_store=from_store,
+            use_pyramid=use_pyramid, registry=registry
+        )
+    if 'gs' in only:
+        generate_gs_utilization_maps.generate_all_visualizations(
+            jobs=jobs, incremental=incremental, output_format=output_format, from_matrix=from_matrix,
+            registry=registry
+        )
+    if 'heatmap' in only:
+        generate_heatmaps.generate_all_visualizations(
+            jobs=jobs, incremental=incremental, from_store=from_store,
+            pyramid_stat=pyramid_stat if use_pyramid else None, bundle=bundle, tiled=tiled, registry=registry
+        )
+
+
+def add_build_arguments(parser):
+    """
+    Adds the options shared by the build driver and watch mode to an argument parser.
+    """
+    parallel.add_jobs_argument(parser)
+    viewer.add_format_argument(parser)
+    cell_store.add_store_argument(parser)
+    gs_matrix.add_matrix_argument(parser)
+    pyramid.add_pyramid_argument(parser, stats=['min', 'mean'])
+    parser.add_argument(
+        '--bundle', action='store_true',
+        help="Render one heatmap per country/terminal pair with a client-side demand switch"
+    )
+    parser.add_argument(
+        '--tiled', action='store_true', help="Write heatmaps as spatial tiles loaded by viewport"
+    )
+    streaming.add_chunk_argument(parser)
+    h3_geometry.add_geometry_argument(parser)
+    content_store.add_dedup_argument(parser)
+    assets.add_assets_argument(parser)
+    precompress.add_precompress_argument(parser)
+    profiling.add_profile_argument(parser)
+    stats_index.add_stats_argument(parser)
+
+
+def configure_from_args(parser, args):
+    """
+    Checks the options of add_build_arguments() and applies the ones reaching the workers.
+
+    Returns:
+        dict: Keyword arguments of build() (besides `only` and `incremental`).
+    """
+    if args.bundle and args.pyramid:
+        parser.error("--bundle cannot be combined with --pyramid")
+    if args.tiled and (args.bundle or args.pyramid):
+        parser.error("--tiled cannot be combined with --bundle or --pyramid")
+    if args.chunk_rows is not None and (args.from_store or args.pyramid or args.bundle or args.tiled):
+        parser.error("--chunk-rows cannot be combined with --from-store, --pyramid, --bundle or --tiled")
+    if args.h3_geometry and (args.chunk_rows is not None or (args.format != 'shell' and not args.tiled)):
+        parser.error("--h3-geometry needs --format shell or --tiled and cannot be combined with --chunk-rows")
+    streaming.configure_from_args(args)
+    h3_geometry.configure_from_args(args)
+    content_store.configure_from_args(args)
+    assets.configure_from_args(args)
+    precompress.configure_from_args(args)
+    profiling.configure_from_args(args)
+    stats_index.configure_from_args(args)
+    return {
+        'jobs': args.jobs, 'output_format': args.format, 'from_store': args.from_store,
+        'from_matrix': args.from_matrix, 'use_pyramid': args.pyramid, 'pyramid_stat': args.pyramid_stat,
+        'bundle': args.bundle, 'tiled': args.tiled,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate every map type in one run.")
+    parser.add_argument('--only', choices=MAP_TYPES, action='append',
+                        help="Map type to build, may be repeated (default: all)")
+    manifest.add_incremental_argument(parser)
+    add_build_arguments(parser)
+    args = parser.parse_args()
+    options = configure_from_args(parser, args)
+    build(only=tuple(args.only or MAP_TYPES), incremental=args.incremental, **options)
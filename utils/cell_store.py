@@ -0,0 +1,238 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils import loaders
+
+# Layout of the store (one group per country and data kind):
+#   static/cell_store/<kind>/<country>/cells.npy     sorted uint64 H3 indexes (the group's cell set)
+#   static/cell_store/<kind>/<country>/<config>.npy  float64 values aligned to cells.npy (NaN = no value)
+# Every file is a plain .npy, so readers memory-map them instead of parsing text.
+# Values keep the full precision of the text files, so maps rendered from the
+# store show the same values (rows come in cell order instead of file order).
+STORE_DIR = os.path.join('static', 'cell_store')
+CELLS_FILENAME = 'cells.npy'
+
+# Source directory of each kind of data
+SOURCE_DIRS = {
+    'capacity': os.path.join('static', 'country_capacity_data'),
+    'heatmap': os.path.join('static', 'cell_heatmap_data'),
+}
+
+def group_of(filename):
+    """
+    Returns the country group of a data file name.
+
+    Capacity files start with the country ('britain_0_1000_...'), heatmap
+    value files too ('britain_50000_100000_0.7_cell_values.txt') and nation
+    cell files are prefixed with 'cells_' ('cells_britain_50000_100000.txt').
+    """
+    parts = filename.split('_')
+    return parts[1] if parts[0] == 'cells' else parts[0]
+
+
+def config_of(filename):
+    """
+    Returns the store name of a data file (its filename without extension).
+    """
+    return os.path.splitext(filename)[0]
+
+
+def group_dir(kind, group):
+    return os.path.join(STORE_DIR, kind, group)
+
+
+def _read_text_columns(path):
+    """
+    Reads a headerless 'hex,value' text file into (uint64 indexes, float64 values).
+
+    Raises:
+        ValueError: If a cell appears more than once. The text file renders
+                    every row, the store holds one value per cell.
+    """
+    df = loaders.read_cell_values(path, 'value', np.float64, with_index=True)
+    indexes = df['h3'].to_numpy()
+    duplicates = len(indexes) - len(np.unique(indexes))
+    if duplicates:
+        raise ValueError(f"{duplicates} duplicate cell row(s)")
+    return indexes, df['value'].to_numpy()
+
+
+def convert_group(kind, group, filenames):
+    """
+    Converts all text files of a country into its store group.
+
+    The group's cell set is the sorted union of every file's cells, so it is
+    rewritten together with all of its config columns. Files with duplicate
+    cells are skipped with a warning (and their old column removed), so
+    --from-store never renders them differently from their text file.
+
+    Args:
+        kind (str): 'capacity' or 'heatmap'.
+        group (str): Country filename part (e.g. 'southafrica').
+        filenames (list): Data file names under the kind's source directory.
+    """
+    source_dir = SOURCE_DIRS[kind]
+    columns = {}
+    for filename in sorted(filenames):
+        try:
+            columns[config_of(filename)] = _read_text_columns(os.path.join(source_dir, filename))
+        except ValueError as e:
+            print(f"  - WARNING: Not storing {kind}/{filename}: {e}")
+    cells = np.unique(np.concatenate([np.zeros(0, dtype=np.uint64)] + [indexes for indexes, _ in columns.values()]))
+
+    out_dir = group_dir(kind, group)
+    os.makedirs(out_dir, exist_ok=True)
+    # Drop columns of configs whose source file disappeared
+    for existing in os.listdir(out_dir):
+        if existing != CELLS_FILENAME and existing.endswith('.npy') and existing[:-4] not in columns:
+            os.remove(os.path.join(out_dir, existing))
+
+    # Every file is written aside first, then moved into place (like html_writer.write_chunks),
+    # so a reader or an interrupted conversion never sees a truncated file
+    arrays = {os.path.join(out_dir, CELLS_FILENAME): cells}
+    for config_name, (indexes, values) in columns.items():
+        aligned = np.full(len(cells), np.nan, dtype=np.float64)
+        aligned[np.searchsorted(cells, indexes)] = values
+        arrays[column_path(kind, group, config_name)] = aligned
+    for path, array in arrays.items():
+        with open(f"{path}.tmp", 'wb') as f:
+            np.save(f, array)
+    for path in arrays:
+        os.replace(f"{path}.tmp", path)
+
+    return len(cells), len(columns)
+
+
+def convert(kind):
+    """
+    Converts every text file of a kind into the store, one group per country.
+    """
+    source_dir = SOURCE_DIRS[kind]
+    if not os.path.isdir(source_dir):
+        print(f"ERROR: Data directory not found at '{source_dir}'")
+        return
+
+    groups = {}
+    for filename in os.listdir(source_dir):
+        if filename.endswith('.txt'):
+            groups.setdefault(group_of(filename), []).append(filename)
+
+    for group, filenames in sorted(groups.items()):
+        cell_count, config_count = convert_group(kind, group, filenames)
+        print(f"  - {kind}/{group}: {cell_count} cells, {config_count} configs")
+
+
+def column_path(kind, group, config_name):
+    """
+    Returns the .npy path of a config's column.
+    """
+    return os.path.join(group_dir(kind, group), f"{config_name}.npy")
+
+
+def stored_filenames(kind):
+    """
+    Returns the sorted data filenames ('<config>.txt') of every column in the store of a kind.
+    """
+    kind_dir = os.path.join(STORE_DIR, kind)
+    if not os.path.isdir(kind_dir):
+        return []
+    filenames = []
+    for group in os.listdir(kind_dir):
+        with os.scandir(os.path.join(kind_dir, group)) as entries:
+            filenames += [
+                f"{entry.name[:-4]}.txt" for entry in entries
+                if entry.name.endswith('.npy') and entry.name != CELLS_FILENAME
+            ]
+    return sorted(filenames)
+
+
+def has_config(kind, group, config_name):
+    """
+    True if the store holds a column for the config.
+    """
+    return os.path.exists(column_path(kind, group, config_name))
+
+
+def load_cells(kind, group):
+    """
+    Memory-maps the sorted uint64 cell set of a group.
+    """
+    return np.load(os.path.join(group_dir(kind, group), CELLS_FILENAME), mmap_mode='r')
+
+
+def load_column(kind, group, config_name):
+    """
+    Memory-maps the float64 column of a config, aligned to load_cells().
+    """
+    return np.load(column_path(kind, group, config_name), mmap_mode='r')
+
+
+def _check_aligned(cells, columns, path):
+    """
+    Raises ValueError if columns do not match their group's cell set, i.e. the group is being reconverted.
+    """
+    if any(len(column) != len(cells) for column in columns):
+        raise ValueError(f"'{path}' does not match its cell set (is the store being converted?)")
+
+
+def load_frame(kind, group, config_name, value_name='value'):
+    """
+    Loads a config as a DataFrame with a 'hex' string column and a value column.
+
+    Only cells the config has a value for are returned.
+    """
+    return load_column_frame(column_path(kind, group, config_name), value_name)
+
+
+def load_column_frame(path, value_name='value'):
+    """
+    Same as load_frame(), for a column given by its path (see column_path()).
+    """
+    cells = np.load(os.path.join(os.path.dirname(path), CELLS_FILENAME), mmap_mode='r')
+    column = np.load(path, mmap_mode='r')
+    _check_aligned(cells, [column], path)
+    present = ~np.isnan(column)
+    return pd.DataFrame({
+        'hex': loaders.uint64_to_hex(cells[present]),
+        value_name: np.asarray(column[present]),
+    })
+
+
+def load_column_matrix(paths):
+    """
+    Loads columns of one group side by side (see column_path()).
+
+    Returns:
+        tuple: (sorted uint64 cells, float64 cells x columns matrix, NaN where
+               a config has no value). Cells no column has a value for are dropped.
+    """
+    cells = np.load(os.path.join(os.path.dirname(paths[0]), CELLS_FILENAME), mmap_mode='r')
+    columns = [np.load(path, mmap_mode='r') for path in paths]
+    _check_aligned(cells, columns, os.path.dirname(paths[0]))
+    matrix = np.column_stack(columns)
+    present = ~np.isnan(matrix).all(axis=1)
+    return np.asarray(cells[present]), matrix[present]
+
+
+def add_store_argument(parser):
+    """
+    Adds the shared --from-store option to a generator's argument parser.
+    """
+    parser.add_argument(
+        '--from-store', action='store_true',
+        help=f"Load cell data from the columnar store under '{STORE_DIR}' "
+             "(build it with 'python -m utils.cell_store')"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert simulator text outputs into the columnar cell store.")
+    parser.add_argument('--kind', choices=sorted(SOURCE_DIRS), action='append',
+                        help="Kind of data to convert, may be repeated (default: all)")
+    args = parser.parse_args()
+    for kind in args.kind or sorted(SOURCE_DIRS):
+        print(f"Converting {kind} data into '{os.path.join(STORE_DIR, kind)}'...")
+        convert(kind)
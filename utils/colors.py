@@ -0,0 +1,92 @@
+import base64
+
+import numpy as np
+
+# Opacity shared by every gradient layer
+ALPHA = 185
+
+# Diverging ramp of difference maps: decrease (0) -> no change (0.5) -> increase (1)
+DIVERGING_STOPS = np.array([[202, 0, 32], [247, 247, 247], [5, 113, 176]], dtype=np.float64)
+
+
+def normalize(values, scale_min, scale_max, degenerate=1.0):
+    """
+    Maps values to [0, 1] over [scale_min, scale_max], clamping values outside the range.
+
+    The bounds may be arrays broadcast against `values`, e.g. one scale per
+    column of a cells x demands matrix. NaN values stay NaN.
+
+    Args:
+        values: Array-like of numbers.
+        scale_min (float or array): Value mapped to 0.
+        scale_max (float or array): Value mapped to 1.
+        degenerate (float): Result where scale_min == scale_max.
+
+    Returns:
+        np.ndarray: float64 normalized values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    span = np.asarray(scale_max, dtype=np.float64) - scale_min
+    flat = span == 0
+    normalized = np.clip((values - scale_min) / np.where(flat, 1.0, span), 0.0, 1.0)
+    return np.where(flat & ~np.isnan(values), degenerate, normalized)
+
+
+def red_yellow_green(normalized, alpha=ALPHA):
+    """
+    Returns the red -> yellow -> green ramp of normalized values as an (..., 4) uint8 RGBA array.
+
+    Channels are rounded like deck.gl rounds float colors into its Uint8
+    attributes. NaN values (no data) are fully transparent.
+    """
+    normalized = np.asarray(normalized, dtype=np.float64)
+    missing = np.isnan(normalized)
+    normalized = np.where(missing, 0.0, normalized)
+    rgba = np.empty(normalized.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = np.rint(np.where(normalized <= 0.5, 255.0, 255.0 * 2 * (1 - normalized)).clip(0, 255))
+    rgba[..., 1] = np.rint(np.where(normalized <= 0.5, 255.0 * 2 * normalized, 255.0).clip(0, 255))
+    rgba[..., 2] = 0
+    rgba[..., 3] = alpha
+    rgba[missing] = 0
+    return rgba
+
+
+def green_yellow_red(normalized, alpha=ALPHA):
+    """
+    Returns the green -> yellow -> red ramp (high values are bad, e.g. utilization).
+    """
+    return red_yellow_green(1.0 - np.asarray(normalized, dtype=np.float64), alpha)
+
+
+def red_white_blue(normalized, alpha=ALPHA):
+    """
+    Returns the diverging red -> white -> blue ramp (see DIVERGING_STOPS) as an (..., 4) uint8 RGBA array.
+
+    Normalize a signed difference symmetrically, e.g. over [-max|d|, max|d|],
+    so no change (0.5) is white. NaN values are fully transparent.
+    """
+    normalized = np.asarray(normalized, dtype=np.float64)
+    missing = np.isnan(normalized)
+    normalized = np.where(missing, 0.5, normalized)
+    rgba = np.empty(normalized.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.rint(np.interp(normalized, (0.0, 0.5, 1.0), DIVERGING_STOPS[:, channel]))
+    rgba[..., 3] = alpha
+    rgba[missing] = 0
+    return rgba
+
+
+def as_column(rgba):
+    """
+    Converts an RGBA array into a DataFrame column of [r, g, b, a] lists for pydeck.
+    """
+    return rgba.tolist()
+
+
+def encode(rgba):
+    """
+    Packs an RGBA array into a base64 string of row-major bytes for viewer payloads.
+
+    The viewer decodes it once into a Uint8Array (see MapViewer.decodeColors).
+    """
+    return base64.b64encode(np.ascontiguousarray(rgba, dtype=np.uint8).tobytes()).decode('ascii')
@@ -0,0 +1,400 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils import (
+    assets, cell_store, colors, configs, generate_capacity_maps, generate_heatmaps, html_writer, loaders, parallel,
+    precompress, profiling
+)
+
+DIFF_DIR = os.path.join('static', 'visualizations', 'config_diffs')
+COLOR_SCALE_PATH = os.path.join('templates', 'color_scales', 'diff_color_scale.html')
+DIFF_BOX_TEMPLATE_PATH = os.path.join('templates', 'overlays', 'diff_box.html')
+
+# Config fields a sweep can compare along, per kind of data
+AXES = {
+    'capacity': ('terminals', 'ut_algo', 'beam_alloc'),
+    'heatmap': ('terminals', 'demand'),
+}
+
+# Maps country filename parts back to display names ('southafrica' -> 'South Africa')
+COUNTRIES = configs.COUNTRIES
+
+
+def _inverse(mapping):
+    return {value: key for key, value in mapping.items()}
+
+
+# Display labels of axis values (values without one are shown as they are)
+LABELS = {
+    'capacity': {
+        'ut_algo': _inverse(configs.UT_ALGO_MAP),
+        'beam_alloc': _inverse(configs.BEAM_ALLOC_MAP),
+    },
+    'heatmap': {
+        'terminals': _inverse(configs.TERMINAL_CONFIGS_FN),
+        'demand': _inverse(configs.DEMAND_MAP),
+    },
+}
+
+
+def _capacity_configs(registry, country_fn):
+    """
+    Yields (fields, data filename) for every capacity config of a country.
+    """
+    for config in registry.capacity:
+        if config.country == country_fn:
+            fields = {'terminals': str(config.terminals), 'ut_algo': config.ut_algo, 'beam_alloc': config.beam_alloc}
+            yield fields, config.filename
+
+
+def _heatmap_configs(registry, country_fn):
+    """
+    Yields (fields, data filename) for every heatmap config of a country.
+    """
+    for config in registry.heatmap:
+        if config.country == country_fn:
+            fields = {'terminals': f"{config.terminals}_{config.terminal_cap}", 'demand': config.demand}
+            yield fields, config.filename
+
+
+CONFIG_LISTERS = {'capacity': _capacity_configs, 'heatmap': _heatmap_configs}
+
+
+def scan(kind, from_store=False):
+    """
+    Lists the data directory (or the store) of a kind once, see configs.scan().
+    """
+    if kind == 'capacity':
+        return configs.scan(capacity_dir=generate_capacity_maps.DATA_DIR, from_store=from_store)
+    return configs.scan(heatmap_dir=generate_heatmaps.DATA_DIR, from_store=from_store)
+
+
+def _input_path(kind, data_filename, from_store):
+    """
+    Returns the file a config is loaded from: its text file or its cell store column.
+    """
+    if from_store:
+        return cell_store.column_path(kind, cell_store.group_of(data_filename), cell_store.config_of(data_filename))
+    data_dir = generate_capacity_maps.DATA_DIR if kind == 'capacity' else generate_heatmaps.DATA_DIR
+    return os.path.join(data_dir, data_filename)
+
+
+def plan_sweep(kind, country_fn, axis, base, other, from_store=False, registry=None):
+    """
+    Pairs every config of a country whose `axis` is `base` with the same config set to `other`.
+
+    Only pairs whose data both exist are returned; `registry` (see scan()) is
+    scanned when omitted.
+
+    Returns:
+        list: (diff name, base data filename, other data filename) per pair,
+              e.g. ('britain_1000_population_priority_vs_popwaterfill', ...).
+    """
+    if registry is None:
+        registry = scan(kind, from_store)
+    listed = CONFIG_LISTERS[kind](registry, country_fn)
+    by_fields = {tuple(sorted(fields.items())): data_filename for fields, data_filename in listed}
+
+    pairs = []
+    for key, base_filename in by_fields.items():
+        fields = dict(key)
+        if fields[axis] != base:
+            continue
+        other_filename = by_fields.get(tuple(sorted({**fields, axis: other}.items())))
+        if other_filename is None:
+            continue
+        name_parts = [f"{base}_vs_{other}" if field == axis else fields[field] for field in AXES[kind]]
+        pairs.append(('_'.join([country_fn] + name_parts), base_filename, other_filename))
+    return sorted(pairs)
+
+
+def load_configs(kind, data_filenames, from_store=False):
+    """
+    Loads configs of one country side by side, aligned on their H3 cells.
+
+    Returns:
+        tuple: (sorted uint64 cells, float64 cells x configs matrix, NaN where
+               a config has no value for a cell)
+    """
+    paths = [_input_path(kind, data_filename, from_store) for data_filename in data_filenames]
+    if from_store:
+        # Columns of a country are already aligned to its cell set
+        return cell_store.load_column_matrix(paths)
+
+    if kind == 'capacity':
+        frames = [loaders.load_capacity(path, with_index=True) for path in paths]
+        value_name = 'capacity'
+    else:
+        frames = [loaders.load_heatmap_values(path, with_index=True) for path in paths]
+        value_name = 'value'
+    return loaders.align_columns([frame['h3'].to_numpy() for frame in frames],
+                                 [frame[value_name].to_numpy() for frame in frames])
+
+
+def diff_columns(base, other, missing_as_zero):
+    """
+    Computes the per-cell deltas and ratios of every (base, other) column pair at once.
+
+    Args:
+        base (np.ndarray): cells x pairs base values (NaN where a config has no value).
+        other (np.ndarray): cells x pairs values compared to `base`.
+        missing_as_zero (bool): A cell missing from one config counts as 0 (capacity:
+                                the cell received nothing). Otherwise only cells
+                                both configs have a value for are compared.
+
+    Returns:
+        dict: cells x pairs arrays 'present' (bool), 'base', 'other', 'delta'
+              (other - base) and 'ratio' (other / base), NaN where not compared.
+    """
+    if missing_as_zero:
+        present = ~(np.isnan(base) & np.isnan(other))
+        base, other = np.nan_to_num(base), np.nan_to_num(other)
+    else:
+        present = ~np.isnan(base) & ~np.isnan(other)
+    base = np.where(present, base, np.nan)
+    other = np.where(present, other, np.nan)
+
+    ratio = np.full(base.shape, np.nan)
+    np.divide(other, base, out=ratio, where=present & (base != 0))
+    return {'present': present, 'base': base, 'other': other, 'delta': other - base, 'ratio': ratio}
+
+
+def summarize(diff):
+    """
+    Reduces the diff of a sweep to one row of statistics per pair.
+
+    Returns:
+        pd.DataFrame: Columns 'cells', 'base_total', 'other_total', 'delta_total',
+                      'change_pct', 'base_mean', 'other_mean', 'improved',
+                      'worsened' and 'max_abs_delta'.
+    """
+    present, delta = diff['present'], diff['delta']
+    cells = present.sum(axis=0)
+    base_total = np.nansum(diff['base'], axis=0)
+    other_total = np.nansum(diff['other'], axis=0)
+    counted = np.maximum(cells, 1)
+
+    change_pct = np.full(len(base_total), np.nan)
+    np.divide(100.0 * (other_total - base_total), base_total, out=change_pct, where=base_total != 0)
+    return pd.DataFrame({
+        'cells': cells,
+        'base_total': base_total,
+        'other_total': other_total,
+        'delta_total': other_total - base_total,
+        'change_pct': change_pct,
+        'base_mean': np.where(cells > 0, base_total / counted, np.nan),
+        'other_mean': np.where(cells > 0, other_total / counted, np.nan),
+        'improved': (delta > 0).sum(axis=0),
+        'worsened': (delta < 0).sum(axis=0),
+        'max_abs_delta': np.abs(np.nan_to_num(delta)).max(axis=0, initial=0.0),
+    })
+
+
+def _summary_html(kind, stats):
+    """
+    Returns the summary line of a diff map's box.
+    """
+    if kind == 'capacity':
+        change = f"Total: {stats['base_total'] / 1000:.2f} Gb &rarr; {stats['other_total'] / 1000:.2f} Gb"
+    else:
+        change = f"Mean: {stats['base_mean']:.3f} &rarr; {stats['other_mean']:.3f}"
+    if not np.isnan(stats['change_pct']):
+        change += f" ({stats['change_pct']:+.1f}%)"
+    return f"{change}<br/>{stats['improved']} cells up, {stats['worsened']} down"
+
+
+def create_diff_map(frame, fill_colors, country_display_name, diff_name, labels, scale, summary_html, title,
+                    html_path=None):
+    """
+    Generates and saves a difference map through the capacity maps' pydeck path.
+
+    Args:
+        frame (pd.DataFrame): 'hex', 'base', 'other', 'delta' and 'ratio' of the compared cells.
+        fill_colors (np.ndarray): (N, 4) uint8 diverging colors of the cells.
+        country_display_name (str): Key of COUNTRY_CONFIGS.
+        diff_name (str): Name of the diff (the file name without extension).
+        labels (tuple): (base label, other label).
+        scale (float): Largest absolute delta, the ends of the legend.
+        summary_html (str): Statistics shown in the box.
+        title (str): Legend title.
+        html_path (str): Output path; defaults to DIFF_DIR/<diff_name>.html.
+    """
+    base_label, other_label = labels
+    with profiling.stage('legend'):
+        fragments = [
+            html_writer.render_template(DIFF_BOX_TEMPLATE_PATH, {
+                '__BASE_LABEL__': base_label, '__OTHER_LABEL__': other_label, '__SUMMARY__': summary_html,
+            }),
+            html_writer.render_template(COLOR_SCALE_PATH, {
+                '__TITLE__': title, '__MIN_LABEL__': f"{-scale:.3g}", '__MAX_LABEL__': f"+{scale:.3g}",
+            }),
+        ]
+
+    tooltip = {"text": f"{base_label}: {{base}}\n{other_label}: {{other}}\nChange: {{delta}}\nRatio: {{ratio}}"}
+    return generate_capacity_maps.write_hexagon_map(
+        [(None, frame, fill_colors)], country_display_name,
+        html_path or os.path.join(DIFF_DIR, f"{diff_name}.html"), tooltip, fragments, layer_prefix='diff'
+    )
+
+
+def _render_diff(task):
+    """
+    Worker: renders the difference map of one pair.
+
+    Returns a (status, diff_name, message) tuple so results can be
+    aggregated by the parent process.
+    """
+    frame, diff_name = task[0], task[3]
+    with profiling.profile_config('config_diff', diff_name):
+        try:
+            profiling.note(rows=len(frame))
+            create_diff_map(*task)
+            return parallel.GENERATED, diff_name, None
+        except Exception as e:
+            return parallel.FAILED, diff_name, str(e)
+
+
+def diff_country(kind, country_fn, axis, base, other, from_store=False, render=True, registry=None):
+    """
+    Diffs a whole sweep of one country in batched operations.
+
+    Every config of the sweep is loaded once into one cells x configs matrix,
+    then the deltas, ratios, statistics and colors of all pairs are computed
+    column-wise together.
+
+    Returns:
+        tuple: (statistics DataFrame with one row per pair, create_diff_map()
+               arguments of each pair's map)
+    """
+    pairs = plan_sweep(kind, country_fn, axis, base, other, from_store, registry)
+    if not pairs:
+        return pd.DataFrame(), []
+
+    with profiling.stage('load'):
+        data_filenames = sorted({filename for _, base_fn, other_fn in pairs for filename in (base_fn, other_fn)})
+        cells, matrix = load_configs(kind, data_filenames, from_store)
+        column_of = {filename: position for position, filename in enumerate(data_filenames)}
+        base_matrix = matrix[:, [column_of[base_fn] for _, base_fn, _ in pairs]]
+        other_matrix = matrix[:, [column_of[other_fn] for _, _, other_fn in pairs]]
+
+    with profiling.stage('normalize'):
+        diff = diff_columns(base_matrix, other_matrix, missing_as_zero=(kind == 'capacity'))
+        stats = summarize(diff)
+        stats.insert(0, 'diff', [diff_name for diff_name, _, _ in pairs])
+        stats.insert(1, 'base', [base_fn for _, base_fn, _ in pairs])
+        stats.insert(2, 'other', [other_fn for _, _, other_fn in pairs])
+
+    if not render:
+        return stats, []
+
+    with profiling.stage('normalize'):
+        # Diverging colors of every pair at once, symmetric around no change
+        scales = stats['max_abs_delta'].to_numpy()
+        fill_colors = colors.red_white_blue(colors.normalize(diff['delta'], -scales, scales, degenerate=0.5))
+        hexes = loaders.uint64_to_hex(cells)
+
+    labels = tuple(LABELS[kind].get(axis, {}).get(value, value) for value in (base, other))
+    title = 'Capacity change (Mb)' if kind == 'capacity' else 'Available capacity change'
+    tasks = []
+    for position, (diff_name, _, _) in enumerate(pairs):
+        rows = diff['present'][:, position]
+        if not rows.any():
+            continue
+        ratio = np.round(diff['ratio'][rows, position], 3)
+        frame = pd.DataFrame({
+            'hex': hexes[rows],
+            'base': np.round(diff['base'][rows, position], 3),
+            'other': np.round(diff['other'][rows, position], 3),
+            'delta': np.round(diff['delta'][rows, position], 3),
+            # Absent ratios (base of 0) become null (NaN is not valid JSON)
+            'ratio': np.where(np.isnan(ratio), None, ratio),
+        })
+        row_stats = stats.iloc[position]
+        tasks.append((
+            frame, fill_colors[rows, position], COUNTRIES[country_fn], diff_name, labels,
+            float(row_stats['max_abs_delta']), _summary_html(kind, row_stats), title,
+        ))
+    return stats, tasks
+
+
+def _print_stats(kind, stats):
+    for _, row in stats.iterrows():
+        unit = ' Mb' if kind == 'capacity' else ''
+        change = f"{row['delta_total']:+.2f}{unit}"
+        if not np.isnan(row['change_pct']):
+            change += f" ({row['change_pct']:+.1f}%)"
+        print(f"  - {row['diff']}: {row['cells']} cells, total {change}, "
+              f"{row['improved']} up / {row['worsened']} down")
+
+
+def run(kind, countries, axis, base, other, jobs=1, from_store=False, render=True, summary_path=None):
+    """
+    Diffs `base` against `other` along `axis` for every config of the given countries.
+
+    Args:
+        kind (str): 'capacity' or 'heatmap'.
+        countries (list): Country filename parts (e.g. 'britain').
+        axis (str): Config field that differs (see AXES).
+        base (str): Filename part of the reference value (e.g. 'priority').
+        other (str): Filename part of the compared value (e.g. 'popwaterfill').
+        jobs (int): Number of worker processes used to render the maps.
+        from_store (bool): Load cell data from the columnar cell store instead of text files.
+        render (bool): Write one difference map per pair into DIFF_DIR.
+        summary_path (str): Also write the statistics of every pair as CSV.
+    """
+    print(f"Diffing {kind} configs: {axis} {base} -> {other}...")
+    profiling.start_run()
+
+    registry = scan(kind, from_store)
+    all_stats, tasks = [], []
+    for country_fn in countries:
+        stats, country_tasks = diff_country(kind, country_fn, axis, base, other, from_store, render, registry)
+        if stats.empty:
+            print(f"  - SKIPPED {country_fn}: no pair of configs with data")
+            continue
+        _print_stats(kind, stats)
+        all_stats.append(stats)
+        tasks += country_tasks
+
+    if summary_path and all_stats:
+        pd.concat(all_stats, ignore_index=True).to_csv(summary_path, index=False)
+        print(f"Wrote statistics of {sum(len(stats) for stats in all_stats)} pair(s) to '{summary_path}'")
+
+    if render:
+        print(f"Rendering {len(tasks)} difference map(s) using {parallel.resolve_jobs(jobs)} worker(s).")
+        counts, failures = parallel.tally_results(parallel.run_tasks(_render_diff, tasks, jobs))
+        parallel.print_summary(counts, failures)
+    profiling.print_summary()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare two values of a config field (e.g. beam allocation policies) cell by cell."
+    )
+    parser.add_argument('--kind', choices=sorted(AXES), default='capacity', help="Data to compare (default: capacity)")
+    parser.add_argument('--axis', required=True, help="Config field that differs: terminals, ut_algo or "
+                                                      "beam_alloc for capacity; terminals or demand for heatmap")
+    parser.add_argument('--base', required=True, help="Filename part of the reference value, e.g. 'priority'")
+    parser.add_argument('--other', required=True, help="Filename part of the compared value, e.g. 'popwaterfill'")
+    parser.add_argument('--country', action='append', choices=sorted(COUNTRIES),
+                        help="Country filename part, may be repeated (default: all)")
+    parser.add_argument('--no-maps', action='store_true', help="Only print the statistics")
+    parser.add_argument('--summary', metavar='PATH', help="Write the statistics of every pair as CSV")
+    parallel.add_jobs_argument(parser)
+    cell_store.add_store_argument(parser)
+    assets.add_assets_argument(parser)
+    precompress.add_precompress_argument(parser)
+    profiling.add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.axis not in AXES[args.kind]:
+        parser.error(f"--axis must be one of {', '.join(AXES[args.kind])} for {args.kind} data")
+    assets.configure_from_args(args)
+    precompress.configure_from_args(args)
+    profiling.configure_from_args(args)
+    run(
+        args.kind, args.country or sorted(COUNTRIES), args.axis, args.base, args.other, jobs=args.jobs,
+        from_store=args.from_store, render=not args.no_maps, summary_path=args.summary
+    )
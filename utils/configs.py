@@ -0,0 +1,180 @@
+import collections
+import os
+
+from utils import cell_store
+
+# This data is needed for setting the map's initial view (latitude, longitude, zoom)
+COUNTRY_CONFIGS = {
+    'Britain': {'latitude': 55.3781, 'longitude': -3.4360, 'zoom': 5},
+    'Ghana': {'latitude': 7.9465, 'longitude': -1.0232, 'zoom': 6},
+    'South Africa': {'latitude': -30.5595, 'longitude': 22.9375, 'zoom': 5},
+    'Tonga': {'latitude': -21.1789, 'longitude': -175.1982, 'zoom': 6},
+    'Lithuania': {'latitude': 55.1694, 'longitude': 23.8813, 'zoom': 6},
+    'Haiti': {'latitude': 18.9712, 'longitude': -72.2852, 'zoom': 7}
+}
+
+# Maps country filename parts to display names ('southafrica' -> 'South Africa')
+COUNTRIES = {display.lower().replace(' ', ''): display for display in COUNTRY_CONFIGS}
+
+# Display names of the option filename parts, for labels
+UT_ALGO_MAP = {
+    'Population density': 'population', 'GCB No Cap': 'waterfill',
+    'GCB 1K': 'waterfill_variant_1000', 'GCB 10K': 'waterfill_variant_10000',
+    'GCB 100K': 'waterfill_variant_100000'
+}
+BEAM_ALLOC_MAP = {
+    'Priority': 'priority', 'Population waterfill': 'popwaterfill'
+}
+TERMINAL_CONFIGS_FN = {
+    '50000 / 100K': '50000_100000',
+    '200000 / 10K': '200000_10000',
+    '10000 / 100K': '10000_100000',
+    '100000 / 10K': '100000_10000',
+    '5000 / 100K': '5000_100000',
+    '1000 / 100K': '1000_100000',
+    '10000 / 10K': '10000_10000',
+    '20000 / 100K': '20000_100000',
+    '500 / 10K': '500_10000',
+    '1000 / 1K': '1000_1000'
+}
+DEMAND_MAP = {
+    '8400 Mbps': '0.7',
+    '9600 Mbps': '0.8',
+    '10800 Mbps': '0.9',
+    '12000 Mbps': '1.0'
+}
+
+# Simulator output naming:
+#   <country>_0_<terminals>_<ut_algo>_<beam_alloc>_cell_capacities.txt   (ut_algo may contain '_')
+#   <country>_0_<terminals>_<ut_algo>_<beam_alloc>_gs_utilizations.txt
+#   <country>_<terminals>_<terminal_cap>_<demand>_cell_values.txt
+#   cells_<country>_<terminals>_<terminal_cap>.txt                       (heatmap nation cells)
+CAPACITY_SUFFIX = '_cell_capacities.txt'
+GS_SUFFIX = '_gs_utilizations.txt'
+HEATMAP_SUFFIX = '_cell_values.txt'
+NATION_PREFIX = 'cells_'
+
+# One record per config, parsed from its data filename
+CapacityConfig = collections.namedtuple('CapacityConfig', 'country terminals ut_algo beam_alloc filename')
+GsConfig = collections.namedtuple('GsConfig', 'country terminals ut_algo beam_alloc filename')
+HeatmapConfig = collections.namedtuple('HeatmapConfig', 'country terminals terminal_cap demand name filename')
+
+# Every config found in the data directories, sorted by filename, plus the
+# heatmap nation files and the files whose names do not follow the scheme
+Registry = collections.namedtuple('Registry', 'capacity gs heatmap nation_files ignored')
+
+
+def _parse_run(filename, suffix):
+    """
+    Returns (country, terminals, ut_algo, beam_alloc) of a capacity/GS filename, or None.
+    """
+    if not filename.endswith(suffix):
+        return None
+    parts = filename[:-len(suffix)].split('_')
+    if len(parts) < 5 or parts[0] not in COUNTRIES or parts[1] != '0' or not parts[2].isdigit():
+        return None
+    return parts[0], int(parts[2]), '_'.join(parts[3:-1]), parts[-1]
+
+
+def parse_capacity_filename(filename):
+    """
+    Parses a capacity data filename into a CapacityConfig (None if it does not follow the scheme).
+    """
+    fields = _parse_run(filename, CAPACITY_SUFFIX)
+    return CapacityConfig(*fields, filename) if fields else None
+
+
+def parse_gs_filename(filename):
+    """
+    Parses a GS utilization data filename into a GsConfig (None if it does not follow the scheme).
+    """
+    fields = _parse_run(filename, GS_SUFFIX)
+    return GsConfig(*fields, filename) if fields else None
+
+
+def parse_heatmap_filename(filename):
+    """
+    Parses a heatmap values filename into a HeatmapConfig (None if it does not follow the scheme).
+    """
+    if not filename.endswith(HEATMAP_SUFFIX):
+        return None
+    name = filename[:-len(HEATMAP_SUFFIX)]
+    parts = name.split('_')
+    if len(parts) != 4 or parts[0] not in COUNTRIES or not (parts[1].isdigit() and parts[2].isdigit()):
+        return None
+    try:
+        float(parts[3])
+    except ValueError:
+        return None
+    return HeatmapConfig(parts[0], int(parts[1]), int(parts[2]), parts[3], name, filename)
+
+
+def capacity_filename(country, terminals, ut_algo, beam_alloc):
+    return f"{country}_0_{terminals}_{ut_algo}_{beam_alloc}{CAPACITY_SUFFIX}"
+
+
+def heatmap_filename(country, terminals, terminal_cap, demand):
+    return f"{country}_{terminals}_{terminal_cap}_{demand}{HEATMAP_SUFFIX}"
+
+
+def pair_name(config):
+    """
+    Returns the country/terminal pair of a HeatmapConfig (e.g. 'britain_50000_100000').
+    """
+    return f"{config.country}_{config.terminals}_{config.terminal_cap}"
+
+
+def nation_filename(config):
+    """
+    Returns the nation cells filename a HeatmapConfig is drawn with.
+    """
+    return f"{NATION_PREFIX}{pair_name(config)}.txt"
+
+
+def list_files(data_dir):
+    """
+    Returns the sorted names of the files in a data directory, with a single scandir().
+
+    One listing replaces a stat per expected config, which matters on network filesystems.
+    """
+    if not data_dir or not os.path.isdir(data_dir):
+        return []
+    with os.scandir(data_dir) as entries:
+        return sorted(entry.name for entry in entries if entry.is_file())
+
+
+def _parse_all(filenames, parser):
+    parsed = [parser(filename) for filename in filenames]
+    return [config for config in parsed if config], [f for f, config in zip(filenames, parsed) if not config]
+
+
+def scan(capacity_dir=None, gs_dir=None, heatmap_dir=None, from_store=False):
+    """
+    Lists each data directory once and parses its filenames into a Registry.
+
+    Args:
+        capacity_dir (str): Capacity data directory (skipped if None).
+        gs_dir (str): GS utilization data directory (skipped if None).
+        heatmap_dir (str): Heatmap data directory (skipped if None).
+        from_store (bool): Take the capacity and heatmap configs from the
+                           columnar cell store instead of the text directories.
+    """
+    if from_store:
+        capacity_files = cell_store.stored_filenames('capacity') if capacity_dir else []
+        heatmap_files = cell_store.stored_filenames('heatmap') if heatmap_dir else []
+    else:
+        capacity_files = list_files(capacity_dir)
+        heatmap_files = list_files(heatmap_dir)
+
+    capacity, ignored_capacity = _parse_all(capacity_files, parse_capacity_filename)
+    gs, ignored_gs = _parse_all(list_files(gs_dir), parse_gs_filename)
+    nation_files = {filename for filename in heatmap_files if filename.startswith(NATION_PREFIX)}
+    heatmap, ignored_heatmap = _parse_all(
+        [filename for filename in heatmap_files if filename not in nation_files], parse_heatmap_filename
+    )
+    return Registry(capacity, gs, heatmap, nation_files, ignored_capacity + ignored_gs + ignored_heatmap)
+
+
+def print_ignored(registry):
+    if registry.ignored:
+        print(f"  - Ignoring {len(registry.ignored)} file(s) with unrecognized names, e.g. '{registry.ignored[0]}'")
@@ -0,0 +1,191 @@
+import argparse
+import functools
+import hashlib
+import os
+import shutil
+
+import numpy as np
+
+from utils import manifest, precompress
+
+# Configs whose data render to the same map share one stored output:
+#   static/content_store/<key[:2]>/<key><ext>  one object per distinct result (plus its
+#                                              precompressed siblings)
+# Every config's output path is a hardlink to its object, so the front end keeps
+# loading the usual per-config URLs. Where the filesystem has no hardlinks,
+# outputs are copies, which still saves the rendering.
+STORE_DIR = os.path.join('static', 'content_store')
+
+# Setting DEDUP_ENV makes the generators look a config's result up in the store
+# before rendering it. Like profiling, the variable is what reaches the workers.
+DEDUP_ENV = 'COSMOSIM_DEDUP'
+
+
+def enabled():
+    """
+    True if generated outputs should be shared through the store (see DEDUP_ENV).
+    """
+    return bool(os.environ.get(DEDUP_ENV))
+
+
+@functools.lru_cache(maxsize=None)
+def _file_digest(path, mtime_ns):
+    return manifest.file_digest(path)
+
+
+def _template_digest(path):
+    try:
+        return _file_digest(path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return 'missing'
+
+
+def content_key(kind, generator_version, template_paths, *parts):
+    """
+    Hashes everything a rendered output depends on, so equal keys mean equal outputs.
+
+    Args:
+        kind (str): Map type ('capacity', 'gs_utilization').
+        generator_version: Version constant of the generator (extended with the build settings here).
+        template_paths (list): Files rendered into the output (legends, station table).
+        parts: Strings and arrays of the config's normalized data, in a fixed order.
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    digest = hashlib.sha256(f"{kind}\n{manifest.build_version(generator_version)}\n".encode())
+    for path in template_paths:
+        digest.update(f"{os.path.basename(path)}:{_template_digest(path)}\n".encode())
+    for part in parts:
+        if isinstance(part, str):
+            data = part.encode('utf-8')
+        else:
+            array = np.ascontiguousarray(part)
+            data = array.dtype.str.encode() + array.tobytes()
+        # Length-prefixed, so no two sequences of parts hash alike
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def object_path(key, suffix):
+    return os.path.join(STORE_DIR, key[:2], f"{key}{suffix}")
+
+
+def _variants(path):
+    """
+    Returns a file and the precompressed siblings the current build writes.
+    """
+    return [path] + [precompress.sibling_path(path, encoding) for encoding in precompress.encodings()]
+
+
+def _link(source, target):
+    """
+    Atomically points `target` at the content of `source`: a hardlink, or a copy without hardlink support.
+    """
+    if os.path.exists(target) and os.path.samefile(source, target):
+        # Already shared (and renaming a hardlink onto its own inode would leave the temporary link behind)
+        return
+    tmp_path = f"{target}.tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+def link_output(key, output_path):
+    """
+    Points a config's output at the stored object of `key`, if there is one.
+
+    Returns:
+        bool: True if the output now shares the object, False if it must be rendered.
+    """
+    stored = object_path(key, os.path.splitext(output_path)[1])
+    sources = _variants(stored)
+    if not all(os.path.exists(source) for source in sources):
+        return False
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    for source, target in zip(sources, _variants(output_path)):
+        _link(source, target)
+    if not precompress.encodings():
+        precompress.remove_siblings(output_path)
+    return True
+
+
+def store_output(key, output_path):
+    """
+    Adds a freshly rendered output (and its siblings) to the store as the object of `key`.
+    """
+    stored = object_path(key, os.path.splitext(output_path)[1])
+    os.makedirs(os.path.dirname(stored), exist_ok=True)
+    for source, target in zip(_variants(output_path), _variants(stored)):
+        _link(source, target)
+
+
+def collect_garbage():
+    """
+    Removes objects no output links to anymore (a link count of 1: the store's own).
+
+    Returns:
+        tuple: (files removed, bytes freed)
+    """
+    removed, freed = 0, 0
+    if not os.path.isdir(STORE_DIR):
+        return removed, freed
+    for dirpath, _, filenames in os.walk(STORE_DIR):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            stat = os.stat(path)
+            if stat.st_nlink == 1:
+                os.remove(path)
+                removed += 1
+                freed += stat.st_size
+    return removed, freed
+
+
+def usage():
+    """
+    Returns (objects, outputs linked to them, bytes stored, bytes the outputs would take unshared).
+    """
+    objects, outputs, stored, unshared = 0, 0, 0, 0
+    for dirpath, _, filenames in os.walk(STORE_DIR):
+        for filename in filenames:
+            stat = os.stat(os.path.join(dirpath, filename))
+            objects += 1
+            outputs += stat.st_nlink - 1
+            stored += stat.st_size
+            unshared += stat.st_size * (stat.st_nlink - 1)
+    return objects, outputs, stored, unshared
+
+
+def add_dedup_argument(parser):
+    """
+    Adds the shared --dedup option to a generator's argument parser.
+    """
+    parser.add_argument(
+        '--dedup', action='store_true',
+        help=f"Render configs with identical data once and hardlink their outputs to one object under '{STORE_DIR}'"
+    )
+
+
+def configure_from_args(args):
+    """
+    Turns output sharing on for this process and its workers if --dedup is given.
+    """
+    if args.dedup:
+        os.environ[DEDUP_ENV] = '1'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report on (or clean up) the store of shared outputs.")
+    parser.add_argument('--gc', action='store_true', help="Remove objects no output links to anymore")
+    args = parser.parse_args()
+    if args.gc:
+        removed, freed = collect_garbage()
+        print(f"Removed {removed} unreferenced object file(s), {freed / (1 << 20):.1f} MB freed.")
+    objects, outputs, stored, unshared = usage()
+    print(f"{objects} object file(s) in '{STORE_DIR}' shared by {outputs} output(s): "
+          f"{stored / (1 << 20):.1f} MB stored instead of {unshared / (1 << 20):.1f} MB")
@@ -1,186 +1,489 @@
+import argparse
+import numpy as np
 import pandas as pd
 import pydeck as pdk
 import os
+import sys
 
-# This data is needed for setting the map's initial view (latitude, longitude, zoom)
-COUNTRY_CONFIGS = {
-    'Britain': {'latitude': 55.3781, 'longitude': -3.4360, 'zoom': 5},
-    'Ghana': {'latitude': 7.9465, 'longitude': -1.0232, 'zoom': 6},
-    'South Africa': {'latitude': -30.5595, 'longitude': 22.9375, 'zoom': 5},
-    'Tonga': {'latitude': -21.1789, 'longitude': -175.1982, 'zoom': 6},
-    'Lithuania': {'latitude': 55.1694, 'longitude': 23.8813, 'zoom': 6},
-    'Haiti': {'latitude': 18.9712, 'longitude': -72.2852, 'zoom': 7}
-}
-
-# Terminal numbers specific to each country
-COUNTRY_TERMINALS = {
-    "southafrica": [1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000],
-    "ghana": [1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000],
-    "tonga": [100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000],
-    "lithuania": [1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000],
-    "britain": [1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000],
-    "haiti": [1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000]
-}
-
-def create_country_capacity_map(h3_data, country_display_name, config_name):
+if __package__ in (None, ''):
+    # Run as a script ('python utils/generate_capacity_maps.py'): make the utils package importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import (
+    assets, cell_store, colors, configs, content_store, h3_geometry, html_writer, loaders, manifest, parallel,
+    precompress, profiling, pyramid, stats_index, streaming, viewer
+)
+
+# Bump whenever a change here alters the generated HTML, so incremental builds redo every map
+GENERATOR_VERSION = 5
+
+DATA_DIR = os.path.join('static', 'country_capacity_data')
+VIZ_DIR = os.path.join('static', 'visualizations', 'country_capacity')
+COLOR_SCALE_PATH = os.path.join('templates', 'color_scales', 'country_capacity_color_scale.html')
+CAPACITY_BOX_TEMPLATE_PATH = os.path.join('templates', 'overlays', 'capacity_box.html')
+VIEWER_TEMPLATE_PATH = os.path.join(viewer.VIEWER_TEMPLATES_DIR, 'country_capacity_viewer.html')
+
+def html_output_path(config_name):
     """
-    Generates and saves a pydeck map visualization for per-cell capacity.
+    Returns the HTML path of a capacity config, removing the data file's extension.
+    """
+    return os.path.join(VIZ_DIR, f"{config_name.split('.')[0]}.html")
+
+def output_path(config_name, output_format='html'):
+    """
+    Returns the path written for a capacity config in the given output format.
+    """
+    if output_format == 'shell':
+        return viewer.payload_output_path(VIZ_DIR, config_name.split('.')[0])
+    return html_output_path(config_name)
+
+def _prepare_capacity_frame(h3_data):
+    """
+    Builds the capacity DataFrame, its RGBA fill colors and the total capacity label.
+
+    Colors are computed here in one vectorized pass so the browser does not
+    evaluate a color expression per cell.
+
+    Returns:
+        tuple: (DataFrame with 'hex' and 'capacity', (N, 4) uint8 colors, label)
     """
     # Convert input data to a DataFrame
     df = pd.DataFrame(h3_data, columns=['hex', 'capacity'])
     df['capacity'] = pd.to_numeric(df['capacity'])
 
-    total_capacity_mb = df['capacity'].sum()
-    total_capacity_gb = total_capacity_mb / 1000.0
-    display_capacity_str = f"{total_capacity_gb:.2f} Gb"
+    display_capacity_str = _capacity_label(df['capacity'].sum())
 
     # Normalize capacity to a 0-1 range for coloring
     min_cap, max_cap = df['capacity'].min(), df['capacity'].max()
-    df['normalized_capacity'] = (df['capacity'] - min_cap) / (max_cap - min_cap) if max_cap > min_cap else 0.5
-
-    # Define the H3 hexagon layer for the map
-    layer = pdk.Layer(
-        "H3HexagonLayer", df, pickable=True, stroked=True, filled=True, extruded=False,
-        get_hexagon="hex",
-        get_fill_color="[normalized_capacity <= 0.5 ? 255 : 255 * 2 * (1 - normalized_capacity), normalized_capacity <= 0.5 ? 255 * 2 * normalized_capacity : 255, 0, 185]",
-        get_line_color=[255, 255, 255], line_width_min_pixels=2,
-    )
+    normalized = colors.normalize(df['capacity'], min_cap, max_cap, degenerate=0.5)
 
-    # Set the initial viewport based on the selected country
-    view_state = pdk.ViewState(
-        latitude=COUNTRY_CONFIGS[country_display_name]['latitude'],
-        longitude=COUNTRY_CONFIGS[country_display_name]['longitude'],
-        zoom=COUNTRY_CONFIGS[country_display_name]['zoom'],
-        bearing=0, pitch=0
-    )
+    return df, colors.red_yellow_green(normalized), display_capacity_str
 
-    # Create the pydeck map object
-    r = pdk.Deck(
-        layers=[layer], initial_view_state=view_state,
-        tooltip={"text": "Capacity: {capacity} Mb"}, map_style="light",
-    )
+def _capacity_label(total_capacity_mb):
+    """
+    Returns the total capacity label of the capacity box ('12.34 Gb').
+    """
+    total_capacity_gb = total_capacity_mb / 1000.0
+    return f"{total_capacity_gb:.2f} Gb"
+
+def _capacity_levels(df, fill_colors):
+    """
+    Builds the zoom pyramid of a capacity frame: parent cells hold the summed capacity.
+
+    Returns:
+        list: (pyramid level, DataFrame with 'hex' and 'capacity', RGBA colors) per
+              level, coarsest first. Each level is colored over its own range.
+    """
+    levels = []
+    for level in pyramid.build_levels(loaders.hex_to_uint64(df['hex'].to_numpy()), df['capacity'], 'sum'):
+        if level['max_zoom'] is None:
+            # Native resolution: the original cells and colors
+            levels.append((level, df[['hex', 'capacity']], fill_colors))
+            continue
+        capacity = np.round(level['values'], 6)
+        normalized = colors.normalize(capacity, capacity.min(), capacity.max(), degenerate=0.5)
+        level_df = pd.DataFrame({'hex': loaders.uint64_to_hex(level['cells']), 'capacity': capacity})
+        levels.append((level, level_df, colors.red_yellow_green(normalized)))
+    return levels
+
+def create_country_capacity_payload(h3_data, country_display_name, config_name, use_pyramid=False):
+    """
+    Saves the compact JSON payload of a capacity config for the shared viewer page.
+
+    The payload holds the view, the total capacity label and one column per
+    field, so switching configs in the viewer only transfers the data.
+
+    With `use_pyramid`, the columns of each zoom level go to their own
+    payload ('<config>.r<resolution>') and the config payload only lists the
+    levels, so the viewer fetches just the level it shows.
+
+    With precomputed geometry on, cells are shipped as binary polygons next
+    to each payload instead of a 'hex' column (see utils.h3_geometry).
+    """
+    df, fill_colors, display_capacity_str = _prepare_capacity_frame(h3_data)
+    country_config = configs.COUNTRY_CONFIGS[country_display_name]
+
+    payload = {
+        'view': {key: country_config[key] for key in ('latitude', 'longitude', 'zoom')},
+        'total_capacity': display_capacity_str,
+    }
+    country = h3_geometry.country_of(config_name)
+    if not use_pyramid:
+        payload_path = output_path(config_name, 'shell')
+        payload.update(_capacity_columns(df, fill_colors, country, payload_path))
+        return viewer.write_payload(payload_path, payload)
+
+    output_name = config_name.split('.')[0]
+    payload['levels'] = []
+    for level, level_df, level_colors in _capacity_levels(df, fill_colors):
+        level_name = f"{output_name}.r{level['resolution']}"
+        level_path = viewer.payload_output_path(VIZ_DIR, level_name)
+        viewer.write_payload(level_path, _capacity_columns(level_df, level_colors, country, level_path))
+        payload['levels'].append({
+            'name': level_name, 'min_zoom': level['min_zoom'], 'max_zoom': level['max_zoom'],
+        })
+    return viewer.write_payload(output_path(config_name, 'shell'), payload)
+
+def _capacity_columns(df, fill_colors, country, payload_path):
+    columns = h3_geometry.cell_columns(df['hex'].to_numpy(), country, payload_path)
+    columns.update({
+        'capacity': df['capacity'].tolist(),
+        'fill_color': colors.encode(fill_colors),
+    })
+    return columns
+
+def write_hexagon_map(levels, country_display_name, html_path, tooltip, fragments=(), layer_prefix='capacity'):
+    """
+    Renders precolored H3 cell layers as a pydeck page and streams it to `html_path`.
+
+    This is the page path shared by the capacity maps and the config
+    difference maps (see utils.config_diff).
+
+    Args:
+        levels (list): (pyramid level or None, DataFrame with 'hex' and the
+                       tooltip fields, (N, 4) uint8 colors) per layer. A layer may
+                       instead hold an iterable of DataFrame chunks that already
+                       have 'fill_color' (colors None), streamed into the page.
+        country_display_name (str): Key of configs.COUNTRY_CONFIGS, for the initial view.
+        html_path (str): Output path.
+        tooltip (dict): pydeck tooltip.
+        fragments (list): HTML injected before </body> (boxes, legends).
+        layer_prefix (str): Layer id prefix of pyramid levels.
+    """
+    with profiling.stage('layers'):
+        # Define the H3 hexagon layer for the map (one per zoom level with a pyramid)
+        initial_zoom = configs.COUNTRY_CONFIGS[country_display_name]['zoom']
+        layers = []
+        streams = {}
+        # Pyramid levels not shown at the initial zoom are fetched by the page on zoom
+        pyramid.remove_level_files(html_path)
+        layer_ranges = {}
+        for level, level_df, level_colors in levels:
+            if isinstance(level_df, pd.DataFrame):
+                data = level_df.assign(fill_color=colors.as_column(level_colors))
+            else:
+                # Rows read in chunks go straight into the page (see utils.streaming)
+                data = streaming.stream_placeholder(level_df, streams)
+            level_options = {}
+            if level is not None:
+                data, level_file = pyramid.level_data(layer_prefix, level, data, initial_zoom, html_path)
+                level_options = {
+                    'id': pyramid.layer_id(layer_prefix, level), 'visible': pyramid.visible_at(level, initial_zoom),
+                }
+                layer_ranges[level_options['id']] = [level['min_zoom'], level['max_zoom'], level_file]
+            layers.append(pdk.Layer(
+                "H3HexagonLayer", data,
+                pickable=True, stroked=True, filled=True, extruded=False,
+                get_hexagon="hex",
+                get_fill_color="fill_color",
+                get_line_color=[255, 255, 255], line_width_min_pixels=2,
+                **level_options,
+            ))
+
+        # Set the initial viewport based on the selected country
+        view_state = pdk.ViewState(
+            latitude=configs.COUNTRY_CONFIGS[country_display_name]['latitude'],
+            longitude=configs.COUNTRY_CONFIGS[country_display_name]['longitude'],
+            zoom=configs.COUNTRY_CONFIGS[country_display_name]['zoom'],
+            bearing=0, pitch=0
+        )
+
+        # Create the pydeck map object
+        r = pdk.Deck(layers=layers, initial_view_state=view_state, tooltip=tooltip, map_style="light")
 
     # Save the map to an HTML file
-    viz_dir = os.path.join('static', 'visualizations', 'country_capacity')
-    os.makedirs(viz_dir, exist_ok=True)
-    
-    # Construct filename for the output HTML, removing original extension
-    html_filename = f"{config_name.split('.')[0]}.html"
-    html_path = os.path.join(viz_dir, html_filename)
-    
-    html_content = r.to_html(as_string=True, notebook_display=False)
-    
-    capacity_box_html = f"""
-    <style>
-        .capacity-box {{
-            position: absolute;
-            top: 20px;
-            left: 10px;
-            background-color: white;
-            padding: 8px 12px;
-            border: 1px solid #ccc;
-            border-radius: 5px;
-            font-family: Arial, sans-serif;
-            font-size: 16px;
-            z-index: 1000;
-            box-shadow: 0 0 10px rgba(0,0,0,0.1);
-        }}
-    </style>
-    <div class="capacity-box">
-        Total failover capacity: <strong>{display_capacity_str}</strong>
-    </div>
-    """
-    # Inject the new HTML just before the closing </body> tag
-    html_content = html_content.replace('</body>', f'{capacity_box_html}</body>')
-    # --- END NEW ---
+    os.makedirs(os.path.dirname(html_path), exist_ok=True)
     
-    # Add the custom color scale legend to the HTML
-    color_scale_path = os.path.join('templates', 'color_scales', 'country_capacity_color_scale.html')
-    if os.path.exists(color_scale_path):
-        with open(color_scale_path, 'r') as f:
-            color_scale_html = f.read()
-        # This will now add the legend *after* the capacity box
-        html_content = html_content.replace('</body>', f'{color_scale_html}</body>')
-    
-    with open(html_path, 'w') as f:
-        f.write(html_content)
+    with profiling.stage('to_html'):
+        page_chunks = html_writer.expand_streams(html_writer.deck_page_chunks(r, html_path), streams)
+
+    with profiling.stage('legend'):
+        fragments = list(fragments)
+        # With a pyramid, the zoom switch script comes after the other fragments
+        if layer_ranges:
+            fragments.append(pyramid.zoom_switch_html(layer_ranges))
+
+    with profiling.stage('write'):
+        html_writer.write_chunks(page_chunks, html_path, fragments)
+    profiling.note(output_path=html_path)
 
     return html_path
 
+def create_country_capacity_map(h3_data, country_display_name, config_name, html_path=None, use_pyramid=False):
+    """
+    Generates and saves a pydeck map visualization for per-cell capacity.
 
-def generate_all_visualizations():
+    The map is written to html_output_path(config_name) unless `html_path` is given.
+    With `use_pyramid`, coarser parent levels are added as extra layers and
+    a script shows the one matching the current zoom, fetching the levels not
+    embedded in the page (see pyramid.level_data).
     """
-    Iterates through all possible configurations and generates a map for each.
+    with profiling.stage('normalize'):
+        df, fill_colors, display_capacity_str = _prepare_capacity_frame(h3_data)
+        if use_pyramid:
+            levels = _capacity_levels(df, fill_colors)
+        else:
+            levels = [(None, df[['hex', 'capacity']], fill_colors)]
+
+    with profiling.stage('legend'):
+        # Fragments injected just before the closing </body> tag, in this order:
+        # total capacity box, then the color scale legend
+        fragments = [
+            html_writer.render_template(CAPACITY_BOX_TEMPLATE_PATH, {'__TOTAL_CAPACITY__': display_capacity_str}),
+            html_writer.render_template(COLOR_SCALE_PATH),
+        ]
+
+    return write_hexagon_map(
+        levels, country_display_name, html_path or html_output_path(config_name),
+        {"text": "Capacity: {capacity} Mb"}, fragments
+    )
+
+
+def stream_config(country_display, data_filename, output_format, chunk_rows):
     """
-    print("Starting pre-generation of all Country Per Cell Capacity visualizations...")
-    
-    # Define all possible configuration options
-    countries_map = {
-        'South Africa': 'southafrica', 
-        'Ghana': 'ghana', 
-        'Tonga': 'tonga',
-        'Lithuania': 'lithuania', 
-        'Britain': 'britain', 
-        'Haiti': 'haiti'
-    }
-    ut_algo_map = {
-        'Population density': 'population', 'GCB No Cap': 'waterfill',
-        'GCB 1K': 'waterfill_variant_1000', 'GCB 10K': 'waterfill_variant_10000',
-        'GCB 100K': 'waterfill_variant_100000'
-    }
-    beam_alloc_map = {
-        'Priority': 'priority', 'Population waterfill': 'popwaterfill'
-    }
+    Renders a capacity config from its data file read in chunks of `chunk_rows` rows.
 
-    generated_count = 0
-    skipped_count = 0
+    A first pass over the file computes the total and the color range; a
+    second one colors each chunk and streams it into the page or payload. Peak
+    memory follows the chunk size, not the file size (see utils.streaming).
+
+    Returns:
+        str: The written path, or None if the data file is empty.
+    """
+    data_path = os.path.join(DATA_DIR, data_filename)
+
+    def chunks():
+        return loaders.iter_cell_values(data_path, 'capacity', np.float64, chunk_rows)
+
+    with profiling.stage('load'):
+        stats = streaming.scan_stats(df['capacity'].to_numpy() for df in chunks())
+        profiling.note(rows=stats['cells'])
+    if stats['cells'] == 0:
+        return None
+
+    histogram = streaming.Histogram(stats['min'], stats['max'])
+
+    def colored_chunks():
+        for df in chunks():
+            histogram.add(df['capacity'])
+            normalized = colors.normalize(df['capacity'], stats['min'], stats['max'], degenerate=0.5)
+            yield df, colors.red_yellow_green(normalized)
+
+    display_capacity_str = _capacity_label(stats['total'])
+    if output_format == 'shell':
+        country_config = configs.COUNTRY_CONFIGS[country_display]
+        payload = {
+            'view': {key: country_config[key] for key in ('latitude', 'longitude', 'zoom')},
+            'total_capacity': display_capacity_str,
+        }
+        column_chunks = (
+            {'hex': df['hex'].to_numpy(), 'capacity': df['capacity'].to_numpy(), 'fill_color': fill_colors}
+            for df, fill_colors in colored_chunks()
+        )
+        path = viewer.write_streamed_payload(
+            output_path(data_filename, 'shell'), payload, column_chunks, encoded_columns=('fill_color',)
+        )
+        h3_geometry.remove_geometry(path)
+    else:
+        fragments = [
+            html_writer.render_template(CAPACITY_BOX_TEMPLATE_PATH, {'__TOTAL_CAPACITY__': display_capacity_str}),
+            html_writer.render_template(COLOR_SCALE_PATH),
+        ]
+        rows = (df.assign(fill_color=colors.as_column(fill_colors)) for df, fill_colors in colored_chunks())
+        path = write_hexagon_map(
+            [(None, rows, None)], country_display, html_output_path(data_filename),
+            {"text": "Capacity: {capacity} Mb"}, fragments
+        )
+    stats_index.record_streamed('capacity', data_filename, stats, histogram)
+    return path
 
-    # Loop through every combination of parameters
-    for country_display, country_fn in countries_map.items():
-        # Get the list of terminals for the current country
-        terminals_list = COUNTRY_TERMINALS.get(country_fn, [])
-        if not terminals_list:
-            print(f"\nWARNING: No terminal configurations found for {country_display}. Skipping.")
-            continue
 
-        print(f"\nProcessing Country: {country_display}")
-        for terminals in terminals_list:
-            for ut_algo_display, ut_algo_fn in ut_algo_map.items():
-                for beam_alloc_display, beam_alloc_fn in beam_alloc_map.items():
-                    
-                    # Construct the expected data filename from the configuration
-                    data_filename = f"{country_fn}_0_{terminals}_{ut_algo_fn}_{beam_alloc_fn}_cell_capacities.txt"
-                    data_path = os.path.join('static', 'country_capacity_data', data_filename)
-
-                    if os.path.exists(data_path):
-                        # If the data file exists, proceed with generation
-                        print(f"  - Generating for: {terminals} terminals, {ut_algo_display}, {beam_alloc_display}...")
-                        
-                        # Read the capacity data from the file
-                        h3_data = []
-                        with open(data_path, 'r') as f:
-                            for line in f:
-                                parts = line.strip().split(',')
-                                if len(parts) == 2:
-                                    h3_data.append(parts)
-                        
-                        if h3_data:
-                            # Generate the visualization HTML file
-                            create_country_capacity_map(h3_data, country_display, data_filename)
-                            generated_count += 1
-                        else:
-                            print(f"    - SKIPPED (empty data file): {data_filename}")
-                            skipped_count += 1
+def _input_path(data_filename, from_store):
+    """
+    Returns the file a config is loaded from: its text file or its cell store column.
+    """
+    if from_store:
+        return cell_store.column_path(
+            'capacity', cell_store.group_of(data_filename), cell_store.config_of(data_filename)
+        )
+    return os.path.join(DATA_DIR, data_filename)
+
+
+def _can_share(output_format, use_pyramid):
+    """
+    True if a config's output can come from the content store: one self-contained file.
+
+    Pyramid levels and precomputed geometry spread a config over several files, so they are always rendered.
+    """
+    if not content_store.enabled() or use_pyramid:
+        return False
+    return output_format == 'html' or not h3_geometry.enabled()
+
+def _content_key(h3_data, country_display, output_format, use_pyramid):
+    """
+    Returns the content store key of a capacity config: its cells and capacities plus everything rendered around them.
+    """
+    return content_store.content_key(
+        'capacity', GENERATOR_VERSION, template_paths(output_format, use_pyramid),
+        country_display, output_format, str(use_pyramid),
+        loaders.hex_to_uint64(np.asarray(h3_data['hex'])),
+        pd.to_numeric(h3_data['capacity']).to_numpy(dtype=np.float64)
+    )
+
+def _generate_config(task):
+    """
+    Worker: reads one capacity data file and renders its map.
+
+    Returns a (status, config_name, message) tuple so results can be
+    aggregated by the parent process.
+    """
+    country_display, data_filename, output_format, from_store, use_pyramid = task
+    with profiling.profile_config('capacity', data_filename):
+        try:
+            chunk_rows = streaming.chunk_rows()
+            if chunk_rows and not from_store and not use_pyramid:
+                if stream_config(country_display, data_filename, output_format, chunk_rows) is None:
+                    return parallel.SKIPPED, data_filename, "empty data file"
+                return parallel.GENERATED, data_filename, None
+
+            with profiling.stage('load'):
+                if from_store:
+                    # Read the aligned capacity column from the cell store
+                    h3_data = cell_store.load_frame(
+                        'capacity', cell_store.group_of(data_filename), cell_store.config_of(data_filename),
+                        value_name='capacity'
+                    )
+                else:
+                    # Read the capacity data from the file
+                    h3_data = loaders.load_capacity(os.path.join(DATA_DIR, data_filename))
+            profiling.note(rows=len(h3_data))
+
+            if len(h3_data) == 0:
+                return parallel.SKIPPED, data_filename, "empty data file"
+            stats_index.record('capacity', data_filename, h3_data['capacity'])
+
+            key = None
+            if _can_share(output_format, use_pyramid):
+                key = _content_key(h3_data, country_display, output_format, use_pyramid)
+                if content_store.link_output(key, output_path(data_filename, output_format)):
+                    if output_format == 'shell':
+                        h3_geometry.remove_geometry(output_path(data_filename, output_format))
                     else:
-                        # If data file does not exist, skip and note it
-                        # print(f"  - SKIPPED (no data file): {data_filename}") # Uncomment for verbose debugging
-                        skipped_count += 1
-    
-    print("\n--------------------------------------------------")
-    print("                Generation Complete                ")
-    print(f"     Total HTML files generated: {generated_count}")
-    print(f"   Total configurations skipped: {skipped_count}")
-    print("--------------------------------------------------")
+                        pyramid.remove_level_files(output_path(data_filename, output_format))
+                    return parallel.SHARED, data_filename, None
+
+            # Generate the visualization HTML file (or the viewer payload)
+            if output_format == 'shell':
+                create_country_capacity_payload(h3_data, country_display, data_filename, use_pyramid)
+            else:
+                create_country_capacity_map(h3_data, country_display, data_filename, use_pyramid=use_pyramid)
+            if key is not None:
+                content_store.store_output(key, output_path(data_filename, output_format))
+            return parallel.GENERATED, data_filename, None
+        except Exception as e:
+            return parallel.FAILED, data_filename, str(e)
+
+
+def template_paths(output_format, use_pyramid=False):
+    """
+    Returns the templates rendered into a config's output, so edits to them invalidate it like data changes.
+    """
+    if output_format != 'html':
+        # Payloads hold data only; the legend is part of the shared viewer page
+        return []
+    paths = [COLOR_SCALE_PATH, CAPACITY_BOX_TEMPLATE_PATH]
+    if use_pyramid:
+        paths.append(pyramid.ZOOM_SWITCH_TEMPLATE_PATH)
+    return paths
+
+def _describe_task(task):
+    """
+    Returns (config_name, input_paths, output_path) of a task for the build manifest.
+    """
+    _, data_filename, output_format, from_store, use_pyramid = task
+    input_paths = [_input_path(data_filename, from_store)] + template_paths(output_format, use_pyramid)
+    return data_filename, input_paths, output_path(data_filename, output_format)
+
+
+def generate_all_visualizations(jobs=1, incremental=False, output_format='html', from_store=False,
+                                use_pyramid=False, registry=None):
+    """
+    Generates a map for every capacity config found in the data.
+
+    Args:
+        jobs (int): Number of worker processes used to render configurations.
+        incremental (bool): Only rebuild maps whose inputs changed since the last run.
+        output_format (str): 'html' for self-contained pages, 'shell' for the
+                             shared viewer page plus per-config payloads.
+        from_store (bool): Load cell data from the columnar cell store instead of text files.
+        use_pyramid (bool): Add coarser H3 parent levels (summed capacity) shown by zoom.
+        registry (configs.Registry): Configs already scanned by the build driver;
+                                     the data directory is scanned when omitted.
+    """
+    print("Starting pre-generation of all Country Per Cell Capacity visualizations...")
+    profiling.start_run()
+
+    if registry is None:
+        # One listing of the data directory (or the store) rather than a probe per possible config
+        registry = configs.scan(capacity_dir=DATA_DIR, from_store=from_store)
+        configs.print_ignored(registry)
+
+    tasks = [
+        (configs.COUNTRIES[config.country], config.filename, output_format, from_store, use_pyramid)
+        for config in registry.capacity
+    ]
+
+    print(f"Found {len(tasks)} configurations with data, using {parallel.resolve_jobs(jobs)} worker(s).")
+    stats_index.prune('capacity', [task[1] for task in tasks])
+
+    if output_format == 'shell':
+        viewer_path = viewer.write_viewer_page(VIEWER_TEMPLATE_PATH, COLOR_SCALE_PATH, VIZ_DIR)
+        print(f"Wrote shared viewer page: {viewer_path}")
+
+    if incremental:
+        # Payloads keep their own manifest so switching formats never mixes up outputs
+        manifest_dir = viewer.payload_dir(VIZ_DIR) if output_format == 'shell' else VIZ_DIR
+        # Toggling the pyramid changes every output, like a generator change
+        generator_version = f"{GENERATOR_VERSION}+pyramid" if use_pyramid else GENERATOR_VERSION
+        counts, failures = manifest.run_incremental(
+            _generate_config, tasks, jobs, manifest_dir, _describe_task, generator_version
+        )
+    else:
+        counts, failures = parallel.tally_results(parallel.run_tasks(_generate_config, tasks, jobs))
+    parallel.print_summary(counts, failures)
+    viewer.record_output_mode('capacity', output_format)
+    if content_store.enabled():
+        # Drop objects whose outputs were all re-rendered or removed since they were stored
+        content_store.collect_garbage()
+    profiling.print_summary()
 
 if __name__ == "__main__":
-    generate_all_visualizations()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pre-generate per-cell capacity maps.")
+    parallel.add_jobs_argument(parser)
+    manifest.add_incremental_argument(parser)
+    viewer.add_format_argument(parser)
+    cell_store.add_store_argument(parser)
+    pyramid.add_pyramid_argument(parser)
+    streaming.add_chunk_argument(parser)
+    h3_geometry.add_geometry_argument(parser)
+    content_store.add_dedup_argument(parser)
+    assets.add_assets_argument(parser)
+    precompress.add_precompress_argument(parser)
+    profiling.add_profile_argument(parser)
+    stats_index.add_stats_argument(parser)
+    args = parser.parse_args()
+    if args.chunk_rows is not None and (args.from_store or args.pyramid):
+        parser.error("--chunk-rows cannot be combined with --from-store or --pyramid")
+    if args.h3_geometry and (args.format != 'shell' or args.chunk_rows is not None):
+        parser.error("--h3-geometry needs --format shell and cannot be combined with --chunk-rows")
+    streaming.configure_from_args(args)
+    h3_geometry.configure_from_args(args)
+    content_store.configure_from_args(args)
+    assets.configure_from_args(args)
+    precompress.configure_from_args(args)
+    profiling.configure_from_args(args)
+    stats_index.configure_from_args(args)
+    generate_all_visualizations(
+        jobs=args.jobs, incremental=args.incremental, output_format=args.format, from_store=args.from_store,
+        use_pyramid=args.pyramid
+    )
@@ -1,8 +1,74 @@
+import argparse
+import functools
+import numpy as np
 import pandas as pd
 import pydeck as pdk
 import os
+import sys
 
-def create_gs_utilization_map(gs_data_df, config_name):
+if __package__ in (None, ''):
+    # Run as a script ('python utils/generate_gs_utilization_maps.py'): make the utils package importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import (
+    assets, colors, configs, content_store, gs_matrix, html_writer, manifest, parallel, precompress, profiling,
+    stats_index, viewer
+)
+
+# Bump whenever a change here alters the generated HTML, so incremental builds redo every map
+GENERATOR_VERSION = 4
+
+DATA_DIR = gs_matrix.DATA_DIR
+GS_LOCATIONS_PATH = gs_matrix.GS_LOCATIONS_PATH
+VIZ_DIR = os.path.join('static', 'visualizations', 'gs_utilizations')
+COLOR_SCALE_PATH = os.path.join('templates', 'color_scales', 'gs_utilizations_color_scale.html')
+VIEWER_TEMPLATE_PATH = os.path.join(viewer.VIEWER_TEMPLATES_DIR, 'gs_utilizations_viewer.html')
+
+# Global initial viewport showing all stations
+GS_VIEW = {'latitude': 30, 'longitude': 0, 'zoom': 1.5}
+
+def html_output_path(config_name):
+    """
+    Returns the HTML path of a utilization config (e.g., 'config_a.txt' -> 'config_a.html').
+    """
+    return os.path.join(VIZ_DIR, f"{os.path.splitext(config_name)[0]}.html")
+
+def output_path(config_name, output_format='html'):
+    """
+    Returns the path written for a utilization config in the given output format.
+    """
+    if output_format == 'shell':
+        return viewer.payload_output_path(VIZ_DIR, os.path.splitext(config_name)[0])
+    return html_output_path(config_name)
+
+def create_station_payload(stations):
+    """
+    Saves the static station layer data (names and positions) shared by every config.
+    """
+    payload = {
+        'view': GS_VIEW,
+        'name': stations['name'].tolist(),
+        'longitude': stations['longitude'].tolist(),
+        'latitude': stations['latitude'].tolist(),
+    }
+    return viewer.write_payload(viewer.payload_output_path(VIZ_DIR, 'stations'), payload)
+
+def create_gs_utilization_payload(vector, config_name):
+    """
+    Saves the utilization vector of a config, aligned to the station payload (null = no value).
+
+    Fill colors are precomputed and aligned the same way (transparent where there is no value).
+    """
+    fill_colors = colors.green_yellow_red(np.nan_to_num(vector))
+    fill_colors[np.isnan(vector)] = 0
+    payload = {
+        'view': GS_VIEW,
+        'utilization': [None if np.isnan(value) else round(float(value), 6) for value in vector],
+        'fill_color': colors.encode(fill_colors),
+    }
+    return viewer.write_payload(output_path(config_name, 'shell'), payload)
+
+def create_gs_utilization_map(gs_data_df, config_name, html_path=None):
     """
     Generates and saves a pydeck map visualization for GS utilization.
 
@@ -10,145 +76,216 @@ def create_gs_utilization_map(gs_data_df, config_name):
         gs_data_df (pd.DataFrame): DataFrame containing merged GS data including 
                                    'latitude', 'longitude', 'name', and 'utilization'.
         config_name (str): The original filename of the utilization data.
+        html_path (str): Output path; defaults to html_output_path(config_name).
     """
     
-    # Ensure utilization column is numeric for color calculations
-    gs_data_df['utilization'] = pd.to_numeric(gs_data_df['utilization'])
-
-    # 1. CREATE A NEW COLUMN FOR DISPLAY, FORMATTED TO 3 DECIMAL PLACES
-    gs_data_df['utilization_display'] = gs_data_df['utilization'].map('{:.3f}'.format)
-
-    # Define the Scatterplot layer to display ground stations as circles
-    layer = pdk.Layer(
-        "ScatterplotLayer",
-        gs_data_df,
-        pickable=True,
-        opacity=0.8,
-        stroked=True,
-        filled=True,
-        radius_min_pixels=5,
-        radius_max_pixels=100,
-        line_width_min_pixels=1,
-        get_position='[longitude, latitude]',
-        get_radius=15000,  # Radius of circles in meters
-        # Color gradient logic still uses the ORIGINAL numeric 'utilization' column
-        get_fill_color="[utilization <= 0.5 ? 255 * 2 * utilization : 255, utilization <= 0.5 ? 255 : 255 * 2 * (1 - utilization), 0, 185]",
-        get_line_color=[0, 0, 0],
-    )
+    with profiling.stage('normalize'):
+        # Ensure utilization column is numeric for color calculations
+        gs_data_df['utilization'] = pd.to_numeric(gs_data_df['utilization'])
 
-    # Set a global initial viewport to show all stations
-    view_state = pdk.ViewState(
-        latitude=30,
-        longitude=0,
-        zoom=1.5,
-        bearing=0,
-        pitch=0
-    )
+        # 1. CREATE A NEW COLUMN FOR DISPLAY, FORMATTED TO 3 DECIMAL PLACES
+        gs_data_df['utilization_display'] = gs_data_df['utilization'].map('{:.3f}'.format)
 
-    # Create the pydeck map object
-    r = pdk.Deck(
-        layers=[layer],
-        initial_view_state=view_state,
-        tooltip={"html": "<b>Name:</b> {name}<br/><b>Utilization:</b> {utilization_display}"},
-        map_style="light",
-    )
+        # Fill colors, precomputed so the browser does not evaluate a color expression per station
+        gs_data_df['fill_color'] = colors.as_column(colors.green_yellow_red(gs_data_df['utilization']))
 
-    # Define the output directory and create it if it doesn't exist
-    viz_dir = os.path.join('static', 'visualizations', 'gs_utilizations')
-    os.makedirs(viz_dir, exist_ok=True)
-    
-    # Construct the output filename (e.g., 'config_a.txt' -> 'config_a.html')
-    html_filename = f"{os.path.splitext(config_name)[0]}.html"
-    html_path = os.path.join(viz_dir, html_filename)
+    with profiling.stage('layers'):
+        # Define the Scatterplot layer to display ground stations as circles
+        layer = pdk.Layer(
+            "ScatterplotLayer",
+            gs_data_df,
+            pickable=True,
+            opacity=0.8,
+            stroked=True,
+            filled=True,
+            radius_min_pixels=5,
+            radius_max_pixels=100,
+            line_width_min_pixels=1,
+            get_position='[longitude, latitude]',
+            get_radius=15000,  # Radius of circles in meters
+            get_fill_color="fill_color",
+            get_line_color=[0, 0, 0],
+        )
+
+        # Set a global initial viewport to show all stations
+        view_state = pdk.ViewState(
+            latitude=GS_VIEW['latitude'],
+            longitude=GS_VIEW['longitude'],
+            zoom=GS_VIEW['zoom'],
+            bearing=0,
+            pitch=0
+        )
+
+        # Create the pydeck map object
+        r = pdk.Deck(
+            layers=[layer],
+            initial_view_state=view_state,
+            tooltip={"html": "<b>Name:</b> {name}<br/><b>Utilization:</b> {utilization_display}"},
+            map_style="light",
+        )
+
+    # Create the output directory if it doesn't exist
+    html_path = html_path or html_output_path(config_name)
+    os.makedirs(os.path.dirname(html_path), exist_ok=True)
     
-    # 1. Render the map to an in-memory string
-    html_content = r.to_html(as_string=True, notebook_display=False)
+    # 1. Serialize the map; the page is streamed to the file in step 3
+    with profiling.stage('to_html'):
+        page_chunks = html_writer.deck_page_chunks(r, html_path)
     
-    # 2. Load the content of the color scale legend
-    color_scale_path = os.path.join('templates', 'color_scales', 'gs_utilizations_color_scale.html')
-    if os.path.exists(color_scale_path):
-        with open(color_scale_path, 'r') as f:
-            color_scale_html = f.read()
-        # 3. Inject the legend's HTML just before the closing </body> tag
-        html_content = html_content.replace('</body>', f'{color_scale_html}</body>')
+    with profiling.stage('legend'):
+        # 2. Load the color scale legend (read once per process)
+        color_scale_html = html_writer.render_template(COLOR_SCALE_PATH)
     
-    # 4. Save the combined HTML content to the file
-    with open(html_path, 'w') as f:
-        f.write(html_content)
+    # 3. Write the page with the legend's HTML just before the closing </body> tag
+    with profiling.stage('write'):
+        html_writer.write_chunks(page_chunks, html_path, [color_scale_html])
+    profiling.note(output_path=html_path)
     
     return html_path
 
-def generate_all_visualizations():
+def _generate_config(station_table, task):
+    """
+    Worker: aligns one config's utilizations with the station table and renders its map.
+
+    Returns a (status, config_name, message) tuple so results can be
+    aggregated by the parent process.
+    """
+    stations, lookup = station_table
+    filename, output_format, from_matrix = task
+    with profiling.profile_config('gs_utilization', filename):
+        try:
+            with profiling.stage('load'):
+                if from_matrix:
+                    vector = gs_matrix.matrix_vector(filename, len(stations))
+                else:
+                    # Assume a headerless CSV format: gs_id,utilization
+                    vector = gs_matrix.read_utilization_vector(os.path.join(DATA_DIR, filename), lookup, len(stations))
+            profiling.note(rows=int(np.count_nonzero(~np.isnan(vector))))
+
+            if np.isnan(vector).all():
+                return parallel.SKIPPED, filename, "no matching GS IDs found after offset"
+            stats_index.record('gs_utilization', filename, vector)
+
+            key = None
+            if content_store.enabled():
+                key = content_store.content_key(
+                    'gs_utilization', GENERATOR_VERSION, [GS_LOCATIONS_PATH, COLOR_SCALE_PATH], output_format, vector
+                )
+                if content_store.link_output(key, output_path(filename, output_format)):
+                    return parallel.SHARED, filename, None
+
+            # Call the function to create and save the map visualization (or the viewer payload)
+            if output_format == 'shell':
+                create_gs_utilization_payload(vector, filename)
+            else:
+                create_gs_utilization_map(gs_matrix.stations_with_utilization(stations, vector), filename)
+            if key is not None:
+                content_store.store_output(key, output_path(filename, output_format))
+            return parallel.GENERATED, filename, None
+        except Exception as e:
+            return parallel.FAILED, filename, str(e)
+
+def _describe_task(task):
+    """
+    Returns (config_name, input_paths, output_path) of a task for the build manifest.
+    """
+    filename, output_format, from_matrix = task
+    # From the matrix, only the config's own row counts, so one changed config does not rebuild them all
+    data_input = gs_matrix.row_digest(filename) if from_matrix else os.path.join(DATA_DIR, filename)
+    input_paths = [data_input, GS_LOCATIONS_PATH]
+    if output_format == 'html':
+        input_paths.append(COLOR_SCALE_PATH)
+    return filename, input_paths, output_path(filename, output_format)
+
+def generate_all_visualizations(jobs=1, incremental=False, output_format='html', from_matrix=False,
+                                registry=None):
     """
     Iterates through all GS utilization data files in the specified directory
     and generates a map for each one.
+
+    Args:
+        jobs (int): Number of worker processes used to render configurations.
+        incremental (bool): Only rebuild maps whose inputs changed since the last run.
+        output_format (str): 'html' for self-contained pages, 'shell' for the
+                             shared viewer page, one station payload and a
+                             utilization vector per config.
+        from_matrix (bool): Read utilizations from the configs x stations matrix.
+        registry (configs.Registry): Configs already scanned by the build driver;
+                                     the data directory is scanned when omitted.
     """
     print("Starting pre-generation of all Ground Station Utilization visualizations...")
+    profiling.start_run()
     
-    # 1. Load ground station location data from the CSV file
-    gs_locations_path = os.path.join('static', 'ground_stations_starlink.csv')
+    # 1. Load the ground station table once, indexed by station id
     try:
-        gs_locations_df = pd.read_csv(
-            gs_locations_path, 
-            header=None, 
-            names=['id', 'name', 'latitude', 'longitude', 'extra']
-        )
+        station_table = gs_matrix.load_station_table(GS_LOCATIONS_PATH)
     except FileNotFoundError:
-        print(f"ERROR: Ground station locations file not found at '{gs_locations_path}'")
+        print(f"ERROR: Ground station locations file not found at '{GS_LOCATIONS_PATH}'")
         return
 
-    # 2. Locate and process each utilization data file
-    data_dir = os.path.join('static', 'gs_utilizations_data')
-    if not os.path.isdir(data_dir):
-        print(f"ERROR: Data directory not found at '{data_dir}'")
-        return
-
-    utilization_files = [f for f in os.listdir(data_dir) if os.path.isfile(os.path.join(data_dir, f))]
+    # 2. Locate each utilization config, from the matrix or the data directory
+    if from_matrix:
+        if not os.path.exists(gs_matrix.MATRIX_PATH):
+            print(f"ERROR: Utilization matrix not found at '{gs_matrix.MATRIX_PATH}'")
+            return
+        utilization_files = list(gs_matrix.load_matrix(gs_matrix.MATRIX_PATH)[0])
+    else:
+        if not os.path.isdir(DATA_DIR):
+            print(f"ERROR: Data directory not found at '{DATA_DIR}'")
+            return
+        if registry is None:
+            registry = configs.scan(gs_dir=DATA_DIR)
+            configs.print_ignored(registry)
+        utilization_files = [config.filename for config in registry.gs]
     
     if not utilization_files:
-        print(f"No utilization data files found in '{data_dir}'.")
+        print(f"No utilization data files found in '{DATA_DIR}'.")
         return
 
-    generated_count = 0
-    skipped_count = 0
+    tasks = [(filename, output_format, from_matrix) for filename in sorted(utilization_files)]
+    print(f"Found {len(tasks)} utilization files, using {parallel.resolve_jobs(jobs)} worker(s).")
+    stats_index.prune('gs_utilization', utilization_files)
 
-    # 3. Loop through each data file, generate and save the map
-    for filename in utilization_files:
-        print(f"  - Processing: {filename}...")
-        data_path = os.path.join(data_dir, filename)
-        
-        try:
-            # Assume a headerless CSV format: gs_id,utilization
-            util_df = pd.read_csv(data_path, header=None, names=['id', 'utilization'])
-            
-            util_df['id'] = util_df['id'] - 6364
-            
-            if util_df.empty:
-                print(f"    - SKIPPED (empty data file): {filename}")
-                skipped_count += 1
-                continue
-
-            # Merge utilization data with GS location and name data
-            merged_df = pd.merge(gs_locations_df, util_df, on='id')
-            
-            if merged_df.empty:
-                 print(f"    - SKIPPED (no matching GS IDs found after offset): {filename}")
-                 skipped_count += 1
-                 continue
-            
-            # Call the function to create and save the map visualization
-            create_gs_utilization_map(merged_df, filename)
-            generated_count += 1
+    if output_format == 'shell':
+        # The station geometry is written once and shared by every config
+        viewer_path = viewer.write_viewer_page(VIEWER_TEMPLATE_PATH, COLOR_SCALE_PATH, VIZ_DIR)
+        create_station_payload(station_table[0])
+        print(f"Wrote shared viewer page and station layer: {viewer_path}")
 
-        except Exception as e:
-            print(f"    - FAILED to process {filename}: {e}")
-            skipped_count += 1
-            
-    print("\n--------------------------------------------------")
-    print("          Generation Complete                     ")
-    print(f"   Total HTML files generated: {generated_count}")
-    print(f"   Total configurations skipped: {skipped_count}")
-    print("--------------------------------------------------")
+    # 3. Generate and save a map for each config
+    worker = functools.partial(_generate_config, station_table)
+    if incremental:
+        # Payloads keep their own manifest so switching formats never mixes up outputs
+        manifest_dir = viewer.payload_dir(VIZ_DIR) if output_format == 'shell' else VIZ_DIR
+        counts, failures = manifest.run_incremental(
+            worker, tasks, jobs, manifest_dir, _describe_task, GENERATOR_VERSION
+        )
+    else:
+        counts, failures = parallel.tally_results(parallel.run_tasks(worker, tasks, jobs))
+    parallel.print_summary(counts, failures)
+    viewer.record_output_mode('gs', output_format)
+    if content_store.enabled():
+        # Drop objects whose outputs were all re-rendered or removed since they were stored
+        content_store.collect_garbage()
+    profiling.print_summary()
 
 if __name__ == "__main__":
-    generate_all_visualizations()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pre-generate ground station utilization maps.")
+    parallel.add_jobs_argument(parser)
+    manifest.add_incremental_argument(parser)
+    viewer.add_format_argument(parser)
+    gs_matrix.add_matrix_argument(parser)
+    content_store.add_dedup_argument(parser)
+    assets.add_assets_argument(parser)
+    precompress.add_precompress_argument(parser)
+    profiling.add_profile_argument(parser)
+    stats_index.add_stats_argument(parser)
+    args = parser.parse_args()
+    content_store.configure_from_args(args)
+    assets.configure_from_args(args)
+    precompress.configure_from_args(args)
+    profiling.configure_from_args(args)
+    stats_index.configure_from_args(args)
+    generate_all_visualizations(
+        jobs=args.jobs, incremental=args.incremental, output_format=args.format, from_matrix=args.from_matrix
+    )
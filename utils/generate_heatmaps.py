@@ -1,230 +1,765 @@
+import argparse
+import json
 import pandas as pd
 import pydeck as pdk
 import os
+import shutil
+import sys
 import numpy as np
 
-# This data is needed for setting the map's initial view (latitude, longitude, zoom)
-COUNTRY_CONFIGS = {
-    'Britain': {'latitude': 55.3781, 'longitude': -3.4360, 'zoom': 5},
-    'Ghana': {'latitude': 7.9465, 'longitude': -1.0232, 'zoom': 6},
-    'South Africa': {'latitude': -30.5595, 'longitude': 22.9375, 'zoom': 5},
-    'Tonga': {'latitude': -21.1789, 'longitude': -175.1982, 'zoom': 6},
-    'Lithuania': {'latitude': 55.1694, 'longitude': 23.8813, 'zoom': 6},
-    'Haiti': {'latitude': 18.9712, 'longitude': -72.2852, 'zoom': 7}
-}
+if __package__ in (None, ''):
+    # Run as a script ('python utils/generate_heatmaps.py'): make the utils package importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def create_heatmap_map(nation_cells_df, heatmap_cells_df, country_display_name, config_name, scale_min):
+from utils import (
+    assets, cell_store, colors, configs, h3_geometry, html_writer, loaders, manifest, parallel, precompress, profiling,
+    pyramid, stats_index, streaming, viewer
+)
+
+# Bump whenever a change here alters the generated HTML, so incremental builds redo every map
+GENERATOR_VERSION = 5
+
+DATA_DIR = os.path.join('static', 'cell_heatmap_data')
+VIZ_DIR = os.path.join('static', 'visualizations', 'cell_heatmaps')
+# Bundles live apart from VIZ_DIR so each mode keeps its own incremental build manifest
+BUNDLE_DIR = os.path.join('static', 'visualizations', 'cell_heatmap_bundles')
+COLOR_SCALE_PATH = os.path.join('templates', 'color_scales', 'heatmap_color_scale.html')
+DEMAND_SWITCH_TEMPLATE_PATH = os.path.join('templates', 'heatmap_bundle', 'demand_switch.html')
+# Tiled output: one shared viewer page, a tile index per config and its tiles under data/<config>/
+TILE_DIR = os.path.join('static', 'visualizations', 'cell_heatmap_tiles')
+TILED_VIEWER_TEMPLATE_PATH = os.path.join(viewer.VIEWER_TEMPLATES_DIR, 'cell_heatmap_viewer.html')
+
+# Cells are tiled by their H3 parent at this resolution (~87,000 km2 per tile),
+# so a country view fetches a handful of tiles out of the worldwide set
+TILE_RESOLUTION = 2
+
+def html_output_path(config_name):
     """
-    Generates and saves a pydeck map visualization for capacity degradation.
+    Returns the HTML path of a heatmap config.
     """
-    # 1. Layer for nation cells (blue)
-    nation_layer = pdk.Layer(
-        "H3HexagonLayer",
-        data=nation_cells_df,
-        pickable=False,
-        stroked=False,
-        filled=True,
-        extruded=False,
-        get_hexagon="hex",
-        get_fill_color=[0, 0, 255, 200]
-    )
+    return os.path.join(VIZ_DIR, f"{config_name}_cell_heatmap.html")
+
+
+def bundle_output_path(pair_name):
+    """
+    Returns the HTML path of the multi-demand bundle of a country/terminal pair.
+    """
+    return os.path.join(BUNDLE_DIR, f"{pair_name}_cell_heatmap_bundle.html")
+
+
+def tile_index_path(config_name):
+    """
+    Returns the tile index payload of a heatmap config (tiled output).
+    """
+    return viewer.payload_output_path(TILE_DIR, config_name)
+
+
+def tile_dir(config_name):
+    """
+    Returns the directory holding the tiles of a heatmap config (tiled output).
+    """
+    return os.path.join(viewer.payload_dir(TILE_DIR), config_name)
+
+
+def _color_scale_html(scale_min, scale_max):
+    """
+    Returns the color scale legend relabeled to [scale_min, scale_max], or None without the template.
+    """
+    scale_mid = (scale_min + scale_max) / 2
+    # Format to one decimal place for the label
+    min_label = f"{scale_min:.1f}"
+    mid_label = f"{scale_mid:.1f}"
+    max_label = f"{scale_max:.1f}"
+
+    # Replace the static labels of the (cached) template
+    return html_writer.render_template(COLOR_SCALE_PATH, {
+        '<span>0.0</span>': f'<span>{min_label}</span>',
+        '<span>0.5</span>': f'<span>{mid_label}</span>',
+        '<span>1.0</span>': f'<span>{max_label}</span>',
+    })
+
+
+def _pyramid_frames(cells_df, value_column, how):
+    """
+    Returns (pyramid level, DataFrame with 'hex' and 'value') per zoom level, coarsest first.
+    """
+    frames = []
+    for level in pyramid.build_levels(loaders.hex_to_uint64(cells_df['hex'].to_numpy()), cells_df[value_column], how):
+        frames.append((level, pd.DataFrame({'hex': loaders.uint64_to_hex(level['cells']), 'value': level['values']})))
+    return frames
+
+
+def _heatmap_layer_frame(frame, scale_min, scale_max):
+    """
+    Returns the columns the heatmap layer uses: 'hex', 'truncated_value' and the precomputed 'fill_color'.
+    """
+    normalized = colors.normalize(frame['value'], scale_min, scale_max, degenerate=1.0)
+    return pd.DataFrame({
+        'hex': frame['hex'],
+        'truncated_value': np.floor(frame['value'] * 1000) / 1000,
+        'fill_color': colors.as_column(colors.red_yellow_green(normalized)),
+    })
+
 
+def _level_options(prefix, level, initial_zoom):
+    """
+    Returns the id/visibility options of a pyramid level's layer (none without a pyramid).
+    """
+    if level is None:
+        return {}
+    return {'id': pyramid.layer_id(prefix, level), 'visible': pyramid.visible_at(level, initial_zoom)}
+
+
+def create_heatmap_map(nation_cells_df, heatmap_cells_df, country_display_name, config_name, scale_min,
+                       html_path=None, pyramid_stat=None):
+    """
+    Generates and saves a pydeck map visualization for capacity degradation.
+
+    The map is written to html_output_path(config_name) unless `html_path` is given.
+    With `pyramid_stat` ('min' or 'mean'), coarser parent levels holding that
+    statistic of the available capacity are added as extra layers, and a
+    script shows the level matching the current zoom, fetching the levels not
+    embedded in the page (see pyramid.level_data).
+
+    Without a pyramid, both cell inputs may also be iterables of DataFrame
+    chunks: their rows are then streamed into the page (see render_config_streamed).
+    """
     scale_max = 1.0
-    
-    if (scale_max - scale_min) == 0:
-        norm_expr = "1.0" # If min=max, just use a single color (e.g., green)
-    else:
-        min_str = f"{scale_min:.10f}"
-        range_str = f"{(scale_max - scale_min):.10f}"
-        
-        # This is the raw normalization: (value - min) / (max - min)
-        raw_norm_expr = f"((value - {min_str}) / {range_str})"
-        norm_expr = f"({raw_norm_expr} < 0.0 ? 0.0 : ({raw_norm_expr} > 1.0 ? 1.0 : {raw_norm_expr}))"
-
-    color_expr = f"[{norm_expr} <= 0.5 ? 255 : 255 * 2 * (1 - {norm_expr}), {norm_expr} <= 0.5 ? 255 * 2 * {norm_expr} : 255, 0, 185]"
-
-
-    # 2. Layer for non-nation heatmap cells (gradient)
-    heatmap_layer = pdk.Layer(
-        "H3HexagonLayer",
-        data=heatmap_cells_df,
-        pickable=True,
-        stroked=True,
-        filled=True,
-        extruded=False,
-        get_hexagon="hex",
-        get_fill_color=color_expr,
-        get_line_color=[255, 255, 255],
-        line_width_min_pixels=2,
-    )
+    streamed = not isinstance(heatmap_cells_df, pd.DataFrame)
 
-    # Set the initial viewport based on the selected country
-    view_state = pdk.ViewState(
-        latitude=COUNTRY_CONFIGS[country_display_name]['latitude'],
-        longitude=COUNTRY_CONFIGS[country_display_name]['longitude'],
-        zoom=COUNTRY_CONFIGS[country_display_name]['zoom'],
-        bearing=0, pitch=0
-    )
+    with profiling.stage('normalize'):
+        if pyramid_stat:
+            heatmap_frames = _pyramid_frames(heatmap_cells_df, 'value', pyramid_stat)
+            nation_frames = _pyramid_frames(nation_cells_df, 'terminals', 'sum')
+        else:
+            heatmap_frames = [(None, heatmap_cells_df)]
+            nation_frames = [(None, nation_cells_df)]
 
-    # Create the pydeck map object with both layers
-    r = pdk.Deck(
-        layers=[nation_layer, heatmap_layer],
-        initial_view_state=view_state,
-        tooltip={"text": "Available capacity:\n {truncated_value}"},
-        map_style="light",
-    )
+        # Precompute the gradient colors, clamped to [scale_min, scale_max] (a single
+        # color if min=max), so the browser does not evaluate a color expression per cell.
+        # Only the columns the layer uses are sent to the page.
+        if streamed:
+            # Chunks are colored lazily, as the page is written
+            heatmap_layer_frames = [(None, (
+                _heatmap_layer_frame(chunk, scale_min, scale_max) for chunk in heatmap_cells_df
+            ))]
+            nation_layer_frames = [(None, (chunk[['hex']] for chunk in nation_cells_df))]
+        else:
+            heatmap_layer_frames = [
+                (level, _heatmap_layer_frame(frame, scale_min, scale_max)) for level, frame in heatmap_frames
+            ]
+            nation_layer_frames = [(level, frame[['hex']]) for level, frame in nation_frames]
+
+    with profiling.stage('layers'):
+        initial_zoom = configs.COUNTRY_CONFIGS[country_display_name]['zoom']
+        # Placeholder layer data -> rows streamed into the page (see utils.streaming)
+        streams = {}
+        html_path = html_path or html_output_path(config_name)
+        # Pyramid levels not shown at the initial zoom are fetched by the page on zoom
+        pyramid.remove_level_files(html_path)
+        layer_ranges = {}
+
+        def layer_data(prefix, level, frame):
+            if streamed:
+                return streaming.stream_placeholder(frame, streams)
+            if level is None:
+                return frame
+            data, level_file = pyramid.level_data(prefix, level, frame, initial_zoom, html_path)
+            layer_ranges[pyramid.layer_id(prefix, level)] = [level['min_zoom'], level['max_zoom'], level_file]
+            return data
+
+        # 1. Layer for nation cells (blue), one per zoom level with a pyramid
+        layers = [
+            pdk.Layer(
+                "H3HexagonLayer",
+                data=layer_data('nation', level, frame),
+                pickable=False,
+                stroked=False,
+                filled=True,
+                extruded=False,
+                get_hexagon="hex",
+                get_fill_color=[0, 0, 255, 200],
+                **_level_options('nation', level, initial_zoom),
+            )
+            for level, frame in nation_layer_frames
+        ]
+
+        # 2. Layer for non-nation heatmap cells (gradient)
+        layers += [
+            pdk.Layer(
+                "H3HexagonLayer",
+                data=layer_data('heatmap', level, frame),
+                pickable=True,
+                stroked=True,
+                filled=True,
+                extruded=False,
+                get_hexagon="hex",
+                get_fill_color="fill_color",
+                get_line_color=[255, 255, 255],
+                line_width_min_pixels=2,
+                **_level_options('heatmap', level, initial_zoom),
+            )
+            for level, frame in heatmap_layer_frames
+        ]
+
+        # Set the initial viewport based on the selected country
+        view_state = pdk.ViewState(
+            latitude=configs.COUNTRY_CONFIGS[country_display_name]['latitude'],
+            longitude=configs.COUNTRY_CONFIGS[country_display_name]['longitude'],
+            zoom=configs.COUNTRY_CONFIGS[country_display_name]['zoom'],
+            bearing=0, pitch=0
+        )
+
+        # Create the pydeck map object with both layers
+        r = pdk.Deck(
+            layers=layers,
+            initial_view_state=view_state,
+            tooltip={"text": "Available capacity:\n {truncated_value}"},
+            map_style="light",
+        )
 
     # Save the map to an HTML file
-    viz_dir = os.path.join('static', 'visualizations', 'cell_heatmaps')
-    os.makedirs(viz_dir, exist_ok=True)
-    
-    html_filename = f"{config_name}_cell_heatmap.html"
-    html_path = os.path.join(viz_dir, html_filename)
+    os.makedirs(os.path.dirname(html_path), exist_ok=True)
     
-    html_content = r.to_html(as_string=True, notebook_display=False)
+    with profiling.stage('to_html'):
+        page_chunks = html_writer.expand_streams(html_writer.deck_page_chunks(r, html_path), streams)
     
-    # Add the custom color scale legend to the HTML
-    color_scale_path = os.path.join('templates', 'color_scales', 'heatmap_color_scale.html')
-    if os.path.exists(color_scale_path):
-        with open(color_scale_path, 'r') as f:
-            color_scale_html = f.read()
-        
-        # --- Dynamically update legend labels (this part is unchanged) ---
-        scale_mid = (scale_min + scale_max) / 2
-        # Format to one decimal place for the label
-        min_label = f"{scale_min:.1f}"
-        mid_label = f"{scale_mid:.1f}"
-        max_label = f"{scale_max:.1f}"
-        
-        # Replace the static labels in the HTML string
-        color_scale_html = color_scale_html.replace('<span>0.0</span>', f'<span>{min_label}</span>')
-        color_scale_html = color_scale_html.replace('<span>0.5</span>', f'<span>{mid_label}</span>')
-        color_scale_html = color_scale_html.replace('<span>1.0</span>', f'<span>{max_label}</span>')
-        
-        # Inject the *modified* HTML into the body
-        html_content = html_content.replace('</body>', f'{color_scale_html}</body>')
+    with profiling.stage('legend'):
+        # Add the custom color scale legend, relabeled to this config's scale, before </body>
+        fragments = [_color_scale_html(scale_min, scale_max)]
+
+        if layer_ranges:
+            fragments.append(pyramid.zoom_switch_html(layer_ranges))
     
-    with open(html_path, 'w') as f:
-        f.write(html_content)
+    with profiling.stage('write'):
+        html_writer.write_chunks(page_chunks, html_path, fragments)
+    profiling.note(output_path=html_path)
 
     return html_path
 
 
-def generate_all_visualizations():
+def create_heatmap_tiles(nation_cells_df, heatmap_cells_df, country_display_name, config_name, scale_min):
     """
-    Iterates through all possible configurations and generates a map for each.
+    Saves a heatmap config as spatial tiles for the shared tiled viewer page.
+
+    Heatmap cells are grouped by their H3 parent at TILE_RESOLUTION, one JSON
+    tile each under tile_dir(config_name). The tile index payload holds the
+    view, the color scale, the nation cells and the cell count of every tile,
+    so the viewer only fetches the tiles covering the viewport. With
+    precomputed geometry on, each tile ships its cells as binary polygons
+    instead of a 'hex' column (see utils.h3_geometry).
+
+    Returns:
+        str: The tile index path.
+    """
+    scale_max = 1.0
+
+    with profiling.stage('normalize'):
+        cells = loaders.hex_to_uint64(heatmap_cells_df['hex'].to_numpy())
+        # Cells coarser than the tiles are their own tile
+        resolution = min(TILE_RESOLUTION, int(pyramid.resolution_of(cells).min()))
+        tiles = pyramid.parent_cells(cells, resolution)
+        order = np.argsort(tiles, kind='stable')
+        tile_cells, starts, counts = np.unique(tiles[order], return_index=True, return_counts=True)
+        tile_names = loaders.uint64_to_hex(tile_cells)
+
+        values = heatmap_cells_df['value'].to_numpy()
+        fill_colors = colors.red_yellow_green(colors.normalize(values, scale_min, scale_max, degenerate=1.0))[order]
+        hexes = heatmap_cells_df['hex'].to_numpy()[order]
+        truncated = (np.floor(values * 1000) / 1000)[order]
+
+    with profiling.stage('write'):
+        out_dir = tile_dir(config_name)
+        os.makedirs(out_dir, exist_ok=True)
+        country = h3_geometry.country_of(config_name)
+        for name, start, count in zip(tile_names, starts, counts):
+            rows = slice(start, start + count)
+            tile_path = os.path.join(out_dir, f"{name}.json")
+            tile = h3_geometry.cell_columns(hexes[rows], country, tile_path)
+            tile.update({
+                'value': truncated[rows].tolist(),
+                'fill_color': colors.encode(fill_colors[rows]),
+            })
+            viewer.write_payload(tile_path, tile)
+        # Drop tiles left from an earlier build of the config
+        live = {f"{name}.json" for name in tile_names}
+        for filename in os.listdir(out_dir):
+            if filename.endswith('.json') and filename not in live:
+                os.remove(os.path.join(out_dir, filename))
+                precompress.remove_siblings(os.path.join(out_dir, filename))
+                h3_geometry.remove_geometry(os.path.join(out_dir, filename))
+
+        country_config = configs.COUNTRY_CONFIGS[country_display_name]
+        payload = {
+            'view': {key: country_config[key] for key in ('latitude', 'longitude', 'zoom')},
+            'scale_min': float(scale_min),
+            'scale_max': scale_max,
+            'tile_resolution': resolution,
+            'tiles': dict(zip(tile_names.tolist(), counts.tolist())),
+            'nation_hex': nation_cells_df['hex'].tolist(),
+        }
+        return viewer.write_payload(tile_index_path(config_name), payload)
+
+
+def prune_tile_dirs(live_config_names):
+    """
+    Removes the tile directories of configs that are no longer built.
+    """
+    tiles_root = viewer.payload_dir(TILE_DIR)
+    if not os.path.isdir(tiles_root):
+        return
+    for name in os.listdir(tiles_root):
+        path = os.path.join(tiles_root, name)
+        if os.path.isdir(path) and name not in live_config_names:
+            shutil.rmtree(path)
+
+
+def render_config(country_display, config_name, heatmap_path, nation_path, from_store=False, html_path=None,
+                  pyramid_stat=None, tiled=False):
+    """
+    Reads one heatmap/nation file pair and renders its map.
+
+    Args:
+        country_display (str): Country display name (key of configs.COUNTRY_CONFIGS).
+        config_name (str): Heatmap config (e.g. 'britain_50000_100000_0.7').
+        heatmap_path (str): Heatmap values file (or cell store column).
+        nation_path (str): Nation cells file (or cell store column).
+        from_store (bool): The paths point into the columnar cell store.
+        html_path (str): Output path; defaults to html_output_path(config_name).
+        pyramid_stat (str): 'min' or 'mean' to add coarser zoom levels (see create_heatmap_map).
+        tiled (bool): Write spatial tiles for the tiled viewer instead of a page (see create_heatmap_tiles).
+
+    Returns:
+        str: The written HTML path (tile index path when tiled), or None if a data file is empty.
+    """
+    chunk_rows = streaming.chunk_rows()
+    if chunk_rows and not (from_store or pyramid_stat or tiled):
+        return render_config_streamed(country_display, config_name, heatmap_path, nation_path, chunk_rows, html_path)
+
+    with profiling.stage('load'):
+        # Read heatmap data (non-nation cells)
+        if from_store:
+            heatmap_df = cell_store.load_column_frame(heatmap_path, 'value')
+        else:
+            heatmap_df = loaders.load_heatmap_values(heatmap_path)
+
+        # Read nation cell data
+        if from_store:
+            nation_df = cell_store.load_column_frame(nation_path, 'terminals')
+        else:
+            nation_df = loaders.load_nation_cells(nation_path)
+        profiling.note(rows=len(heatmap_df), nation_rows=len(nation_df))
+    stats_index.record('heatmap', config_name, heatmap_df['value'])
+
+    with profiling.stage('normalize'):
+        # Keep nation cells with > 0 terminals
+        nation_df_filtered = nation_df[nation_df['terminals'] > 0]
+
+    if heatmap_df.empty or nation_df_filtered.empty:
+        return None
+
+    min_val = heatmap_df['value'].min()
+    scale_min = np.floor(min_val * 10) / 10
+
+    if tiled:
+        return create_heatmap_tiles(nation_df_filtered, heatmap_df, country_display, config_name, scale_min)
+    return create_heatmap_map(
+        nation_df_filtered, heatmap_df, country_display, config_name, scale_min, html_path, pyramid_stat
+    )
+
+
+def render_config_streamed(country_display, config_name, heatmap_path, nation_path, chunk_rows, html_path=None):
+    """
+    Renders a heatmap page from its text files read in chunks of `chunk_rows` rows.
+
+    A first pass takes the count and minimum of the heatmap values (for
+    scale_min) and counts the nation cells with terminals; a second one colors
+    each chunk and streams it into the page. Peak memory follows the chunk
+    size, not the file size (see utils.streaming).
+
+    Returns:
+        str: The written HTML path, or None if a data file is empty.
+    """
+    def heatmap_chunks():
+        return loaders.iter_cell_values(heatmap_path, 'value', np.float64, chunk_rows)
+
+    def nation_chunks():
+        # Keep nation cells with > 0 terminals
+        for df in loaders.iter_cell_values(nation_path, 'terminals', np.int64, chunk_rows):
+            yield df[df['terminals'] > 0]
+
+    with profiling.stage('load'):
+        stats = streaming.scan_stats(df['value'].to_numpy() for df in heatmap_chunks())
+        nation_rows = sum(len(df) for df in nation_chunks())
+        profiling.note(rows=stats['cells'], nation_rows=nation_rows)
+
+    if stats['cells'] == 0 or nation_rows == 0:
+        stats_index.record_streamed('heatmap', config_name, stats)
+        return None
+
+    histogram = streaming.Histogram(stats['min'], stats['max'])
+
+    def counted_heatmap_chunks():
+        for df in heatmap_chunks():
+            histogram.add(df['value'])
+            yield df
+
+    scale_min = np.floor(stats['min'] * 10) / 10
+    html_path = create_heatmap_map(
+        nation_chunks(), counted_heatmap_chunks(), country_display, config_name, scale_min, html_path
+    )
+    stats_index.record_streamed('heatmap', config_name, stats, histogram)
+    return html_path
+
+
+def _generate_config(task):
+    """
+    Worker: reads one heatmap/nation file pair and renders its map.
+
+    Returns a (status, config_name, message) tuple so results can be
+    aggregated by the parent process.
+    """
+    country_display, config_name, heatmap_path, nation_path, from_store, pyramid_stat, tiled = task
+    with profiling.profile_config('heatmap', config_name):
+        try:
+            rendered = render_config(
+                country_display, config_name, heatmap_path, nation_path, from_store, pyramid_stat=pyramid_stat,
+                tiled=tiled
+            )
+            if rendered is None:
+                return parallel.SKIPPED, config_name, "one or more data files are empty"
+            return parallel.GENERATED, config_name, None
+        except Exception as e:
+            return parallel.FAILED, config_name, str(e)
+
+
+def _describe_task(task):
+    """
+    Returns (config_name, input_paths, output_path) of a task for the build manifest.
+    """
+    _, config_name, heatmap_path, nation_path, _, pyramid_stat, tiled = task
+    if tiled:
+        # The legend is part of the shared viewer page, not of the tiles
+        return config_name, [heatmap_path, nation_path], tile_index_path(config_name)
+    input_paths = [heatmap_path, nation_path, COLOR_SCALE_PATH]
+    if pyramid_stat:
+        input_paths.append(pyramid.ZOOM_SWITCH_TEMPLATE_PATH)
+    return config_name, input_paths, html_output_path(config_name)
+
+
+def _load_demand_matrix(heatmap_paths, from_store=False):
+    """
+    Joins the heatmap values of several demands on their H3 cells.
+
+    Returns:
+        tuple: (sorted uint64 cells, float64 cells x demands matrix, NaN where
+               a demand has no value for a cell)
+    """
+    if from_store:
+        # Columns of a group are already aligned to its cell set
+        return cell_store.load_column_matrix(heatmap_paths)
+
+    frames = [loaders.load_heatmap_values(path, with_index=True) for path in heatmap_paths]
+    return loaders.align_columns([frame['h3'].to_numpy() for frame in frames],
+                                 [frame['value'].to_numpy() for frame in frames])
+
+
+def create_heatmap_bundle_map(nation_cells_df, cells, matrix, demand_fns, country_display_name, pair_name,
+                              html_path=None):
+    """
+    Generates and saves one pydeck map holding the heatmaps of several demands.
+
+    Every demand gets its own value and color columns on a single heatmap
+    layer, and the blue nation layer is built once. A script switches the
+    demand shown (and its legend) from the URL hash, e.g. '#0.8'.
+
+    Args:
+        nation_cells_df (pd.DataFrame): Nation cells with 'hex'.
+        cells (np.ndarray): uint64 heatmap cells.
+        matrix (np.ndarray): cells x demands values, NaN where a demand has no value.
+        demand_fns (list): Demand filename parts (e.g. '0.7') of the matrix columns.
+        country_display_name (str): Key of configs.COUNTRY_CONFIGS.
+        pair_name (str): Country/terminal pair (e.g. 'britain_50000_100000').
+        html_path (str): Output path; defaults to bundle_output_path(pair_name).
+    """
+    scale_max = 1.0
+
+    with profiling.stage('normalize'):
+        # Per-demand scale minimum and colors for every cell in one pass over the matrix
+        scale_mins = np.floor(np.nanmin(matrix, axis=0) * 10) / 10
+        fill_colors = colors.red_yellow_green(colors.normalize(matrix, scale_mins, scale_max, degenerate=1.0))
+        truncated_values = np.floor(matrix * 1000) / 1000
+
+        heatmap_df = pd.DataFrame({'hex': loaders.uint64_to_hex(cells)})
+        for column in range(len(demand_fns)):
+            values = truncated_values[:, column]
+            # Absent values become null (NaN is not valid JSON)
+            heatmap_df[f'value_d{column}'] = np.where(np.isnan(values), None, values)
+            heatmap_df[f'fill_d{column}'] = colors.as_column(fill_colors[:, column])
+
+    with profiling.stage('layers'):
+        layers = [
+            # 1. Layer for nation cells (blue)
+            pdk.Layer(
+                "H3HexagonLayer",
+                data=nation_cells_df[['hex']],
+                id='nation',
+                pickable=False,
+                stroked=False,
+                filled=True,
+                extruded=False,
+                get_hexagon="hex",
+                get_fill_color=[0, 0, 255, 200],
+            ),
+            # 2. Layer for non-nation heatmap cells, colored by the selected demand
+            pdk.Layer(
+                "H3HexagonLayer",
+                data=heatmap_df,
+                id='heatmap',
+                pickable=True,
+                stroked=True,
+                filled=True,
+                extruded=False,
+                get_hexagon="hex",
+                get_fill_color="fill_d0",
+                get_line_color=[255, 255, 255],
+                line_width_min_pixels=2,
+            ),
+        ]
+
+        view_state = pdk.ViewState(
+            latitude=configs.COUNTRY_CONFIGS[country_display_name]['latitude'],
+            longitude=configs.COUNTRY_CONFIGS[country_display_name]['longitude'],
+            zoom=configs.COUNTRY_CONFIGS[country_display_name]['zoom'],
+            bearing=0, pitch=0
+        )
+
+        r = pdk.Deck(
+            layers=layers,
+            initial_view_state=view_state,
+            tooltip={"text": "Available capacity:\n {value_d0}"},
+            map_style="light",
+        )
+
+    html_path = html_path or bundle_output_path(pair_name)
+    os.makedirs(os.path.dirname(html_path), exist_ok=True)
+
+    with profiling.stage('to_html'):
+        page_chunks = html_writer.deck_page_chunks(r, html_path)
+
+    with profiling.stage('legend'):
+        # One legend per demand; the switch script shows the selected one
+        demand_labels = {demand_fn: label for label, demand_fn in configs.DEMAND_MAP.items()}
+        fragments = []
+        for demand_fn, scale_min in zip(demand_fns, scale_mins):
+            color_scale_html = _color_scale_html(scale_min, scale_max)
+            if color_scale_html is not None:
+                fragments.append(f'<div class="demand-legend" data-demand="{demand_fn}">{color_scale_html}</div>')
+
+        demands = [
+            {'demand': demand_fn, 'label': demand_labels.get(demand_fn, demand_fn), 'key': f'd{column}'}
+            for column, demand_fn in enumerate(demand_fns)
+        ]
+        fragments.append(html_writer.render_template(DEMAND_SWITCH_TEMPLATE_PATH, {'__DEMANDS__': json.dumps(demands)}))
+
+    with profiling.stage('write'):
+        html_writer.write_chunks(page_chunks, html_path, fragments)
+    profiling.note(output_path=html_path)
+
+    return html_path
+
+
+def render_bundle(country_display, pair_name, demands, nation_path, from_store=False, html_path=None):
+    """
+    Reads the nation file of a country/terminal pair once, joins its demand files and renders one bundled map.
+
+    Args:
+        country_display (str): Country display name (key of configs.COUNTRY_CONFIGS).
+        pair_name (str): Country/terminal pair (e.g. 'britain_50000_100000').
+        demands (list): (demand filename part, heatmap values path) per demand.
+        nation_path (str): Nation cells file (or cell store column).
+        from_store (bool): The paths point into the columnar cell store.
+        html_path (str): Output path; defaults to bundle_output_path(pair_name).
+
+    Returns:
+        str: The written HTML path, or None if the data files are empty.
+    """
+    demand_fns = [demand_fn for demand_fn, _ in demands]
+
+    with profiling.stage('load'):
+        cells, matrix = _load_demand_matrix([path for _, path in demands], from_store)
+        if from_store:
+            nation_df = cell_store.load_column_frame(nation_path, 'terminals')
+        else:
+            nation_df = loaders.load_nation_cells(nation_path)
+        profiling.note(rows=len(cells), demands=len(demand_fns), nation_rows=len(nation_df))
+    for column, demand_fn in enumerate(demand_fns):
+        stats_index.record('heatmap', f"{pair_name}_{demand_fn}", matrix[:, column])
+
+    with profiling.stage('normalize'):
+        nation_df_filtered = nation_df[nation_df['terminals'] > 0]
+        # Demands with an empty data file are left out of the bundle
+        has_values = ~np.isnan(matrix).all(axis=0)
+        matrix = matrix[:, has_values]
+        demand_fns = [demand_fn for demand_fn, keep in zip(demand_fns, has_values) if keep]
+
+    if not demand_fns or nation_df_filtered.empty:
+        return None
+
+    return create_heatmap_bundle_map(
+        nation_df_filtered, cells, matrix, demand_fns, country_display, pair_name, html_path
+    )
+
+
+def _generate_bundle(task):
+    """
+    Worker: renders the multi-demand bundle of one country/terminal pair.
+    """
+    country_display, pair_name, demands, nation_path, from_store = task
+    with profiling.profile_config('heatmap_bundle', pair_name):
+        try:
+            rendered = render_bundle(country_display, pair_name, demands, nation_path, from_store)
+            if rendered is None:
+                return parallel.SKIPPED, pair_name, "one or more data files are empty"
+            return parallel.GENERATED, pair_name, None
+        except Exception as e:
+            return parallel.FAILED, pair_name, str(e)
+
+
+def _describe_bundle_task(task):
+    """
+    Returns (pair_name, input_paths, output_path) of a bundle task for the build manifest.
+    """
+    _, pair_name, demands, nation_path, _ = task
+    input_paths = [path for _, path in demands] + [nation_path, COLOR_SCALE_PATH, DEMAND_SWITCH_TEMPLATE_PATH]
+    return pair_name, input_paths, bundle_output_path(pair_name)
+
+
+def generate_all_visualizations(jobs=1, incremental=False, from_store=False, pyramid_stat=None, bundle=False,
+                                tiled=False, registry=None):
+    """
+    Generates a map for every heatmap config found in the data.
+
+    Args:
+        jobs (int): Number of worker processes used to render configurations.
+        incremental (bool): Only rebuild maps whose inputs changed since the last run.
+        from_store (bool): Load cell data from the columnar cell store instead of text files.
+        pyramid_stat (str): 'min' or 'mean' to add coarser H3 parent levels shown by zoom.
+        bundle (bool): Render one multi-demand map per country/terminal pair into BUNDLE_DIR
+                       instead of one map per demand.
+        tiled (bool): Write each config as spatial tiles for the shared viewer page in TILE_DIR,
+                      so the browser only loads the cells on screen.
+        registry (configs.Registry): Configs already scanned by the build driver;
+                                     the data directory is scanned when omitted.
     """
     print("Starting pre-generation of all Capacity Degradation Heatmaps...")
-        
-    # Maps country display name to its filename part
-    countries_map = {
-        'South Africa': 'southafrica', 'Ghana': 'ghana', 'Tonga': 'tonga',
-        'Lithuania': 'lithuania', 'Britain': 'britain', 'Haiti': 'haiti'
-    }
-    
-    # Maps terminal config display name to its filename part
-    TERMINAL_CONFIGS_FN = {
-        '50000 / 100K': '50000_100000',
-        '200000 / 10K': '200000_10000',
-        '10000 / 100K': '10000_100000',
-        '100000 / 10K': '100000_10000',
-        '5000 / 100K': '5000_100000',
-        '1000 / 100K': '1000_100000',
-        '10000 / 10K': '10000_10000',
-        '20000 / 100K': '20000_100000',
-        '500 / 10K': '500_10000',
-        '1000 / 1K': '1000_1000'
-    }
-    
-    # Defines the valid pairs of Country -> [Terminal Configs]
-    COUNTRY_TERMINAL_PAIRS = {
-        'Britain': ['50000 / 100K', '200000 / 10K'],
-        'Ghana': ['10000 / 100K', '100000 / 10K'],
-        'Haiti': ['5000 / 100K', '100000 / 10K'],
-        'Lithuania': ['1000 / 100K', '10000 / 10K'],
-        'South Africa': ['20000 / 100K', '200000 / 10K'],
-        'Tonga': ['500 / 10K', '1000 / 1K']
-    }
-    
-    # Maps demand display name to its filename part
-    demand_map = {
-        '8400 Mbps': '0.7', 
-        '9600 Mbps': '0.8', 
-        '10800 Mbps': '0.9', 
-        '12000 Mbps': '1.0'
-    }
-    # === END UPDATED CONFIGURATIONS ===
-
-    generated_count = 0
-    skipped_count = 0
-
-    # === UPDATED LOOPING LOGIC ===
-    # Loop through the valid pairs defined in COUNTRY_TERMINAL_PAIRS
-    for country_display, terminal_display_list in COUNTRY_TERMINAL_PAIRS.items():
-        print(f"\nProcessing Country: {country_display}")
-        
-        # Get the country filename part from countries_map
-        country_fn = countries_map.get(country_display)
-        if not country_fn:
-            print(f"  - SKIPPED (Country '{country_display}' not found in countries_map)")
+    profiling.start_run()
+
+    if registry is None:
+        # One listing of the data directory (or the store) rather than a probe per possible config
+        registry = configs.scan(heatmap_dir=DATA_DIR, from_store=from_store)
+        configs.print_ignored(registry)
+
+    def input_path(filename, country_fn):
+        if from_store:
+            return cell_store.column_path('heatmap', country_fn, cell_store.config_of(filename))
+        return os.path.join(DATA_DIR, filename)
+
+    tasks = []
+    config_names = []
+    missing_count = 0
+    bundles = {}
+    for config in registry.heatmap:
+        nation_filename = configs.nation_filename(config)
+        if nation_filename not in registry.nation_files:
+            print(f"    - MISSING (Nation cells file not found for config): {config.name}")
+            missing_count += 1
             continue
 
-        # Iterate over the valid terminal configs for this country
-        for terminal_display in terminal_display_list:
-            # Get the terminal config filename part from TERMINAL_CONFIGS_FN
-            term_cap_fn = TERMINAL_CONFIGS_FN.get(terminal_display)
-            if not term_cap_fn:
-                print(f"  - SKIPPED (Terminal config '{terminal_display}' not found in TERMINAL_CONFIGS_FN)")
-                continue
-            
-            print(f"  - Processing config: {terminal_display}")
-
-            # Loop through all demand levels for this valid pair
-            for demand_fn in demand_map.values():
-                
-                # Construct expected filenames
-                config_name = f"{country_fn}_{term_cap_fn}_{demand_fn}"
-                heatmap_data_filename = f"{config_name}_cell_values.txt"
-                nation_data_filename = f"cells_{country_fn}_{term_cap_fn}.txt"
-                
-                heatmap_path = os.path.join('static', 'cell_heatmap_data', heatmap_data_filename)
-                nation_path = os.path.join('static', 'cell_heatmap_data', nation_data_filename)
-
-                if os.path.exists(heatmap_path) and os.path.exists(nation_path):
-                    print(f"    - Generating for: {config_name}...")
-                    try:
-                        # Read heatmap data (non-nation cells)
-                        heatmap_df = pd.read_csv(heatmap_path, header=None, names=['hex', 'value'])
-
-                        # Create a new column with the truncated value
-                        heatmap_df['truncated_value'] = np.floor(heatmap_df['value'] * 1000) / 1000
-                        
-                        # Read nation cell data and filter for those with > 0 terminals
-                        nation_df = pd.read_csv(nation_path, header=None, names=['hex', 'terminals'])
-                        nation_df_filtered = nation_df[nation_df['terminals'] > 0]
-
-                        if not heatmap_df.empty and not nation_df_filtered.empty:
-                            
-                            min_val = heatmap_df['value'].min()
-                            scale_min = np.floor(min_val * 10) / 10
-                            
-                            create_heatmap_map(nation_df_filtered, heatmap_df, country_display, config_name, scale_min)
-                            generated_count += 1
-                        else:
-                            print(f"    - SKIPPED (one or more data files are empty): {config_name}")
-                            skipped_count += 1
-                    except Exception as e:
-                        print(f"    - FAILED to process {config_name}: {e}")
-                        skipped_count += 1
-                else:
-                    print(f"    - SKIPPED (Data files not found for config): {config_name}")
-                    skipped_count += 1
-    
-    print("\n--------------------------------------------------")
-    print("                Generation Complete                ")
-    print(f"    Total HTML files generated: {generated_count}")
-    print(f"    Total configurations skipped: {skipped_count}")
-    print("--------------------------------------------------")
+        country_display = configs.COUNTRIES[config.country]
+        heatmap_path = input_path(config.filename, config.country)
+        nation_path = input_path(nation_filename, config.country)
+        config_names.append(config.name)
+        if bundle:
+            # One bundled map per pair, sharing the nation file of its demands
+            pair_name = configs.pair_name(config)
+            if pair_name not in bundles:
+                bundles[pair_name] = (country_display, pair_name, [], nation_path, from_store)
+                tasks.append(bundles[pair_name])
+            bundles[pair_name][2].append((config.demand, heatmap_path))
+        else:
+            tasks.append((country_display, config.name, heatmap_path, nation_path, from_store, pyramid_stat, tiled))
+
+    stats_index.prune('heatmap', config_names)
+
+    if tiled:
+        viewer_path = viewer.write_viewer_page(TILED_VIEWER_TEMPLATE_PATH, COLOR_SCALE_PATH, TILE_DIR)
+        print(f"Wrote shared tiled viewer page: {viewer_path}")
+        prune_tile_dirs(config_names)
+
+    kind = 'bundles' if bundle else 'configurations'
+    print(f"Found {len(tasks)} {kind} with data ({missing_count} configurations without), "
+          f"using {parallel.resolve_jobs(jobs)} worker(s).")
+
+    worker = _generate_bundle if bundle else _generate_config
+    if incremental:
+        if bundle:
+            counts, failures = manifest.run_incremental(
+                worker, tasks, jobs, BUNDLE_DIR, _describe_bundle_task, GENERATOR_VERSION
+            )
+        elif tiled:
+            counts, failures = manifest.run_incremental(
+                worker, tasks, jobs, viewer.payload_dir(TILE_DIR), _describe_task, GENERATOR_VERSION
+            )
+        else:
+            # Toggling the pyramid changes every output, like a generator change
+            generator_version = f"{GENERATOR_VERSION}+pyramid-{pyramid_stat}" if pyramid_stat else GENERATOR_VERSION
+            counts, failures = manifest.run_incremental(
+                worker, tasks, jobs, VIZ_DIR, _describe_task, generator_version
+            )
+    else:
+        counts, failures = parallel.tally_results(parallel.run_tasks(worker, tasks, jobs))
+    counts[parallel.MISSING] += missing_count
+    parallel.print_summary(counts, failures)
+    viewer.record_output_mode('heatmap', 'bundle' if bundle else 'tiled' if tiled else 'html')
+    profiling.print_summary()
 
 if __name__ == "__main__":
-    generate_all_visualizations()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pre-generate capacity degradation heatmaps.")
+    parallel.add_jobs_argument(parser)
+    manifest.add_incremental_argument(parser)
+    cell_store.add_store_argument(parser)
+    pyramid.add_pyramid_argument(parser, stats=['min', 'mean'])
+    parser.add_argument(
+        '--bundle', action='store_true',
+        help="Render one map per country/terminal pair with a client-side demand switch"
+    )
+    parser.add_argument(
+        '--tiled', action='store_true',
+        help=f"Write spatial tiles and a shared viewer page into '{TILE_DIR}' instead of one page per config"
+    )
+    streaming.add_chunk_argument(parser)
+    h3_geometry.add_geometry_argument(parser)
+    assets.add_assets_argument(parser)
+    precompress.add_precompress_argument(parser)
+    profiling.add_profile_argument(parser)
+    stats_index.add_stats_argument(parser)
+    args = parser.parse_args()
+    if args.bundle and args.pyramid:
+        parser.error("--bundle cannot be combined with --pyramid")
+    if args.tiled and (args.bundle or args.pyramid):
+        parser.error("--tiled cannot be combined with --bundle or --pyramid")
+    if args.chunk_rows is not None and (args.from_store or args.pyramid or args.bundle or args.tiled):
+        parser.error("--chunk-rows cannot be combined with --from-store, --pyramid, --bundle or --tiled")
+    if args.h3_geometry and not args.tiled:
+        parser.error("--h3-geometry needs --tiled")
+    streaming.configure_from_args(args)
+    h3_geometry.configure_from_args(args)
+    assets.configure_from_args(args)
+    precompress.configure_from_args(args)
+    profiling.configure_from_args(args)
+    stats_index.configure_from_args(args)
+    generate_all_visualizations(
+        jobs=args.jobs, incremental=args.incremental, from_store=args.from_store,
+        pyramid_stat=args.pyramid_stat if args.pyramid else None, bundle=args.bundle, tiled=args.tiled
+    )
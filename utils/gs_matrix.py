@@ -0,0 +1,159 @@
+import argparse
+import functools
+import hashlib
+import os
+
+import numpy as np
+
+from utils import configs, loaders
+
+# The simulator numbers ground stations after its satellites, so utilization
+# files use station ids shifted by this offset relative to the station table
+GS_ID_OFFSET = 6364
+
+GS_LOCATIONS_PATH = os.path.join('static', 'ground_stations_starlink.csv')
+DATA_DIR = os.path.join('static', 'gs_utilizations_data')
+MATRIX_PATH = os.path.join('static', 'cell_store', 'gs_utilizations.npz')
+
+
+def load_station_table(path=GS_LOCATIONS_PATH):
+    """
+    Loads the ground station table once, with an id-indexed row lookup.
+
+    Returns:
+        tuple: (stations DataFrame in file order, lookup array mapping a
+               station id to its row, -1 for unknown ids)
+    """
+    stations = loaders.load_ground_stations(path)
+    lookup = np.full(stations['id'].max() + 1, -1, dtype=np.intp)
+    lookup[stations['id'].to_numpy()] = np.arange(len(stations))
+    return stations, lookup
+
+
+def station_rows(lookup, raw_ids):
+    """
+    Maps raw simulator station ids to station table rows (-1 where unknown).
+    """
+    ids = np.asarray(raw_ids, dtype=np.int64) - GS_ID_OFFSET
+    rows = np.full(len(ids), -1, dtype=np.intp)
+    valid = (ids >= 0) & (ids < len(lookup))
+    rows[valid] = lookup[ids[valid]]
+    return rows
+
+
+def read_utilization_vector(path, lookup, station_count):
+    """
+    Reads a headerless 'gs_id,utilization' file into a vector aligned to the station table.
+
+    Stations missing from the file (or unknown ids in it) are NaN.
+    """
+    util_df = loaders.load_utilization(path)
+    rows = station_rows(lookup, util_df['id'].to_numpy())
+    known = rows >= 0
+    vector = np.full(station_count, np.nan)
+    vector[rows[known]] = util_df['utilization'].to_numpy(dtype=np.float64)[known]
+    return vector
+
+
+def stations_with_utilization(stations, vector):
+    """
+    Returns the station rows that have a utilization value, with a 'utilization' column.
+
+    This replaces a pd.merge on 'id': the vector is already aligned to the
+    station table, so the join is a single boolean take.
+    """
+    present = ~np.isnan(vector)
+    merged_df = stations[present].reset_index(drop=True)
+    merged_df['utilization'] = vector[present]
+    return merged_df
+
+
+def build_matrix(data_dir=DATA_DIR, station_table_path=GS_LOCATIONS_PATH, filenames=None):
+    """
+    Ingests utilization files into one dense configs x stations matrix.
+
+    Args:
+        filenames (list): Data file names to ingest; defaults to every GS
+                          config of the registry (see configs.scan).
+
+    Returns:
+        tuple: (sorted config names, station ids, float64 matrix with NaN
+               where a config has no value for a station)
+    """
+    stations, lookup = load_station_table(station_table_path)
+    if filenames is None:
+        filenames = [config.filename for config in configs.scan(gs_dir=data_dir).gs]
+    filenames = sorted(filenames)
+
+    matrix = np.full((len(filenames), len(stations)), np.nan, dtype=np.float64)
+    for row, filename in enumerate(filenames):
+        matrix[row] = read_utilization_vector(os.path.join(data_dir, filename), lookup, len(stations))
+
+    return filenames, stations['id'].to_numpy(), matrix
+
+
+def save_matrix(path, config_names, station_ids, matrix):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, configs=np.asarray(config_names), station_ids=station_ids, utilization=matrix)
+
+
+@functools.lru_cache(maxsize=2)
+def load_matrix(path=MATRIX_PATH):
+    """
+    Loads the utilization matrix (cached per process).
+
+    Returns:
+        tuple: ({config name: row}, station ids, float64 matrix)
+    """
+    with np.load(path) as data:
+        config_rows = {name: row for row, name in enumerate(data['configs'].tolist())}
+        return config_rows, data['station_ids'], data['utilization']
+
+
+def matrix_vector(config_name, station_count, path=MATRIX_PATH):
+    """
+    Returns the utilization vector of a config from the matrix, aligned to the station table.
+    """
+    config_rows, station_ids, matrix = load_matrix(path)
+    if len(station_ids) != station_count:
+        raise ValueError(f"Station table has {station_count} stations but '{path}' has {len(station_ids)}; rebuild it")
+    return matrix[config_rows[config_name]].copy()
+
+
+def row_digest(config_name, path=MATRIX_PATH):
+    """
+    Returns a build manifest input for one config's row of the matrix (see manifest.inputs_hash).
+
+    Hashing the row rather than the whole file means rebuilding the matrix
+    only invalidates the configs whose utilizations changed.
+
+    Returns:
+        tuple: (input name, SHA-256 hex digest of the station ids and the row)
+    """
+    config_rows, station_ids, matrix = load_matrix(path)
+    digest = hashlib.sha256(np.ascontiguousarray(station_ids).tobytes())
+    digest.update(np.ascontiguousarray(matrix[config_rows[config_name]]).tobytes())
+    return f"{os.path.basename(path)}[{config_name}]", digest.hexdigest()
+
+
+def add_matrix_argument(parser):
+    """
+    Adds the shared --from-matrix option to the GS generator's argument parser.
+    """
+    parser.add_argument(
+        '--from-matrix', action='store_true',
+        help=f"Read utilizations from the matrix at '{MATRIX_PATH}' (build it with 'python -m utils.gs_matrix')"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest all GS utilization files into one configs x stations matrix.")
+    parser.parse_args()
+    if not os.path.isdir(DATA_DIR):
+        print(f"ERROR: Data directory not found at '{DATA_DIR}'")
+    else:
+        registry = configs.scan(gs_dir=DATA_DIR)
+        configs.print_ignored(registry)
+        config_names, station_ids, matrix = build_matrix(filenames=[config.filename for config in registry.gs])
+        save_matrix(MATRIX_PATH, config_names, station_ids, matrix)
+        print(f"Wrote {len(config_names)} configs x {len(station_ids)} stations to '{MATRIX_PATH}'")
@@ -0,0 +1,295 @@
+import argparse
+import contextlib
+import os
+
+import numpy as np
+
+from utils import cell_store, loaders, precompress
+
+try:
+    import h3
+except ImportError:  # Optional: only needed for precomputed geometry
+    h3 = None
+
+try:
+    import fcntl
+except ImportError:  # No POSIX file locks (Windows): concurrent merges may drop each other's cells
+    fcntl = None
+
+# Setting GEOMETRY_ENV makes the viewer payloads carry each cell's hexagon as
+# packed vertices instead of its H3 index, so the browser draws plain polygons
+# without any H3 math. Like profiling, the variable is what reaches the workers.
+GEOMETRY_ENV = 'COSMOSIM_H3_GEOMETRY'
+
+# Layout of the cache (one file per country, shared by all its configs and map types):
+#   static/h3_geometry/<country>.npy  structured array sorted by cell: uint64 'cell',
+#                                     uint8 'count' (vertices) and float32 'ring' (lng/lat, closed)
+# Workers read the file whole (it is replaced while they run, so it is never memory-mapped)
+# and only compute the cells they miss; merges into it are serialized by '<country>.lock'.
+CACHE_DIR = os.path.join('static', 'h3_geometry')
+
+# H3 boundaries have up to 10 vertices (cells crossing icosahedron edges); one more slot closes the ring
+MAX_VERTICES = 10
+RING_SLOTS = MAX_VERTICES + 1
+CACHE_DTYPE = np.dtype([('cell', np.uint64), ('count', np.uint8), ('ring', np.float32, (RING_SLOTS, 2))])
+
+# Suffix of the binary geometry written next to a payload ('<payload>.bin')
+GEOMETRY_SUFFIX = '.bin'
+
+
+def enabled():
+    """
+    True if the viewer payloads should carry precomputed geometry (see GEOMETRY_ENV).
+    """
+    return bool(os.environ.get(GEOMETRY_ENV))
+
+
+def cache_path(country):
+    return os.path.join(CACHE_DIR, f"{country}.npy")
+
+
+def _lock_path(country):
+    return os.path.join(CACHE_DIR, f"{country}.lock")
+
+
+@contextlib.contextmanager
+def _locked(country):
+    """
+    Holds the country's cache lock, so one worker at a time merges its cells into the file.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(_lock_path(country), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def compute_rings(cells):
+    """
+    Computes the closed lng/lat boundary rings of H3 cells.
+
+    Only the boundary itself is an h3 call per cell; axis order, antimeridian
+    unwrapping, ring closing and winding are fixed for all cells at once.
+    Rings crossing the antimeridian get longitudes beyond 180 (like deck.gl's
+    H3HexagonLayer), and every ring is counter-clockwise, as deck.gl's
+    polygon layers expect of unnormalized data.
+
+    Args:
+        cells (np.ndarray): uint64 H3 indexes.
+
+    Returns:
+        np.ndarray: CACHE_DTYPE records of the cells, in the given order.
+    """
+    records = np.zeros(len(cells), dtype=CACHE_DTYPE)
+    records['cell'] = cells
+    rings = np.zeros((len(cells), RING_SLOTS, 2))
+    counts = np.zeros(len(cells), dtype=np.intp)
+    for row, cell in enumerate(loaders.uint64_to_hex(cells)):
+        boundary = h3.cell_to_boundary(cell)
+        counts[row] = len(boundary)
+        rings[row, :len(boundary)] = boundary
+    # (lat, lng) -> (lng, lat)
+    rings = rings[:, :, ::-1]
+    slots = np.arange(RING_SLOTS)
+    vertices = slots < counts[:, None]
+
+    lng = rings[:, :, 0]
+    span = np.where(vertices, lng, -np.inf).max(axis=1) - np.where(vertices, lng, np.inf).min(axis=1)
+    lng[(span > 180)[:, None] & vertices & (lng < 0)] += 360
+
+    # Shoelace sign of each ring (relative to its first vertex, for precision on small cells):
+    # reverse the clockwise ones
+    relative = rings - rings[:, :1]
+    following = np.where(slots + 1 < counts[:, None], slots + 1, 0)
+    following_rings = np.take_along_axis(relative, following[:, :, None], axis=1)
+    area = np.where(
+        vertices, relative[:, :, 0] * following_rings[:, :, 1] - following_rings[:, :, 0] * relative[:, :, 1], 0
+    ).sum(axis=1)
+    order = np.where((area < 0)[:, None] & vertices, counts[:, None] - 1 - slots, slots)
+    rings = np.take_along_axis(rings, order[:, :, None], axis=1)
+
+    rings[np.arange(len(cells)), counts] = rings[:, 0]
+    records['count'] = counts
+    records['ring'] = rings
+    return records
+
+
+def load_cache(country):
+    """
+    Returns the cached records of a country (empty if nothing is cached yet).
+
+    The file is read in one go: a memory map reopens it by name, which races
+    with other workers replacing it.
+    """
+    try:
+        return np.load(cache_path(country))
+    except FileNotFoundError:
+        return np.zeros(0, dtype=CACHE_DTYPE)
+
+
+def _missing(cache, cells):
+    """
+    Returns the sorted unique `cells` that are not in the cache.
+    """
+    if len(cache) == 0:
+        return cells
+    positions = np.searchsorted(cache['cell'], cells).clip(max=len(cache) - 1)
+    return cells[cache['cell'][positions] != cells]
+
+
+def cached_rings(country, cells):
+    """
+    Returns the records of `cells` from the country's cache, computing and caching the missing ones.
+
+    Args:
+        country (str): Country filename part (e.g. 'southafrica').
+        cells (np.ndarray): uint64 H3 indexes.
+
+    Returns:
+        np.ndarray: CACHE_DTYPE records aligned to `cells`.
+    """
+    unique = np.unique(np.asarray(cells, dtype=np.uint64))
+    cache = load_cache(country)
+    missing = _missing(cache, unique)
+    if len(missing):
+        computed = compute_rings(missing)
+        with _locked(country):
+            # Merge into the file as it is now, since other workers may have added cells meanwhile
+            cache = load_cache(country)
+            new = computed[np.isin(computed['cell'], cache['cell'], invert=True)]
+            merged = np.concatenate([cache, new])
+            merged = merged[np.argsort(merged['cell'], kind='stable')]
+            tmp_path = f"{cache_path(country)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, merged)
+            os.replace(tmp_path, cache_path(country))
+        cache = merged
+    return cache[np.searchsorted(cache['cell'], cells)]
+
+
+def polygons(country, cells):
+    """
+    Packs the hexagons of cells into deck.gl binary polygon data.
+
+    Returns:
+        tuple: (uint32 start index of each polygon, float32 (vertices, 2) lng/lat positions)
+    """
+    records = cached_rings(country, cells)
+    ring_sizes = records['count'].astype(np.intp) + 1
+    start_indices = np.zeros(len(records), dtype=np.uint32)
+    np.cumsum(ring_sizes[:-1], out=start_indices[1:])
+    positions = records['ring'][np.arange(RING_SLOTS) < ring_sizes[:, None]]
+    return start_indices, positions
+
+
+def geometry_path(payload_path):
+    return f"{os.path.splitext(payload_path)[0]}{GEOMETRY_SUFFIX}"
+
+
+def write_geometry(payload_path, country, cells):
+    """
+    Writes the binary geometry of a payload's cells next to it.
+
+    The file holds the uint32 start indices, then the float32 lng/lat
+    positions, both little-endian, so the viewer wraps them in typed arrays
+    without parsing.
+
+    Returns:
+        dict: The payload's 'geometry' field (file name and array lengths).
+    """
+    start_indices, positions = polygons(country, cells)
+    path = geometry_path(payload_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(start_indices.astype('<u4').tobytes())
+        f.write(positions.astype('<f4').tobytes())
+    os.replace(tmp_path, path)
+    precompress.write_siblings(path)
+    return {'file': os.path.basename(path), 'cells': len(start_indices), 'vertices': len(positions)}
+
+
+def remove_geometry(payload_path):
+    """
+    Deletes the binary geometry of a payload (and its compressed siblings), if any.
+    """
+    path = geometry_path(payload_path)
+    if os.path.exists(path):
+        os.remove(path)
+    precompress.remove_siblings(path)
+
+
+def cell_columns(hexes, country, payload_path):
+    """
+    Returns the payload field locating a payload's cells: 'geometry' when on, the 'hex' column otherwise.
+
+    Args:
+        hexes: H3 hex strings of the payload rows.
+        country (str): Country filename part, naming the geometry cache.
+        payload_path (str): Path the payload is written to.
+    """
+    hexes = np.asarray(hexes)
+    if not enabled():
+        # Drop geometry left from an earlier build so it never goes stale
+        remove_geometry(payload_path)
+        return {'hex': hexes.tolist()}
+    return {'geometry': write_geometry(payload_path, country, loaders.hex_to_uint64(hexes))}
+
+
+def country_of(name):
+    """
+    Returns the country of a data file or config name ('britain_0_1000_...' -> 'britain').
+    """
+    return cell_store.group_of(name)
+
+
+def versioned(generator_version):
+    """
+    Extends a generator version with the geometry setting, so incremental
+    builds redo payloads when precomputed geometry is toggled.
+    """
+    if not enabled():
+        return generator_version
+    return f"{generator_version}+h3-geometry"
+
+
+def add_geometry_argument(parser):
+    """
+    Adds the shared --h3-geometry option to a generator's argument parser.
+    """
+    parser.add_argument(
+        '--h3-geometry', action='store_true',
+        help="Ship precomputed hexagon vertices as binary polygon data with the viewer payloads, "
+             f"cached per country under '{CACHE_DIR}' (needs the 'h3' package)"
+    )
+
+
+def configure_from_args(args):
+    """
+    Turns precomputed geometry on for this process and its workers if --h3-geometry is given.
+    """
+    if args.h3_geometry:
+        if h3 is None:
+            raise SystemExit("ERROR: --h3-geometry needs the 'h3' package (pip install h3)")
+        os.environ[GEOMETRY_ENV] = '1'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the hexagon geometry cache of the cell store.")
+    parser.add_argument('--kind', choices=sorted(cell_store.SOURCE_DIRS), action='append',
+                        help="Cell store kind whose cells are cached, may be repeated (default: all)")
+    args = parser.parse_args()
+    if h3 is None:
+        raise SystemExit("ERROR: Precomputing geometry needs the 'h3' package (pip install h3)")
+    for kind in args.kind or sorted(cell_store.SOURCE_DIRS):
+        kind_dir = os.path.join(cell_store.STORE_DIR, kind)
+        if not os.path.isdir(kind_dir):
+            continue
+        for country in sorted(os.listdir(kind_dir)):
+            cells = np.load(os.path.join(kind_dir, country, cell_store.CELLS_FILENAME), mmap_mode='r')
+            cached_rings(country, cells)
+            print(f"  - {kind}/{country}: {len(cells)} cells cached in '{cache_path(country)}'")
@@ -0,0 +1,173 @@
+import functools
+import json
+import os
+import re
+
+try:
+    # pydeck internals behind Deck.to_html(), used to stream its page template (pydeck is pinned in
+    # requirements.txt); other versions fall back to the public API (see deck_page_chunks())
+    from pydeck.io.html import CDN_CSS_URL, cdn_picker, convert_js_bool, j2_env
+    from pydeck.settings import settings as pydeck_settings
+except ImportError:
+    j2_env = None
+
+from utils import assets, precompress
+
+# Injected fragments (legends, overlays, scripts) are written just before this tag
+BODY_END = '</body>'
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_template(path, mtime_ns, placeholders):
+    """
+    Reads a template and splits it on its placeholders (cached per file version).
+    """
+    with open(path, 'r') as f:
+        text = f.read()
+    if not placeholders:
+        return (text,)
+    pattern = '(' + '|'.join(re.escape(placeholder) for placeholder in placeholders) + ')'
+    return tuple(re.split(pattern, text))
+
+
+def template_parts(path, placeholders=()):
+    """
+    Returns a template split on its placeholders, read from disk once per process.
+
+    The cache is keyed on the file's mtime, so a long-running process (watch
+    mode, the map server) still picks up edited templates.
+
+    Args:
+        path (str): Template path.
+        placeholders (tuple): Strings to substitute, e.g. ('__DEMANDS__',).
+
+    Returns:
+        tuple: Literal text at even positions and placeholders at odd
+               positions, or None if the template does not exist.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _parse_template(path, mtime_ns, tuple(placeholders))
+
+
+def render_template(path, values=None):
+    """
+    Fills a cached template's placeholders.
+
+    Args:
+        path (str): Template path.
+        values (dict): {placeholder: replacement}; replacements are converted with str().
+
+    Returns:
+        str: The rendered fragment, or None if the template does not exist.
+    """
+    values = values or {}
+    parts = template_parts(path, tuple(sorted(values)))
+    if parts is None:
+        return None
+    return ''.join(part if position % 2 == 0 else str(values[part]) for position, part in enumerate(parts))
+
+
+def _page_template_chunks(deck):
+    """
+    Renders pydeck's page template with the arguments Deck.to_html() passes it, chunk by chunk.
+
+    Returns None if this pydeck does not have the internals this relies on.
+    """
+    if j2_env is None or not all(hasattr(deck, name) for name in ('_tooltip', '_show_error')):
+        return None
+    css_text = j2_env.get_template('style.j2').render(css_background_color=None)
+    return j2_env.get_template('index.j2').generate(
+        mapbox_key=deck.mapbox_key,
+        google_maps_key=deck.google_maps_key,
+        json_input=deck.to_json(),
+        deckgl_jupyter_widget_bundle=cdn_picker(offline=False),
+        deckgl_widget_css_url=CDN_CSS_URL,
+        tooltip=convert_js_bool(deck._tooltip),
+        css_text=css_text,
+        custom_libraries=pydeck_settings.custom_libraries,
+        configuration=pydeck_settings.configuration,
+        show_error=deck._show_error,
+    )
+
+
+def deck_page_chunks(deck, html_path):
+    """
+    Yields the page pydeck's Deck.to_html() would build, chunk by chunk.
+
+    Only the template chrome around the deck is streamed: the deck itself is
+    serialized by pydeck as one JSON string (rows too large to hold go through
+    expand_streams()). On a pydeck without the template internals used here,
+    the page comes from Deck.to_html() as a single chunk.
+    With local assets on, the page's CDN URLs point at the vendored copies
+    relative to `html_path` (see utils.assets).
+    """
+    chunks = _page_template_chunks(deck)
+    if chunks is None:
+        chunks = [deck.to_html(as_string=True, notebook_display=False)]
+    return assets.rewrite_head(chunks, assets.local_urls(os.path.dirname(html_path)))
+
+
+def expand_streams(chunks, streams):
+    """
+    Replaces the quoted placeholders of page chunks with the text they stand for, piece by piece.
+
+    Layer data too large to hold is passed to pydeck as a placeholder string
+    (see streaming.stream_placeholder()), so the serialized deck stays small
+    and the rows go straight from their chunks to the page.
+
+    Args:
+        chunks: Iterable of page text chunks.
+        streams (dict): {placeholder: iterable of JSON text pieces}.
+    """
+    if not streams:
+        yield from chunks
+        return
+    pattern = re.compile('|'.join(re.escape(json.dumps(placeholder)) for placeholder in streams))
+    for chunk in chunks:
+        position = 0
+        for match in pattern.finditer(chunk):
+            yield chunk[position:match.start()]
+            yield from streams[json.loads(match.group(0))]
+            position = match.end()
+        yield chunk[position:]
+
+
+def write_chunks(chunks, html_path, fragments=()):
+    """
+    Streams page chunks to a file, writing `fragments` just before the first </body>.
+
+    The page is written next to `html_path` and moved over it, so an output
+    shared with other configs (see utils.content_store) is replaced, never
+    rewritten in place.
+
+    Args:
+        chunks: Iterable of page text chunks.
+        html_path (str): Output path.
+        fragments: HTML fragments injected in order; None entries are skipped.
+
+    Returns:
+        str: html_path.
+    """
+    fragments = [fragment for fragment in fragments if fragment]
+    tmp_path = f"{html_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        for chunk in chunks:
+            if fragments and BODY_END in chunk:
+                head, tail = chunk.split(BODY_END, 1)
+                f.write(head)
+                f.writelines(fragments)
+                fragments = None
+                f.write(BODY_END)
+                f.write(tail)
+            else:
+                f.write(chunk)
+        if fragments:
+            # No </body> in the page: keep the fragments rather than dropping them
+            f.writelines(fragments)
+    os.replace(tmp_path, html_path)
+    precompress.write_siblings(html_path)
+    return html_path
+
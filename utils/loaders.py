@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+# pyarrow's multithreaded CSV reader is much faster on the 1M-terminal configs;
+# the pandas C engine is the fallback when it is not installed
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+_HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+_NIBBLE_SHIFTS = np.arange(60, -4, -4, dtype=np.uint64)
+
+
+def hex_to_uint64(hex_strings):
+    """
+    Converts H3 hex strings to uint64 indexes in one vectorized pass.
+    """
+    padded = np.char.zfill(np.char.lower(np.asarray(hex_strings, dtype='S16')), 16)
+    digits = np.frombuffer(padded.tobytes(), dtype=np.uint8).reshape(-1, 16)
+    nibbles = np.where(digits >= ord('a'), digits - (ord('a') - 10), digits - ord('0')).astype(np.uint64)
+    return np.bitwise_or.reduce(nibbles << _NIBBLE_SHIFTS, axis=1)
+
+
+def uint64_to_hex(indexes):
+    """
+    Converts uint64 H3 indexes back to the lowercase hex strings deck.gl expects.
+    """
+    indexes = np.asarray(indexes, dtype=np.uint64)
+    nibbles = (indexes[:, None] >> _NIBBLE_SHIFTS) & np.uint64(0xF)
+    digits = _HEX_DIGITS[nibbles.astype(np.intp)]
+    hex_strings = np.char.lstrip(digits.view('S16').ravel(), b'0')
+    return np.char.decode(hex_strings, 'ascii')
+
+
+def align_columns(cell_columns, value_columns):
+    """
+    Aligns several (cells, values) columns on the sorted union of their uint64 cells.
+
+    The union is a sorted merge over integer keys (np.unique, then
+    searchsorted to place each column), so no string join is involved.
+
+    Args:
+        cell_columns (list): uint64 cell indexes of each column.
+        value_columns (list): Values aligned to the cells of each column.
+
+    Returns:
+        tuple: (sorted uint64 cells, float64 cells x columns matrix, NaN where
+               a column has no value for a cell)
+    """
+    if not cell_columns:
+        return np.empty(0, dtype=np.uint64), np.empty((0, 0))
+    cells = np.unique(np.concatenate([np.asarray(column, dtype=np.uint64) for column in cell_columns]))
+    matrix = np.full((len(cells), len(value_columns)), np.nan)
+    for position, (column_cells, values) in enumerate(zip(cell_columns, value_columns)):
+        matrix[np.searchsorted(cells, np.asarray(column_cells, dtype=np.uint64)), position] = values
+    return cells, matrix
+
+
+def _read_two_columns(path, names, key_dtype, value_dtype):
+    """
+    Reads a headerless two-column CSV with explicit dtypes.
+
+    Values are parsed as float64 so short lines (missing value) can be
+    dropped, like the original line-by-line parser did, and then cast to
+    `value_dtype`. Lines with too many fields are skipped as well.
+    """
+    df = pd.read_csv(
+        path, header=None, names=names, engine=CSV_ENGINE,
+        dtype={names[0]: key_dtype, names[1]: np.float64}, on_bad_lines='skip',
+    )
+    df = df.dropna()
+    if value_dtype != np.float64:
+        df[names[1]] = df[names[1]].astype(value_dtype)
+    return df.reset_index(drop=True)
+
+
+def _validate(df, path, key):
+    """
+    Cheap shape checks: H3 keys must all be 15 hex characters long.
+    """
+    if len(df) and not (df[key].str.len() == 15).all():
+        raise ValueError(f"'{path}' contains malformed H3 indexes")
+
+
+def read_cell_values(path, value_name='value', value_dtype=np.float64, with_index=False):
+    """
+    Reads a headerless 'hex,value' simulator output.
+
+    Args:
+        path (str): Data file path.
+        value_name (str): Name of the value column.
+        value_dtype: NumPy dtype of the value column.
+        with_index (bool): Also add an 'h3' uint64 column for integer joins.
+                           Keep it out of DataFrames handed to pydeck.
+
+    Returns:
+        pd.DataFrame: Columns 'hex' (str), value_name and optionally 'h3'.
+    """
+    df = _read_two_columns(path, ['hex', value_name], str, value_dtype)
+    _validate(df, path, 'hex')
+    if with_index:
+        df['h3'] = hex_to_uint64(df['hex'].to_numpy())
+    return df
+
+
+def iter_cell_values(path, value_name='value', value_dtype=np.float64, chunk_rows=1_000_000):
+    """
+    Reads a headerless 'hex,value' simulator output in DataFrames of at most `chunk_rows` rows.
+
+    Rows are cleaned and validated like read_cell_values(), so concatenating
+    the chunks gives the same frame. The pandas C engine is used since the
+    pyarrow reader cannot read in chunks.
+
+    Yields:
+        pd.DataFrame: Columns 'hex' (str) and value_name.
+    """
+    names = ['hex', value_name]
+    reader = pd.read_csv(
+        path, header=None, names=names, engine='c', chunksize=chunk_rows,
+        dtype={'hex': str, value_name: np.float64}, on_bad_lines='skip',
+    )
+    with reader:
+        for df in reader:
+            df = df.dropna()
+            if value_dtype != np.float64:
+                df[value_name] = df[value_name].astype(value_dtype)
+            _validate(df, path, 'hex')
+            yield df.reset_index(drop=True)
+
+
+def load_capacity(path, with_index=False):
+    """
+    Reads a '*_cell_capacities.txt' file into 'hex' and 'capacity' (Mb) columns.
+    """
+    return read_cell_values(path, 'capacity', np.float64, with_index)
+
+
+def load_heatmap_values(path, with_index=False):
+    """
+    Reads a '*_cell_values.txt' file into 'hex' and 'value' (available capacity) columns.
+    """
+    return read_cell_values(path, 'value', np.float64, with_index)
+
+
+def load_nation_cells(path, with_index=False):
+    """
+    Reads a 'cells_*.txt' nation file into 'hex' and 'terminals' columns.
+    """
+    return read_cell_values(path, 'terminals', np.int64, with_index)
+
+
+def load_utilization(path):
+    """
+    Reads a '*_gs_utilizations.txt' file into raw 'id' and 'utilization' columns.
+    """
+    return _read_two_columns(path, ['id', 'utilization'], np.int64, np.float64)
+
+
+def load_ground_stations(path):
+    """
+    Reads the ground station table ('id,name,latitude,longitude,extra').
+    """
+    return pd.read_csv(
+        path, header=None, names=['id', 'name', 'latitude', 'longitude', 'extra'], engine=CSV_ENGINE,
+        dtype={'id': np.int64, 'name': str, 'latitude': np.float64, 'longitude': np.float64, 'extra': str},
+    )
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+
+from utils import assets, h3_geometry, parallel, precompress, pyramid
+
+MANIFEST_FILENAME = '.manifest.json'
+
+
+def file_digest(path):
+    """
+    Returns the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def inputs_hash(input_paths, generator_version):
+    """
+    Hashes everything an output depends on: its input files and the generator version.
+
+    Missing inputs (e.g. an optional color scale template) hash as absent, so
+    adding or removing them also invalidates the output. An input may also be
+    a (name, digest) pair for data that is only part of a file (see
+    gs_matrix.row_digest).
+    """
+    digest = hashlib.sha256(f"generator:{generator_version}\n".encode())
+    for path in input_paths:
+        if isinstance(path, tuple):
+            name, file_hash = path
+        else:
+            name, file_hash = os.path.basename(path), file_digest(path) if os.path.exists(path) else 'missing'
+        digest.update(f"{name}:{file_hash}\n".encode())
+    return digest.hexdigest()
+
+
+def build_version(generator_version):
+    """
+    Extends a generator version with the build settings that change every output
+    (local assets, precompression, precomputed geometry).
+    """
+    return h3_geometry.versioned(precompress.versioned(assets.versioned(generator_version)))
+
+
+def load_manifest(viz_dir):
+    """
+    Loads the manifest of a visualization directory ({} if there is none yet).
+    """
+    manifest_path = os.path.join(viz_dir, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"WARNING: Ignoring unreadable manifest at '{manifest_path}'")
+        return {}
+
+
+def save_manifest(viz_dir, manifest):
+    """
+    Atomically writes the manifest of a visualization directory.
+    """
+    os.makedirs(viz_dir, exist_ok=True)
+    manifest_path = os.path.join(viz_dir, MANIFEST_FILENAME)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def is_current(manifest, config_name, digest):
+    """
+    True if the recorded output for `config_name` was built from inputs hashing to `digest`.
+    """
+    entry = manifest.get(config_name)
+    return bool(entry) and entry['hash'] == digest and os.path.exists(entry['output'])
+
+
+def record(manifest, config_name, digest, output_path):
+    """
+    Records that `output_path` was built for `config_name` from inputs hashing to `digest`.
+    """
+    manifest[config_name] = {'hash': digest, 'output': output_path}
+
+
+def prune_stale(manifest, live_config_names):
+    """
+    Removes outputs whose input data has disappeared, along with their manifest entries.
+
+    Returns:
+        list: The output paths that were deleted.
+    """
+    removed = []
+    for config_name in sorted(set(manifest) - set(live_config_names)):
+        output_path = manifest.pop(config_name)['output']
+        if os.path.exists(output_path):
+            os.remove(output_path)
+            removed.append(output_path)
+        precompress.remove_siblings(output_path)
+        h3_geometry.remove_geometry(output_path)
+        pyramid.remove_level_files(output_path)
+    return removed
+
+
+def plan_incremental(manifest, tasks, describe, generator_version):
+    """
+    Splits tasks into the ones whose outputs must be rebuilt and the ones that are current.
+
+    Args:
+        manifest (dict): Manifest loaded with load_manifest().
+        tasks (list): Worker tasks of one generator.
+        describe (callable): Maps a task to (config_name, input_paths, output_path).
+        generator_version (int): Version constant of the generator.
+
+    Returns:
+        tuple: (tasks to rebuild, {config_name: (digest, output_path)} for those
+               tasks, number of up-to-date outputs)
+    """
+    stale_tasks = []
+    pending = {}
+    for task in tasks:
+        config_name, input_paths, output_path = describe(task)
+        digest = inputs_hash(input_paths, generator_version)
+        if is_current(manifest, config_name, digest):
+            continue
+        stale_tasks.append(task)
+        pending[config_name] = (digest, output_path)
+    return stale_tasks, pending, len(tasks) - len(stale_tasks)
+
+
+def record_results(results, manifest, pending):
+    """
+    Passes worker results through, recording every generated output in the manifest.
+    """
+    for result in results:
+        status, config_name, _ = result
+        if status in (parallel.GENERATED, parallel.SHARED) and config_name in pending:
+            digest, output_path = pending[config_name]
+            record(manifest, config_name, digest, output_path)
+        yield result
+
+
+def run_incremental(worker, tasks, jobs, viz_dir, describe, generator_version):
+    """
+    Runs a generator's tasks, rebuilding only outputs whose inputs changed.
+
+    Outputs whose data disappeared since the last run are removed first, and
+    the manifest is saved after the run so interrupted builds resume cleanly.
+
+    Returns:
+        tuple: ({status: count}, [(config_name, message), ...] for failures)
+    """
+    manifest = load_manifest(viz_dir)
+    generator_version = build_version(generator_version)
+    for output_path in prune_stale(manifest, [describe(task)[0] for task in tasks]):
+        print(f"    - Removed stale output: {output_path}")
+
+    stale_tasks, pending, unchanged_count = plan_incremental(manifest, tasks, describe, generator_version)
+    print(f"{unchanged_count} outputs up to date, {len(stale_tasks)} to rebuild.")
+    try:
+        results = record_results(parallel.run_tasks(worker, stale_tasks, jobs), manifest, pending)
+        counts, failures = parallel.tally_results(results)
+    finally:
+        save_manifest(viz_dir, manifest)
+    counts[parallel.UNCHANGED] += unchanged_count
+    return counts, failures
+
+
+def add_incremental_argument(parser):
+    """
+    Adds the shared --incremental option to a generator's argument parser.
+    """
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="Skip outputs whose inputs are unchanged and remove outputs whose data disappeared"
+    )
@@ -0,0 +1,367 @@
+import argparse
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import http.server
+import os
+import threading
+import urllib.parse
+
+import numpy as np
+
+from utils import (
+    assets, configs, generate_capacity_maps, generate_gs_utilization_maps, generate_heatmaps, gs_matrix, loaders,
+    parallel, static_server
+)
+
+# Rendered pages are kept on disk here, named by their cache key
+CACHE_DIR = '.render_cache'
+
+DEFAULT_PORT = 8000
+DEFAULT_MEMORY_MB = 256
+DEFAULT_DISK_MB = 2048
+
+HEATMAP_SUFFIX = '_cell_heatmap'
+
+
+def _resolve_capacity(name):
+    """
+    Returns the input paths of a capacity map ('britain_0_1000_..._cell_capacities'), or None.
+    """
+    if configs.parse_capacity_filename(f"{name}.txt") is None:
+        return None
+    data_path = os.path.join(generate_capacity_maps.DATA_DIR, f"{name}.txt")
+    return [data_path] + generate_capacity_maps.template_paths('html')
+
+
+def _resolve_gs(name):
+    """
+    Returns the input paths of a GS utilization map ('..._gs_utilizations'), or None.
+    """
+    if configs.parse_gs_filename(f"{name}.txt") is None:
+        return None
+    return [
+        os.path.join(generate_gs_utilization_maps.DATA_DIR, f"{name}.txt"),
+        generate_gs_utilization_maps.GS_LOCATIONS_PATH,
+        generate_gs_utilization_maps.COLOR_SCALE_PATH,
+    ]
+
+
+def _heatmap_config(name):
+    """
+    Returns the HeatmapConfig of a heatmap map name ('britain_50000_100000_0.7_cell_heatmap'), or None.
+    """
+    if not name.endswith(HEATMAP_SUFFIX):
+        return None
+    return configs.parse_heatmap_filename(f"{name[:-len(HEATMAP_SUFFIX)]}{configs.HEATMAP_SUFFIX}")
+
+
+def _resolve_heatmap(name):
+    """
+    Returns the input paths of a heatmap ('britain_50000_100000_0.7_cell_heatmap'), or None.
+    """
+    config = _heatmap_config(name)
+    if config is None:
+        return None
+    return [
+        os.path.join(generate_heatmaps.DATA_DIR, config.filename),
+        os.path.join(generate_heatmaps.DATA_DIR, configs.nation_filename(config)),
+        generate_heatmaps.COLOR_SCALE_PATH,
+    ]
+
+
+@functools.lru_cache(maxsize=1)
+def _load_station_table(path, mtime_ns, size):
+    return gs_matrix.load_station_table(path)
+
+
+def _station_table():
+    """
+    Returns the station table, reloaded when the CSV changes (workers outlive edits to it).
+    """
+    path = generate_gs_utilization_maps.GS_LOCATIONS_PATH
+    stat = os.stat(path)
+    return _load_station_table(path, stat.st_mtime_ns, stat.st_size)
+
+
+def _render(kind, name, html_path):
+    """
+    Renders one map to `html_path` with the matching generator (runs in a worker process).
+
+    Returns:
+        str: html_path, or None if the config has no data to show.
+    """
+    if kind == 'capacity':
+        h3_data = loaders.load_capacity(os.path.join(generate_capacity_maps.DATA_DIR, f"{name}.txt"))
+        if len(h3_data) == 0:
+            return None
+        country_display = configs.COUNTRIES[configs.parse_capacity_filename(f"{name}.txt").country]
+        return generate_capacity_maps.create_country_capacity_map(h3_data, country_display, f"{name}.txt", html_path)
+
+    if kind == 'gs':
+        stations, lookup = _station_table()
+        data_path = os.path.join(generate_gs_utilization_maps.DATA_DIR, f"{name}.txt")
+        vector = gs_matrix.read_utilization_vector(data_path, lookup, len(stations))
+        if np.isnan(vector).all():
+            return None
+        gs_data_df = gs_matrix.stations_with_utilization(stations, vector)
+        return generate_gs_utilization_maps.create_gs_utilization_map(gs_data_df, f"{name}.txt", html_path)
+
+    config = _heatmap_config(name)
+    heatmap_path, nation_path, _ = _resolve_heatmap(name)
+    return generate_heatmaps.render_config(
+        configs.COUNTRIES[config.country], config.name, heatmap_path, nation_path, html_path=html_path
+    )
+
+
+# URL directory of each map type -> (kind, input resolver)
+RENDERERS = {
+    os.path.basename(generate_capacity_maps.VIZ_DIR): ('capacity', _resolve_capacity),
+    os.path.basename(generate_gs_utilization_maps.VIZ_DIR): ('gs', _resolve_gs),
+    os.path.basename(generate_heatmaps.VIZ_DIR): ('heatmap', _resolve_heatmap),
+}
+
+GENERATOR_VERSIONS = {
+    'capacity': generate_capacity_maps.GENERATOR_VERSION,
+    'gs': generate_gs_utilization_maps.GENERATOR_VERSION,
+    'heatmap': generate_heatmaps.GENERATOR_VERSION,
+}
+
+
+def cache_key(kind, name, input_paths):
+    """
+    Returns the cache key of a render: changes whenever an input file or the generator changes.
+
+    Inputs are fingerprinted by (mtime, size) rather than hashed, so a hit
+    costs a few stat() calls instead of reading the data files.
+    """
+    digest = hashlib.sha256(f"{kind}:{name}:{assets.versioned(GENERATOR_VERSIONS[kind])}".encode())
+    for path in input_paths:
+        stat = os.stat(path)
+        digest.update(f"|{path}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    Two-level LRU cache of rendered pages with single-flight rendering.
+
+    Pages live in memory (up to `memory_bytes`) and on disk under `cache_dir`
+    (up to `disk_bytes`); each level evicts its least recently used pages once
+    over budget. Concurrent requests for a page that is being rendered wait for
+    that one render instead of starting their own.
+    """
+
+    def __init__(self, executor, cache_dir=CACHE_DIR, memory_bytes=DEFAULT_MEMORY_MB << 20,
+                 disk_bytes=DEFAULT_DISK_MB << 20):
+        self.executor = executor
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.lock = threading.Lock()
+        self.memory = collections.OrderedDict()
+        self.memory_used = 0
+        self.in_flight = {}
+        self.disk, self.disk_used = self._scan_disk()
+
+    def _scan_disk(self):
+        """
+        Indexes pages left on disk by a previous run, least recently used first.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, filename)
+            if filename.endswith('.html'):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime_ns, filename[:-5], stat.st_size))
+            elif filename.endswith('.tmp'):
+                os.remove(path)  # Interrupted render
+        disk = collections.OrderedDict((key, size) for _, key, size in sorted(entries))
+        return disk, sum(disk.values())
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.html")
+
+    def _remember(self, key, content):
+        """
+        Adds a page to the memory level, evicting old pages past the budget (lock held).
+        """
+        if len(content) > self.memory_bytes:
+            return
+        self.memory[key] = content
+        self.memory_used += len(content)
+        while self.memory_used > self.memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_used -= len(evicted)
+
+    def _store(self, key, size):
+        """
+        Records a page written to disk, deleting old pages past the budget (lock held).
+        """
+        self.disk[key] = size
+        self.disk_used += size
+        while self.disk_used > self.disk_bytes and len(self.disk) > 1:
+            evicted, evicted_size = self.disk.popitem(last=False)
+            self.disk_used -= evicted_size
+            try:
+                os.remove(self._disk_path(evicted))
+            except FileNotFoundError:
+                pass
+
+    def get(self, kind, name, input_paths):
+        """
+        Returns the rendered page of a config, rendering it on a miss.
+
+        Returns:
+            bytes: The page, or None if the config has no data to show.
+        """
+        key = cache_key(kind, name, input_paths)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+            if key in self.in_flight:
+                future, owner = self.in_flight[key], False
+            else:
+                future, owner = concurrent.futures.Future(), True
+                self.in_flight[key] = future
+            on_disk = key in self.disk
+            if on_disk:
+                self.disk.move_to_end(key)
+
+        if not owner:
+            return future.result()
+
+        try:
+            content = self._load_or_render(key, kind, name, on_disk)
+            future.set_result(content)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+        return content
+
+    def _load_or_render(self, key, kind, name, on_disk):
+        disk_path = self._disk_path(key)
+        if on_disk:
+            try:
+                with open(disk_path, 'rb') as f:
+                    content = f.read()
+                os.utime(disk_path)  # Keeps the LRU order across restarts
+                with self.lock:
+                    self._remember(key, content)
+                return content
+            except FileNotFoundError:
+                with self.lock:
+                    self.disk_used -= self.disk.pop(key, 0)
+
+        tmp_path = f"{disk_path}.tmp"
+        if self.executor.submit(_render, kind, name, tmp_path).result() is None:
+            return None
+        with open(tmp_path, 'rb') as f:
+            content = f.read()
+        os.replace(tmp_path, disk_path)
+        with self.lock:
+            self._remember(key, content)
+            self._store(key, len(content))
+        return content
+
+
+def resolve(request_path):
+    """
+    Maps a URL path to (kind, config name, input paths) if it is a renderable map with data.
+    """
+    parts = urllib.parse.unquote(urllib.parse.urlsplit(request_path).path).strip('/').split('/')
+    if len(parts) != 4 or parts[:2] != ['static', 'visualizations'] or parts[2] not in RENDERERS:
+        return None
+    name, ext = os.path.splitext(parts[3])
+    kind, resolver = RENDERERS[parts[2]]
+    input_paths = resolver(name) if ext == '.html' and name else None
+    if not input_paths or not all(os.path.isfile(path) for path in input_paths):
+        return None
+    return kind, name, input_paths
+
+
+class MapRequestHandler(static_server.PrecompressedRequestHandler):
+    """
+    Serves the site, rendering map pages from their data on first request.
+
+    Paths that are not renderable maps (or have no data) fall back to the
+    files on disk (precompressed when possible), so pre-generated pages and
+    viewer shells still work.
+    """
+
+    cache = None
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _serve(self, send_body):
+        """
+        Answers a request for a renderable map from the render cache, and any other path from the files on disk.
+        """
+        target = resolve(self.path)
+        if target is None:
+            return super().do_GET() if send_body else super().do_HEAD()
+        try:
+            content = self.cache.get(*target)
+        except Exception as e:
+            self.send_error(500, f"Failed to render map: {e}")
+            return
+        if content is None:
+            self.send_error(404, "No data to show for this configuration")
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(content)
+
+
+def serve(port=DEFAULT_PORT, jobs=1, memory_mb=DEFAULT_MEMORY_MB, disk_mb=DEFAULT_DISK_MB, cache_dir=CACHE_DIR):
+    """
+    Runs the rendering server until interrupted.
+
+    Args:
+        port (int): Port to listen on.
+        jobs (int): Number of render worker processes.
+        memory_mb (int): Size budget of the in-memory page cache.
+        disk_mb (int): Size budget of the on-disk page cache.
+        cache_dir (str): Directory of the on-disk page cache.
+    """
+    # Pages are rendered into the cache directory but served from their map type's directory,
+    # so vendored assets are referenced from the site root (see assets.ASSET_ROOT_ENV)
+    os.environ[assets.ASSET_ROOT_ENV] = '/'
+    with concurrent.futures.ProcessPoolExecutor(max_workers=parallel.resolve_jobs(jobs)) as executor:
+        MapRequestHandler.cache = RenderCache(executor, cache_dir, memory_mb << 20, disk_mb << 20)
+        server = http.server.ThreadingHTTPServer(('', port), MapRequestHandler)
+        print(f"Serving on http://localhost:{port}/ (rendering maps on demand, cache in '{cache_dir}')")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopping server.")
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the site, rendering maps on demand with an LRU cache.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parallel.add_jobs_argument(parser)
+    parser.add_argument('--memory-mb', type=int, default=DEFAULT_MEMORY_MB,
+                        help="In-memory cache size budget in MB")
+    parser.add_argument('--disk-mb', type=int, default=DEFAULT_DISK_MB,
+                        help="On-disk cache size budget in MB")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="On-disk cache directory")
+    assets.add_assets_argument(parser)
+    args = parser.parse_args()
+    assets.configure_from_args(args)
+    serve(port=args.port, jobs=args.jobs, memory_mb=args.memory_mb, disk_mb=args.disk_mb, cache_dir=args.cache_dir)
@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Result statuses returned by the per-configuration workers
+GENERATED = 'generated'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+UNCHANGED = 'unchanged'
+# Output linked to the identical result of another config instead of rendered (see utils.content_store)
+SHARED = 'shared'
+# Config left out before rendering because an input file is missing (counted apart from SKIPPED,
+# which only covers configs whose data was read and found empty)
+MISSING = 'missing'
+
+
+def resolve_jobs(jobs):
+    """
+    Turns the --jobs argument into a worker count (0 or less means one per CPU).
+    """
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def run_tasks(worker, tasks, jobs=1):
+    """
+    Runs `worker` over every task, either inline or in a process pool.
+
+    Results are yielded in the same order as `tasks`, whatever the number of
+    workers, so the build log and outputs are deterministic.
+
+    Args:
+        worker (callable): Module-level function taking one task and returning
+                           a (status, config_name, message) tuple.
+        tasks (list): Picklable task descriptions.
+        jobs (int): Number of worker processes.
+    """
+    jobs = resolve_jobs(jobs)
+    if jobs == 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield worker(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+        for result in executor.map(worker, tasks):
+            yield result
+
+
+def tally_results(results):
+    """
+    Prints each worker result as it arrives and aggregates the counts.
+
+    Returns:
+        tuple: ({status: count}, [(config_name, message), ...] for failures)
+    """
+    counts = {GENERATED: 0, SKIPPED: 0, FAILED: 0, UNCHANGED: 0, SHARED: 0, MISSING: 0}
+    failures = []
+    for status, config_name, message in results:
+        counts[status] += 1
+        if status == GENERATED:
+            print(f"    - Generated: {config_name}")
+        elif status == SHARED:
+            print(f"    - Shared (same result as an earlier config): {config_name}")
+        elif status == FAILED:
+            print(f"    - FAILED to process {config_name}: {message}")
+            failures.append((config_name, message))
+        elif message:
+            print(f"    - SKIPPED ({message}): {config_name}")
+    return counts, failures
+
+
+def print_summary(counts, failures):
+    """
+    Prints the end-of-run summary shared by all generators.
+    """
+    print("\n--------------------------------------------------")
+    print("                Generation Complete                ")
+    print(f"     Total HTML files generated: {counts[GENERATED]}")
+    print(f"   Total configurations skipped: {counts[SKIPPED]}")
+    print(f"    Total configurations failed: {counts[FAILED]}")
+    if counts[MISSING]:
+        print(f"    Total configs missing data: {counts[MISSING]}")
+    if counts[SHARED]:
+        print(f"          Total outputs shared: {counts[SHARED]}")
+    if counts[UNCHANGED]:
+        print(f"       Total outputs up to date: {counts[UNCHANGED]}")
+    print("--------------------------------------------------")
+    if failures:
+        print("Failed configurations:")
+        for config_name, message in failures:
+            print(f"  - {config_name}: {message}")
+
+
+def add_jobs_argument(parser):
+    """
+    Adds the shared --jobs option to a generator's argument parser.
+    """
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=1,
+        help="Number of worker processes (0 = one per CPU, default: 1)"
+    )
@@ -0,0 +1,175 @@
+import argparse
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Optional: only needed for .br siblings
+    brotli = None
+
+# Content-Encoding -> sibling suffix, in the order the static server prefers them
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+# Setting PRECOMPRESS_ENV to a comma-separated list of encodings ('gzip,br')
+# makes every written page and payload get compressed siblings
+# ('map.html.gz'). Like profiling, the variable is what reaches the workers.
+PRECOMPRESS_ENV = 'COSMOSIM_PRECOMPRESS'
+
+# Outputs are compressed once at build time, so the slowest, smallest settings are used
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+CHUNK_SIZE = 1 << 20
+
+# Files worth compressing when a whole tree is compressed (see compress_tree())
+COMPRESSIBLE_EXTENSIONS = ('.html', '.json', '.js', '.css', '.csv', '.svg', '.bin')
+
+
+def encodings():
+    """
+    Returns the encodings outputs are precompressed with (empty when precompression is off).
+    """
+    return [encoding for encoding in os.environ.get(PRECOMPRESS_ENV, '').split(',') if encoding]
+
+
+def sibling_path(path, encoding):
+    return f"{path}{ENCODINGS[encoding]}"
+
+
+def _compressed_chunks(f, encoding):
+    """
+    Yields the compressed content of an open file, read chunk by chunk.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            yield compressor.process(chunk)
+        yield compressor.finish()
+    else:
+        # A gzip stream without timestamp or file name, so rebuilds are byte-identical
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            yield compressor.compress(chunk)
+        yield compressor.flush()
+
+
+def compress_file(path, file_encodings):
+    """
+    Writes the compressed siblings of a file ('<path>.gz', '<path>.br').
+
+    Returns:
+        dict: {encoding: compressed size}
+    """
+    sizes = {}
+    for encoding in file_encodings:
+        out_path = sibling_path(path, encoding)
+        tmp_path = f"{out_path}.tmp"
+        with open(path, 'rb') as f, open(tmp_path, 'wb') as out:
+            for chunk in _compressed_chunks(f, encoding):
+                out.write(chunk)
+            sizes[encoding] = out.tell()
+        os.replace(tmp_path, out_path)
+    return sizes
+
+
+def remove_siblings(path):
+    """
+    Deletes the compressed siblings of a file, if any.
+    """
+    for encoding in ENCODINGS:
+        try:
+            os.remove(sibling_path(path, encoding))
+        except FileNotFoundError:
+            pass
+
+
+def write_siblings(path):
+    """
+    Called after an output is written: compresses it when precompression is on,
+    otherwise drops siblings left from an earlier build so they never go stale.
+    """
+    file_encodings = encodings()
+    if file_encodings:
+        compress_file(path, file_encodings)
+    else:
+        remove_siblings(path)
+
+
+def compress_tree(root, file_encodings):
+    """
+    Compresses every compressible file under `root` whose siblings are missing or older than it.
+
+    Returns:
+        tuple: (files compressed, original bytes, {encoding: compressed bytes})
+    """
+    count, original, compressed = 0, 0, dict.fromkeys(file_encodings, 0)
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            # Build manifests ('.manifest.json') are not served
+            if filename.startswith('.') or not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(dirpath, filename)
+            mtime = os.stat(path).st_mtime_ns
+            stale = [
+                encoding for encoding in file_encodings
+                if not os.path.exists(sibling_path(path, encoding))
+                or os.stat(sibling_path(path, encoding)).st_mtime_ns < mtime
+            ]
+            if not stale:
+                continue
+            for encoding, size in compress_file(path, stale).items():
+                compressed[encoding] += size
+            count += 1
+            original += os.path.getsize(path)
+    return count, original, compressed
+
+
+def versioned(generator_version):
+    """
+    Extends a generator version with the precompression settings, so incremental
+    builds redo (or drop) the siblings of unchanged outputs when they change.
+    """
+    file_encodings = encodings()
+    if not file_encodings:
+        return generator_version
+    return f"{generator_version}+{'-'.join(sorted(file_encodings))}"
+
+
+def _check_encodings(file_encodings):
+    if 'br' in file_encodings and brotli is None:
+        raise SystemExit("ERROR: Brotli output needs the 'brotli' package (pip install brotli)")
+
+
+def add_precompress_argument(parser):
+    """
+    Adds the shared --precompress option to a generator's argument parser.
+    """
+    parser.add_argument(
+        '--precompress', choices=sorted(ENCODINGS), action='append',
+        help="Also write a compressed sibling of every page and payload ('.gz' for gzip, "
+             "'.br' for br), may be repeated; see utils.static_server"
+    )
+
+
+def configure_from_args(args):
+    """
+    Turns precompression on for this process and its workers if --precompress is given.
+    """
+    if args.precompress:
+        _check_encodings(args.precompress)
+        os.environ[PRECOMPRESS_ENV] = ','.join(args.precompress)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write compressed siblings of already generated files.")
+    parser.add_argument('roots', nargs='*', default=[os.path.join('static', 'visualizations')],
+                        help="Directories to compress (default: static/visualizations)")
+    parser.add_argument('--encoding', choices=sorted(ENCODINGS), action='append',
+                        help="Encoding to write, may be repeated (default: gzip, and br if brotli is installed)")
+    args = parser.parse_args()
+    file_encodings = args.encoding or (['gzip', 'br'] if brotli else ['gzip'])
+    _check_encodings(file_encodings)
+    for root in args.roots:
+        count, original, compressed = compress_tree(root, file_encodings)
+        sizes = ', '.join(f"{encoding} {size / (1 << 20):.1f} MB" for encoding, size in compressed.items())
+        print(f"Compressed {count} file(s) under '{root}': {original / (1 << 20):.1f} MB -> {sizes}")
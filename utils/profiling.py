@@ -0,0 +1,252 @@
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Stages of a map build, in pipeline order. The generators wrap their hot
+# sections in stage() blocks named after these.
+STAGES = ('load', 'normalize', 'layers', 'to_html', 'legend', 'write')
+
+# Setting PROFILE_ENV to a path turns on per-config instrumentation: every
+# config appends one JSON line to that file. The variable (rather than a
+# module flag) is what reaches the worker processes.
+PROFILE_ENV = 'COSMOSIM_PROFILE'
+# Also trace Python allocations (peak per stage); slows the build down noticeably
+PROFILE_MEMORY_ENV = 'COSMOSIM_PROFILE_MEMORY'
+
+SUMMARY_SIZE = 10
+
+# Callback receiving (stage name, seconds) while a recording() block is active
+_recorder = None
+# Record of the config being profiled in this process, if any
+_current = None
+# Size of the profile file when this run started, so the summary only covers this run
+_run_start = 0
+
+
+def profile_path():
+    """
+    Returns the JSON lines file of the per-config profile, or None when profiling is off.
+    """
+    return os.environ.get(PROFILE_ENV) or None
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Times a section of a generator as one stage of the current config.
+
+    A no-op unless a recording() or profile_config() block is active, so the
+    generators pay nothing for it in normal builds.
+    """
+    if _recorder is None and _current is None:
+        yield
+        return
+    tracing = _current is not None and tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if _recorder is not None:
+            _recorder(name, seconds)
+        if _current is not None:
+            timing = _current['stages'].setdefault(name, {'seconds': 0.0})
+            timing['seconds'] = round(timing['seconds'] + seconds, 6)
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                timing['peak_traced_bytes'] = max(timing.get('peak_traced_bytes', 0), peak)
+
+
+@contextlib.contextmanager
+def recording(callback):
+    """
+    Sends every stage() timing to `callback(stage, seconds)` within the block.
+    """
+    global _recorder
+    previous, _recorder = _recorder, callback
+    try:
+        yield
+    finally:
+        _recorder = previous
+
+
+def note(**fields):
+    """
+    Attaches facts to the profiled config, e.g. note(rows=len(df)).
+
+    'output_path' is turned into 'output_bytes' when the config finishes.
+    Numeric fields given more than once are summed.
+    """
+    if _current is None:
+        return
+    for key, value in fields.items():
+        if key != 'output_path' and key in _current['notes']:
+            value += _current['notes'][key]
+        _current['notes'][key] = value
+
+
+def _process_peak_rss_bytes():
+    """
+    Returns the peak RSS of the whole process so far (it never decreases, so it covers earlier configs too).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _current_rss_bytes():
+    """
+    Returns the current RSS of the process, or None where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+@contextlib.contextmanager
+def profile_config(generator, config_name):
+    """
+    Profiles one config of a generator when PROFILE_ENV is set.
+
+    Records the wall time and stage timings, the noted row counts, the output
+    size and the worker's memory, and appends them as one JSON line.
+
+    A pool worker renders many configs, so its RSS belongs to no single one:
+    'rss_growth_bytes' is the change of the current RSS over the config and
+    'process_peak_rss_bytes' the worker's peak since it started. Only the
+    traced Python allocations (PROFILE_MEMORY_ENV) give a per-config peak.
+    """
+    global _current
+    path = profile_path()
+    if path is None:
+        yield
+        return
+
+    trace_memory = os.environ.get(PROFILE_MEMORY_ENV) == '1'
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    record = {'generator': generator, 'config': config_name, 'pid': os.getpid(), 'stages': {}, 'notes': {}}
+    previous, _current = _current, record
+    rss_before = _current_rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record['wall_s'] = round(time.perf_counter() - start, 6)
+        _current = previous
+
+        notes = record.pop('notes')
+        output_path = notes.pop('output_path', None)
+        record.update(notes)
+        if output_path and os.path.exists(output_path):
+            record['output_bytes'] = os.path.getsize(output_path)
+        rss_after = _current_rss_bytes()
+        if rss_before is not None and rss_after is not None:
+            record['rss_growth_bytes'] = rss_after - rss_before
+        record['process_peak_rss_bytes'] = _process_peak_rss_bytes()
+        if trace_memory:
+            record['peak_traced_bytes'] = max(
+                [timing.get('peak_traced_bytes', 0) for timing in record['stages'].values()], default=0
+            )
+        # One write per line in append mode, so lines from parallel workers do not interleave
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+def start_run():
+    """
+    Marks the start of a generator run (parent process), for print_summary().
+    """
+    global _run_start
+    path = profile_path()
+    _run_start = os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+def load_records(path, offset=0):
+    """
+    Reads the profile records written after `offset` bytes of the file.
+    """
+    with open(path, 'r') as f:
+        f.seek(offset)
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def print_summary(limit=SUMMARY_SIZE):
+    """
+    Prints the slowest configs of this run when profiling is on.
+    """
+    path = profile_path()
+    if path is None or not os.path.exists(path):
+        return
+    records = load_records(path, _run_start)
+    if not records:
+        return
+
+    print(f"\nSlowest configurations (full profile in '{path}'):")
+    for record in sorted(records, key=lambda r: r['wall_s'], reverse=True)[:limit]:
+        stages = record['stages']
+        slowest = max(stages, key=lambda name: stages[name]['seconds']) if stages else None
+        details = [f"{record['wall_s']:7.2f}s"]
+        if slowest:
+            details.append(f"slowest stage {slowest} {stages[slowest]['seconds']:.2f}s")
+        if 'rows' in record:
+            details.append(f"{record['rows']} rows")
+        if 'output_bytes' in record:
+            details.append(f"{record['output_bytes'] / 1e6:.2f} MB out")
+        if record.get('peak_traced_bytes'):
+            details.append(f"peak traced {record['peak_traced_bytes'] / 1e6:.0f} MB")
+        if 'rss_growth_bytes' in record:
+            details.append(f"RSS {record['rss_growth_bytes'] / 1e6:+.0f} MB")
+        print(f"    - {record['config']}: " + ', '.join(details))
+
+
+def configure(path, trace_memory=False):
+    """
+    Turns profiling on for this process and the workers it starts.
+
+    Args:
+        path (str): JSON lines file receiving one record per config (truncated).
+        trace_memory (bool): Also trace peak Python allocations per stage.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    open(path, 'w').close()
+    os.environ[PROFILE_ENV] = path
+    if trace_memory:
+        os.environ[PROFILE_MEMORY_ENV] = '1'
+
+
+def add_profile_argument(parser):
+    """
+    Adds the shared --profile and --profile-memory options to a generator's argument parser.
+    """
+    parser.add_argument(
+        '--profile', metavar='PATH',
+        help=f"Write per-config stage timings, row counts, output sizes and RSS growth to PATH "
+             f"as JSON lines (same as setting {PROFILE_ENV}=PATH)"
+    )
+    parser.add_argument(
+        '--profile-memory', action='store_true',
+        help="With --profile, also record peak traced Python allocations per stage (slower)"
+    )
+
+
+def configure_from_args(args):
+    """
+    Applies --profile/--profile-memory if given.
+    """
+    if args.profile:
+        configure(args.profile, args.profile_memory)
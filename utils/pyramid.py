@@ -0,0 +1,190 @@
+import glob
+import json
+import math
+import os
+
+import numpy as np
+
+from utils import html_writer, precompress, viewer
+
+# Average H3 hexagon edge length (km) per resolution, from the H3 documentation
+EDGE_LENGTH_KM = (
+    1281.256011, 483.0568391, 182.5129565, 68.97922179, 26.07175968, 9.854090990,
+    3.724532667, 1.406475763, 0.531414010, 0.200786148, 0.075863783, 0.028663897,
+    0.010830188, 0.004092010, 0.001546100, 0.000584169,
+)
+
+# Ground size of a pixel at zoom 0 in deck.gl's 512 px web mercator world (at the equator)
+KM_PER_PIXEL_AT_ZOOM_0 = 40075.017 / 512
+
+# A level is shown from the zoom where its cells are at least this many pixels
+# across their edge; finer cells below that add no visible detail
+MIN_EDGE_PIXELS = 4
+
+# Zoom floor of the map pages: no coarser level is needed below it
+MIN_ZOOM = 3
+
+# How cells are merged into their parent, per kind of value
+AGGREGATIONS = ('sum', 'min', 'mean')
+
+ZOOM_SWITCH_TEMPLATE_PATH = os.path.join('templates', 'pyramid', 'zoom_switch.html')
+
+_RESOLUTION_SHIFT = np.uint64(52)
+_RESOLUTION_MASK = np.uint64(0xF) << _RESOLUTION_SHIFT
+
+
+def resolution_of(cells):
+    """
+    Returns the H3 resolution of uint64 cell indexes (as an int array).
+    """
+    return ((np.asarray(cells, dtype=np.uint64) & _RESOLUTION_MASK) >> _RESOLUTION_SHIFT).astype(np.int64)
+
+
+def parent_cells(cells, resolution):
+    """
+    Returns the parent of every uint64 cell at a coarser `resolution`.
+
+    An H3 index stores one 3-bit digit per resolution; the parent keeps the
+    first `resolution` digits and marks the rest unused (all bits set).
+    """
+    cells = np.asarray(cells, dtype=np.uint64)
+    unused_bits = np.uint64((1 << (3 * (15 - resolution))) - 1)
+    return (cells & ~_RESOLUTION_MASK) | (np.uint64(resolution) << _RESOLUTION_SHIFT) | unused_bits
+
+
+def min_zoom_of(resolution):
+    """
+    Returns the zoom from which cells of a resolution are worth drawing (see MIN_EDGE_PIXELS).
+    """
+    return math.log2(MIN_EDGE_PIXELS * KM_PER_PIXEL_AT_ZOOM_0 / EDGE_LENGTH_KM[resolution])
+
+
+def aggregate(cells, values, resolution, how):
+    """
+    Merges cells into their parents at `resolution` in one vectorized pass.
+
+    Args:
+        cells: uint64 cell indexes.
+        values: Values aligned to `cells`.
+        resolution (int): Parent resolution.
+        how (str): 'sum', 'min' or 'mean' of the children's values.
+
+    Returns:
+        tuple: (sorted unique parent cells, aggregated float64 values)
+    """
+    parents = parent_cells(cells, resolution)
+    order = np.argsort(parents, kind='stable')
+    parents = parents[order]
+    values = np.asarray(values, dtype=np.float64)[order]
+
+    unique_parents, starts, counts = np.unique(parents, return_index=True, return_counts=True)
+    if how == 'min':
+        aggregated = np.minimum.reduceat(values, starts)
+    else:
+        aggregated = np.add.reduceat(values, starts)
+        if how == 'mean':
+            aggregated = aggregated / counts
+    return unique_parents, aggregated
+
+
+def build_levels(cells, values, how):
+    """
+    Builds the zoom pyramid of a layer, coarsest level first.
+
+    The native cells are the finest level; coarser levels are added until one
+    covers every zoom down to MIN_ZOOM.
+
+    Returns:
+        list: One dict per level with 'resolution', 'min_zoom', 'max_zoom'
+              (None for the finest level), 'cells' and 'values'.
+    """
+    cells = np.asarray(cells, dtype=np.uint64)
+    values = np.asarray(values, dtype=np.float64)
+    native = int(resolution_of(cells[:1])[0]) if len(cells) else 0
+
+    levels = [{'resolution': native, 'cells': cells, 'values': values}]
+    resolution = native
+    while resolution > 0 and min_zoom_of(resolution) > MIN_ZOOM:
+        resolution -= 1
+        parents, aggregated = aggregate(cells, values, resolution, how)
+        levels.append({'resolution': resolution, 'cells': parents, 'values': aggregated})
+    levels.reverse()
+
+    for position, level in enumerate(levels):
+        level['min_zoom'] = 0 if position == 0 else round(min_zoom_of(level['resolution']), 2)
+    for level, finer in zip(levels, levels[1:]):
+        level['max_zoom'] = finer['min_zoom']
+    levels[-1]['max_zoom'] = None
+    return levels
+
+
+def visible_at(level, zoom):
+    """
+    True if a level is the one drawn at `zoom`.
+    """
+    return level['min_zoom'] <= zoom and (level['max_zoom'] is None or zoom < level['max_zoom'])
+
+
+def layer_id(prefix, level):
+    return f"{prefix}-r{level['resolution']}"
+
+
+def level_path(html_path, level_layer_id):
+    """
+    Returns the file holding the rows of a level fetched by its page ('<page>.<layer id>.json').
+    """
+    return f"{os.path.splitext(html_path)[0]}.{level_layer_id}.json"
+
+
+def remove_level_files(html_path):
+    """
+    Deletes the level files of a page (and their compressed siblings), so none outlive the page they belong to.
+    """
+    for path in glob.glob(f"{glob.escape(os.path.splitext(html_path)[0])}.*-r*.json"):
+        os.remove(path)
+        precompress.remove_siblings(path)
+
+
+def level_data(prefix, level, frame, initial_zoom, html_path):
+    """
+    Returns the layer data of a pyramid level and the file its rows are fetched from.
+
+    Only the levels shown at the initial zoom are embedded in the page; the
+    others are written next to it and fetched by the zoom switch the first
+    time they are shown, so the first load is no larger than without a
+    pyramid. (Fetching needs the page to be served over HTTP.)
+
+    Returns:
+        tuple: (layer data, file name relative to the page, or None if embedded)
+    """
+    if visible_at(level, initial_zoom):
+        return frame, None
+    path = level_path(html_path, layer_id(prefix, level))
+    viewer.write_payload(path, frame.to_dict('records'))
+    return frame.iloc[:0], os.path.basename(path)
+
+
+def zoom_switch_html(layer_ranges):
+    """
+    Returns the script injected into a pydeck page to show one pyramid level per zoom.
+
+    Args:
+        layer_ranges (dict): {layer id: [min zoom, max zoom or None, level file or None]},
+                             see level_data().
+    """
+    return html_writer.render_template(ZOOM_SWITCH_TEMPLATE_PATH, {'__PYRAMID_LEVELS__': json.dumps(layer_ranges)})
+
+
+def add_pyramid_argument(parser, stats=None):
+    """
+    Adds the shared --pyramid option (and --pyramid-stat when `stats` are given).
+    """
+    parser.add_argument(
+        '--pyramid', action='store_true',
+        help="Also precompute coarser H3 parent levels and switch between them by zoom"
+    )
+    if stats:
+        parser.add_argument(
+            '--pyramid-stat', choices=stats, default=stats[0],
+            help=f"How child cells are merged into their parent (default: {stats[0]})"
+        )
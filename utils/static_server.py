@@ -0,0 +1,126 @@
+import argparse
+import http.server
+import os
+import urllib.parse
+
+from utils import assets, precompress
+
+DEFAULT_PORT = 8000
+
+VENDOR_URL_PREFIX = '/' + assets.VENDOR_DIR.replace(os.sep, '/') + '/'
+
+
+def accepted_encodings(accept_encoding):
+    """
+    Returns the content codings an Accept-Encoding header allows ('gzip, br;q=0' -> {'gzip'}).
+    """
+    accepted, refused = set(), set()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        (accepted if quality > 0 else refused).add(coding)
+    if '*' in accepted:
+        accepted.update(coding for coding in precompress.ENCODINGS if coding not in refused)
+    return accepted
+
+
+def pick_variant(path, accept_encoding):
+    """
+    Picks the precompressed sibling of a file to send, preferring br over gzip.
+
+    Siblings older than the file itself are ignored, so a page rebuilt without
+    precompression is never shadowed by a stale compressed copy.
+
+    Returns:
+        tuple: (content coding, sibling path), or (None, path) to send the file as is.
+    """
+    accepted = accepted_encodings(accept_encoding)
+    mtime = None
+    for coding in precompress.ENCODINGS:
+        if coding not in accepted:
+            continue
+        encoded_path = precompress.sibling_path(path, coding)
+        try:
+            encoded_mtime = os.stat(encoded_path).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        if mtime is None:
+            mtime = os.stat(path).st_mtime_ns
+        if encoded_mtime >= mtime:
+            return coding, encoded_path
+    return None, path
+
+
+def has_siblings(path):
+    return any(os.path.exists(precompress.sibling_path(path, coding)) for coding in precompress.ENCODINGS)
+
+
+class PrecompressedRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Serves static files, sending a precompressed '.br'/'.gz' sibling when the client accepts it.
+
+    Compression happens at build time (see utils.precompress), so a request
+    costs no more CPU than serving the plain file.
+    """
+
+    def end_headers(self):
+        # Vendored assets are fingerprinted, so their content never changes under a given URL
+        if urllib.parse.urlsplit(self.path).path.startswith(VENDOR_URL_PREFIX):
+            self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+        super().end_headers()
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path) or not has_siblings(path):
+            return super().send_head()
+
+        coding, encoded_path = pick_variant(path, self.headers.get('Accept-Encoding', ''))
+        try:
+            f = open(encoded_path, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+        try:
+            stat = os.fstat(f.fileno())
+            self.send_response(200)
+            self.send_header('Content-Type', self.guess_type(path))
+            if coding:
+                self.send_header('Content-Encoding', coding)
+            self.send_header('Content-Length', str(stat.st_size))
+            self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+            # Caches must key the response on the request's Accept-Encoding
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
+
+def serve(port=DEFAULT_PORT):
+    """
+    Serves the current directory until interrupted.
+    """
+    server = http.server.ThreadingHTTPServer(('', port), PrecompressedRequestHandler)
+    print(f"Serving on http://localhost:{port}/ (precompressed variants by Accept-Encoding)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping server.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the site, sending precompressed files when accepted.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Port to listen on")
+    args = parser.parse_args()
+    serve(port=args.port)
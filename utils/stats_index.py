@@ -0,0 +1,333 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import cell_store, configs, gs_matrix, loaders
+
+# One row per config with the aggregates of its data, so sweep questions
+# (capacity vs terminals, utilization percentiles across configs...) are one
+# indexed query instead of re-parsing every data file.
+INDEX_PATH = os.path.join('static', 'stats', 'config_stats.sqlite')
+
+# Setting STATS_INDEX_ENV to a path makes the generators record a row per
+# config they render. Like profiling, the variable is what reaches the workers.
+STATS_INDEX_ENV = 'COSMOSIM_STATS_INDEX'
+
+KINDS = ('capacity', 'gs_utilization', 'heatmap')
+
+# Quantiles stored per config, as columns p10, p50 and p90
+QUANTILES = (0.1, 0.5, 0.9)
+
+# A ground station at or above this utilization counts as saturated
+SATURATED_UTILIZATION = 0.99
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS config_stats (
+    kind TEXT NOT NULL,          -- 'capacity', 'gs_utilization' or 'heatmap'
+    config TEXT NOT NULL,        -- data file name without '.txt' (heatmaps: config name)
+    country TEXT,
+    terminals INTEGER,
+    terminal_cap INTEGER,        -- heatmaps only
+    ut_algo TEXT,                -- capacity and GS only
+    beam_alloc TEXT,             -- capacity and GS only
+    demand REAL,                 -- heatmaps only
+    cells INTEGER NOT NULL,      -- cells (or stations) with a value
+    total REAL,
+    min REAL,
+    max REAL,
+    p10 REAL,
+    p50 REAL,
+    p90 REAL,
+    saturated INTEGER,           -- GS only: stations at or above SATURATED_UTILIZATION
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, config)
+);
+CREATE INDEX IF NOT EXISTS config_stats_sweep
+    ON config_stats (kind, country, terminals, ut_algo, beam_alloc, demand);
+"""
+
+COLUMNS = (
+    'kind', 'config', 'country', 'terminals', 'terminal_cap', 'ut_algo', 'beam_alloc', 'demand',
+    'cells', 'total', 'min', 'max', 'p10', 'p50', 'p90', 'saturated', 'updated_at',
+)
+
+
+def index_path():
+    """
+    Returns the index the generators record into, or None when recording is off.
+    """
+    return os.environ.get(STATS_INDEX_ENV) or None
+
+
+def connect(path=INDEX_PATH):
+    """
+    Opens the index, creating its table on first use.
+
+    WAL mode lets worker processes write rows while others read.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def config_key(name):
+    """
+    Returns the index key of a config: its data file name without '.txt'.
+
+    Only '.txt' is removed since heatmap config names contain a dot ('..._0.7').
+    """
+    return name[:-len('.txt')] if name.endswith('.txt') else name
+
+
+def parse_config(kind, config):
+    """
+    Returns the sweep fields encoded in a config name (empty if it does not follow the naming scheme).
+
+    Names are parsed with the configs registry parsers (see utils.configs).
+    """
+    if kind == 'heatmap':
+        parsed = configs.parse_heatmap_filename(f"{config}{configs.HEATMAP_SUFFIX}")
+        if parsed is None:
+            return {}
+        return {
+            'country': parsed.country, 'terminals': parsed.terminals, 'terminal_cap': parsed.terminal_cap,
+            'demand': float(parsed.demand),
+        }
+    parse = configs.parse_capacity_filename if kind == 'capacity' else configs.parse_gs_filename
+    parsed = parse(f"{config}.txt")
+    if parsed is None:
+        return {}
+    return {
+        'country': parsed.country, 'terminals': parsed.terminals,
+        'ut_algo': parsed.ut_algo, 'beam_alloc': parsed.beam_alloc,
+    }
+
+
+def value_stats(values):
+    """
+    Returns the aggregates of a config's values (NaN = no value) in one vectorized pass.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {'cells': 0}
+    quantiles = np.quantile(values, QUANTILES)
+    return {
+        'cells': len(values),
+        'total': float(values.sum()),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'p10': float(quantiles[0]),
+        'p50': float(quantiles[1]),
+        'p90': float(quantiles[2]),
+    }
+
+
+def stats_row(kind, name, stats):
+    """
+    Builds the index row of a config from its aggregates (see value_stats()).
+    """
+    config = config_key(name)
+    row = dict.fromkeys(COLUMNS)
+    row.update(parse_config(kind, config))
+    row.update(stats)
+    row.update(kind=kind, config=config, updated_at=time.time())
+    return row
+
+
+def config_row(kind, name, values):
+    """
+    Builds the index row of a config from its values.
+    """
+    row = stats_row(kind, name, value_stats(values))
+    if kind == 'gs_utilization':
+        row['saturated'] = int(np.count_nonzero(np.asarray(values, dtype=np.float64) >= SATURATED_UTILIZATION))
+    return row
+
+
+def write_rows(connection, rows):
+    """
+    Inserts or replaces index rows (one transaction).
+    """
+    placeholders = ', '.join('?' for _ in COLUMNS)
+    with connection:
+        connection.executemany(
+            f"INSERT OR REPLACE INTO config_stats ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+            [tuple(row[column] for column in COLUMNS) for row in rows],
+        )
+
+
+def record(kind, name, values):
+    """
+    Records the row of a rendered config when recording is on (see STATS_INDEX_ENV).
+
+    Called by the generators right after loading a config; a no-op otherwise.
+
+    Args:
+        kind (str): 'capacity', 'gs_utilization' or 'heatmap'.
+        name (str): Data file or config name.
+        values: The config's values (capacities, utilizations aligned to
+                stations, or available capacities); NaN = no value.
+    """
+    path = index_path()
+    if path is None:
+        return
+    connection = connect(path)
+    try:
+        write_rows(connection, [config_row(kind, name, values)])
+    finally:
+        connection.close()
+
+
+def record_streamed(kind, name, stats, histogram=None):
+    """
+    Records the row of a config read in chunks when recording is on (see utils.streaming).
+
+    Args:
+        kind (str): 'capacity' or 'heatmap'.
+        name (str): Data file or config name.
+        stats (dict): Count, total, min and max from streaming.scan_stats().
+        histogram (streaming.Histogram): The config's values, for the quantiles
+                                         (left NULL without it).
+    """
+    path = index_path()
+    if path is None:
+        return
+    stats = dict(stats)
+    if histogram is not None and stats['cells']:
+        stats.update(zip(('p10', 'p50', 'p90'), histogram.quantiles(QUANTILES)))
+    connection = connect(path)
+    try:
+        write_rows(connection, [stats_row(kind, name, stats)])
+    finally:
+        connection.close()
+
+
+def prune(kind, live_names):
+    """
+    Drops the rows of a kind whose config is no longer among `live_names` (when recording is on).
+    """
+    path = index_path()
+    if path is None:
+        return
+    live = {config_key(name) for name in live_names}
+    connection = connect(path)
+    try:
+        stale = [
+            (kind, config)
+            for (config,) in connection.execute("SELECT config FROM config_stats WHERE kind = ?", (kind,))
+            if config not in live
+        ]
+        with connection:
+            connection.executemany("DELETE FROM config_stats WHERE kind = ? AND config = ?", stale)
+    finally:
+        connection.close()
+
+
+def _source_rows():
+    """
+    Yields the row of every config found in the text data directories.
+    """
+    capacity_dir = cell_store.SOURCE_DIRS['capacity']
+    heatmap_dir = cell_store.SOURCE_DIRS['heatmap']
+    registry = configs.scan(capacity_dir=capacity_dir, gs_dir=gs_matrix.DATA_DIR, heatmap_dir=heatmap_dir)
+
+    for config in registry.capacity:
+        capacity = loaders.load_capacity(os.path.join(capacity_dir, config.filename))['capacity']
+        yield config_row('capacity', config.filename, capacity)
+
+    if registry.gs and os.path.exists(gs_matrix.GS_LOCATIONS_PATH):
+        stations, lookup = gs_matrix.load_station_table(gs_matrix.GS_LOCATIONS_PATH)
+        for config in registry.gs:
+            vector = gs_matrix.read_utilization_vector(
+                os.path.join(gs_matrix.DATA_DIR, config.filename), lookup, len(stations)
+            )
+            yield config_row('gs_utilization', config.filename, vector)
+
+    for config in registry.heatmap:
+        values = loaders.load_heatmap_values(os.path.join(heatmap_dir, config.filename))['value']
+        yield config_row('heatmap', config.name, values)
+
+
+def rebuild(path=INDEX_PATH):
+    """
+    Recomputes the whole index from the data files, without rendering any map.
+    """
+    print(f"Rebuilding the stats index '{path}' from the data files...")
+    connection = connect(path)
+    try:
+        rows = list(_source_rows())
+        with connection:
+            connection.execute("DELETE FROM config_stats")
+        write_rows(connection, rows)
+    finally:
+        connection.close()
+    counts = pd.Series([row['kind'] for row in rows], dtype=object).value_counts()
+    for kind in KINDS:
+        print(f"  - {kind}: {counts.get(kind, 0)} configs")
+
+
+def query(sql, params=(), path=INDEX_PATH):
+    """
+    Runs a query on the index and returns the result as a DataFrame.
+
+    Example:
+        query("SELECT terminals, total FROM config_stats WHERE kind = 'capacity' "
+              "AND country = ? AND ut_algo = ? AND beam_alloc = ? ORDER BY terminals",
+              ('britain', 'waterfill', 'priority'))
+    """
+    connection = connect(path)
+    try:
+        return pd.read_sql_query(sql, connection, params=params)
+    finally:
+        connection.close()
+
+
+def add_stats_argument(parser):
+    """
+    Adds the shared --stats-index option to a generator's argument parser.
+    """
+    parser.add_argument(
+        '--stats-index', metavar='PATH', nargs='?', const=INDEX_PATH,
+        help=f"Record one aggregate row per rendered config in a SQLite index (default PATH: {INDEX_PATH})"
+    )
+
+
+def configure_from_args(args):
+    """
+    Turns recording on for this process and its workers if --stats-index is given.
+
+    A new (or empty) index is first filled from the data files: the
+    generators only record the configs they render, so an incremental build
+    would otherwise leave every unchanged config out of it.
+    """
+    if args.stats_index:
+        connection = connect(args.stats_index)
+        try:
+            empty = connection.execute("SELECT 1 FROM config_stats LIMIT 1").fetchone() is None
+        finally:
+            connection.close()
+        if empty:
+            rebuild(args.stats_index)
+        os.environ[STATS_INDEX_ENV] = args.stats_index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the per-config aggregate statistics index.")
+    parser.add_argument('--index', default=INDEX_PATH, help=f"Index path (default: {INDEX_PATH})")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute every row from the data files")
+    parser.add_argument('--sql', help="Query to run on the config_stats table, printed as a table")
+    args = parser.parse_args()
+    if not args.rebuild and not args.sql:
+        parser.error("nothing to do: give --rebuild and/or --sql")
+    if args.rebuild:
+        rebuild(args.index)
+    if args.sql:
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(query(args.sql, path=args.index).to_string(index=False))
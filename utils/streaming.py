@@ -0,0 +1,139 @@
+import json
+import os
+
+import numpy as np
+
+# Setting CHUNK_ROWS_ENV to a row count makes the generators read their text
+# inputs in chunks of that many rows instead of whole files, so the peak memory
+# of a config follows the chunk size rather than the input size. Like
+# profiling, the variable is what reaches the worker processes.
+CHUNK_ROWS_ENV = 'COSMOSIM_CHUNK_ROWS'
+DEFAULT_CHUNK_ROWS = 500_000
+
+# Quantiles of chunked configs are read from a histogram over [min, max] with this many bins
+QUANTILE_BINS = 4096
+
+# Layer data standing in for rows streamed into a pydeck page (see stream_placeholder())
+ROWS_PLACEHOLDER = '__COSMOSIM_ROWS_{}__'
+
+
+def chunk_rows():
+    """
+    Returns the rows per input chunk, or None when inputs are loaded whole.
+    """
+    value = os.environ.get(CHUNK_ROWS_ENV)
+    return int(value) if value else None
+
+
+def scan_stats(value_chunks):
+    """
+    Computes the count, total, min and max of values arriving in chunks, in one pass.
+
+    Args:
+        value_chunks: Iterable of float arrays (loader chunks hold no NaN).
+
+    Returns:
+        dict: {'cells', 'total', 'min', 'max'}, only 'cells' (0) if there are no values.
+    """
+    cells, total, low, high = 0, 0.0, np.inf, -np.inf
+    for values in value_chunks:
+        if len(values) == 0:
+            continue
+        cells += len(values)
+        total += float(values.sum())
+        low = min(low, float(values.min()))
+        high = max(high, float(values.max()))
+    if cells == 0:
+        return {'cells': 0}
+    return {'cells': cells, 'total': total, 'min': low, 'max': high}
+
+
+class Histogram:
+    """
+    Fixed-bin histogram of a config's values over their [min, max], filled chunk by chunk.
+
+    Gives quantiles in constant memory, interpolated within a bin, so they are
+    exact to (max - min) / QUANTILE_BINS.
+    """
+
+    def __init__(self, low, high, bins=QUANTILE_BINS):
+        self.low, self.high = low, high
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def add(self, values):
+        if self.high > self.low:
+            self.counts += np.histogram(values, bins=len(self.counts), range=(self.low, self.high))[0]
+        else:
+            self.counts[0] += len(values)
+
+    def quantiles(self, quantiles):
+        """
+        Returns the quantiles of the values added so far (NumPy's 'linear' definition).
+        """
+        total = int(self.counts.sum())
+        if total == 0 or self.high == self.low:
+            return [float(self.low)] * len(quantiles)
+        width = (self.high - self.low) / len(self.counts)
+        cumulative = np.cumsum(self.counts)
+        results = []
+        for quantile in quantiles:
+            # Rank of the quantile among the sorted values, 1-based
+            rank = quantile * (total - 1) + 1
+            position = int(np.searchsorted(cumulative, rank, side='left'))
+            before = cumulative[position - 1] if position else 0
+            fraction = (rank - before) / self.counts[position]
+            results.append(float(min(self.low + (position + fraction) * width, self.high)))
+        return results
+
+
+def json_array(frames):
+    """
+    Yields the rows of DataFrames arriving in chunks as one compact JSON array of records, piece by piece.
+    """
+    yield '['
+    first = True
+    for df in frames:
+        if df.empty:
+            continue
+        if not first:
+            yield ','
+        yield json.dumps(df.to_dict('records'), separators=(',', ':'))[1:-1]
+        first = False
+    yield ']'
+
+
+def stream_placeholder(frames, streams):
+    """
+    Registers row chunks to be streamed into a page and returns the layer data standing in for them.
+
+    Pass the returned string as a pydeck layer's data, then the page chunks
+    through html_writer.expand_streams(chunks, streams).
+
+    Args:
+        frames: Iterable of DataFrames holding the layer's columns.
+        streams (dict): {placeholder: JSON text pieces}, filled in here.
+    """
+    placeholder = ROWS_PLACEHOLDER.format(len(streams))
+    streams[placeholder] = json_array(frames)
+    return placeholder
+
+
+def add_chunk_argument(parser):
+    """
+    Adds the shared --chunk-rows option to a generator's argument parser.
+    """
+    parser.add_argument(
+        '--chunk-rows', metavar='N', type=int, nargs='?', const=DEFAULT_CHUNK_ROWS,
+        help="Read data files in chunks of N rows (default N: %(const)s) and stream them into the "
+             "outputs, so memory per config stays bounded for inputs of any size"
+    )
+
+
+def configure_from_args(args):
+    """
+    Turns chunked reading on for this process and its workers if --chunk-rows is given.
+    """
+    if args.chunk_rows is not None:
+        if args.chunk_rows <= 0:
+            raise SystemExit("ERROR: --chunk-rows must be a positive number of rows")
+        os.environ[CHUNK_ROWS_ENV] = str(args.chunk_rows)
@@ -0,0 +1,166 @@
+import base64
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from utils import assets, html_writer, precompress, profiling
+
+# Output formats understood by the generators:
+#   html  - one self-contained pydeck page per config (the original behaviour)
+#   shell - one shared viewer page per map type plus a compact JSON payload per config
+OUTPUT_FORMATS = ('html', 'shell')
+
+# Per-config payloads live in this subdirectory of the map type's visualization directory
+PAYLOAD_DIRNAME = 'data'
+VIEWER_FILENAME = 'viewer.html'
+VIEWER_TEMPLATES_DIR = os.path.join('templates', 'viewers')
+
+# Which output each map type was last built as ('html', 'shell', 'bundle' or 'tiled'):
+# the home page reads it to pick per-config pages, a shared viewer, bundles or tiles
+OUTPUT_MODES_PATH = os.path.join('static', 'visualizations', 'outputs.json')
+
+# Spooled byte columns are base64-encoded in blocks of this size (a multiple of 3, so blocks concatenate)
+BASE64_BLOCK_SIZE = 3 << 20
+
+
+def payload_dir(viz_dir):
+    """
+    Returns the directory holding the JSON payloads of a map type.
+    """
+    return os.path.join(viz_dir, PAYLOAD_DIRNAME)
+
+
+def payload_output_path(viz_dir, output_name):
+    """
+    Returns the payload path for an output name (the HTML filename without extension).
+    """
+    return os.path.join(payload_dir(viz_dir), f"{output_name}.json")
+
+
+def write_payload(path, payload):
+    """
+    Writes a per-config payload as compact JSON (atomically, like html_writer.write_chunks).
+
+    Args:
+        path (str): Output path of the payload.
+        payload (dict): JSON-serializable payload; columns are plain lists.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    precompress.write_siblings(path)
+    profiling.note(output_path=path)
+    return path
+
+
+def write_streamed_payload(path, payload, column_chunks, encoded_columns=()):
+    """
+    Writes a payload whose columns arrive in chunks, holding one chunk in memory at a time.
+
+    Each column is spooled to a temporary file next to the output, then the
+    payload is assembled from the spools. The result is the payload
+    write_payload() would write for the concatenated columns.
+
+    Args:
+        path (str): Output path of the payload.
+        payload (dict): Fields written as they are (view, labels).
+        column_chunks: Iterable of {column: array} dicts with the same columns each.
+        encoded_columns (tuple): RGBA columns packed into one base64 string (see colors.encode).
+    """
+    out_dir = os.path.dirname(path)
+    os.makedirs(out_dir, exist_ok=True)
+    spools = {}
+    try:
+        for chunk in column_chunks:
+            for column, values in chunk.items():
+                if len(values) == 0:
+                    continue
+                if column not in spools:
+                    spools[column] = [tempfile.TemporaryFile(dir=out_dir), False]
+                spool = spools[column]
+                if column in encoded_columns:
+                    spool[0].write(np.ascontiguousarray(values, dtype=np.uint8).tobytes())
+                else:
+                    items = json.dumps(values.tolist(), separators=(',', ':'))[1:-1]
+                    spool[0].write(f"{',' if spool[1] else ''}{items}".encode('utf-8'))
+                spool[1] = True
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            head = json.dumps(payload, separators=(',', ':'))[:-1]
+            f.write(head.encode('utf-8'))
+            separator = len(head) > 1
+            for column, (spool, _) in spools.items():
+                f.write(f"{',' if separator else ''}{json.dumps(column)}:".encode('utf-8'))
+                separator = True
+                spool.seek(0)
+                if column in encoded_columns:
+                    f.write(b'"')
+                    for block in iter(lambda: spool.read(BASE64_BLOCK_SIZE), b''):
+                        f.write(base64.b64encode(block))
+                    f.write(b'"')
+                else:
+                    f.write(b'[')
+                    shutil.copyfileobj(spool, f)
+                    f.write(b']')
+            f.write(b'}')
+        os.replace(tmp_path, path)
+    finally:
+        for spool, _ in spools.values():
+            spool.close()
+    precompress.write_siblings(path)
+    profiling.note(output_path=path)
+    return path
+
+
+def write_viewer_page(template_path, color_scale_path, viz_dir):
+    """
+    Writes the shared viewer page of a map type, with its color scale legend injected.
+
+    Args:
+        template_path (str): Viewer template under templates/viewers/.
+        color_scale_path (str): Legend template under templates/color_scales/.
+        viz_dir (str): Visualization directory of the map type.
+    """
+    with open(template_path, 'r') as f:
+        html_content = f.read()
+
+    os.makedirs(viz_dir, exist_ok=True)
+    viewer_path = os.path.join(viz_dir, VIEWER_FILENAME)
+    html_content = assets.rewrite(html_content, assets.local_urls(viz_dir))
+    return html_writer.write_chunks([html_content], viewer_path, [html_writer.render_template(color_scale_path)])
+
+
+def record_output_mode(map_type, mode):
+    """
+    Records the output a map type was just built as in OUTPUT_MODES_PATH, keeping the other map types'.
+
+    Args:
+        map_type (str): 'capacity', 'gs' or 'heatmap' (see utils.build.MAP_TYPES).
+        mode (str): 'html', 'shell', 'bundle' or 'tiled'.
+    """
+    modes = {}
+    if os.path.exists(OUTPUT_MODES_PATH):
+        try:
+            with open(OUTPUT_MODES_PATH, 'r') as f:
+                modes = json.load(f)
+        except (OSError, ValueError):
+            print(f"WARNING: Rewriting unreadable output modes at '{OUTPUT_MODES_PATH}'")
+    modes[map_type] = mode
+    return write_payload(OUTPUT_MODES_PATH, modes)
+
+
+def add_format_argument(parser):
+    """
+    Adds the shared --format option to a generator's argument parser.
+    """
+    parser.add_argument(
+        '--format', choices=OUTPUT_FORMATS, default='html',
+        help="'html' writes one self-contained page per config; 'shell' writes one shared "
+             "viewer page plus a compact JSON payload per config (default: html)"
+    )
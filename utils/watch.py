@@ -0,0 +1,103 @@
+import argparse
+import os
+import time
+
+from utils import build, generate_capacity_maps, generate_gs_utilization_maps, generate_heatmaps, pyramid
+
+# Map types to rebuild when something under the given paths changes
+WATCHED_PATHS = [
+    ('capacity', [
+        generate_capacity_maps.DATA_DIR,
+        generate_capacity_maps.COLOR_SCALE_PATH,
+        generate_capacity_maps.CAPACITY_BOX_TEMPLATE_PATH,
+        pyramid.ZOOM_SWITCH_TEMPLATE_PATH,
+    ]),
+    ('gs', [
+        generate_gs_utilization_maps.DATA_DIR,
+        generate_gs_utilization_maps.GS_LOCATIONS_PATH,
+        generate_gs_utilization_maps.COLOR_SCALE_PATH,
+    ]),
+    ('heatmap', [
+        generate_heatmaps.DATA_DIR,
+        generate_heatmaps.COLOR_SCALE_PATH,
+        generate_heatmaps.DEMAND_SWITCH_TEMPLATE_PATH,
+        pyramid.ZOOM_SWITCH_TEMPLATE_PATH,
+    ]),
+]
+
+
+def snapshot(paths):
+    """
+    Returns {path: (mtime_ns, size)} for the given files and the files directly inside the given directories.
+    """
+    state = {}
+    for path in paths:
+        if os.path.isdir(path):
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        state[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        elif os.path.isfile(path):
+            stat = os.stat(path)
+            state[path] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+def wait_until_settled(paths, state, settle):
+    """
+    Polls until the watched files stop changing, so half-copied simulator outputs are not picked up.
+    """
+    while True:
+        time.sleep(settle)
+        new_state = snapshot(paths)
+        if new_state == state:
+            return state
+        state = new_state
+
+
+def watch(interval=5.0, settle=2.0, **options):
+    """
+    Polls the simulator output directories and incrementally rebuilds the affected maps.
+
+    Each map type is rebuilt through build.build() with its build manifest, so
+    only the maps whose inputs changed are re-rendered and maps whose data was
+    deleted are removed. Outputs match a CLI build with the same options.
+
+    Args:
+        interval (float): Seconds between polls.
+        settle (float): Seconds a change must be quiet before rebuilding.
+        options: Keyword arguments of build.build() (see build.configure_from_args()).
+    """
+    states = {map_type: snapshot(paths) for map_type, paths in WATCHED_PATHS}
+    print(f"Watching for simulator outputs every {interval:g}s (Ctrl+C to stop)...")
+
+    # Bring everything up to date once before waiting for changes
+    build.build(only=build.MAP_TYPES, incremental=True, **options)
+
+    try:
+        while True:
+            time.sleep(interval)
+            for map_type, paths in WATCHED_PATHS:
+                new_state = snapshot(paths)
+                if new_state == states[map_type]:
+                    continue
+                print(f"\nChange detected for the {map_type} maps, waiting for files to settle...")
+                states[map_type] = wait_until_settled(paths, new_state, settle)
+                build.build(only=(map_type,), incremental=True, **options)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch simulator outputs and rebuild the affected maps.")
+    parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls (default: 5)")
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help="Seconds a change must be quiet before rebuilding (default: 2)")
+    build.add_build_arguments(parser)
+    args = parser.parse_args()
+    if args.from_store or args.from_matrix:
+        # Both are derived from the data files, which are what is watched
+        parser.error("watch mode reads the data files and cannot be combined with --from-store or --from-matrix")
+    options = build.configure_from_args(parser, args)
+    watch(interval=args.interval, settle=args.settle, **options)